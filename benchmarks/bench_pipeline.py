@@ -0,0 +1,296 @@
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPOSITORY = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPOSITORY))
+
+import numpy as np
+import pandas as pd
+import picts_gif
+from picts_gif import input_handler
+from picts_gif import profiling
+from picts_gif import synthetic
+from picts_gif import utilities
+
+#Benchmark of each stage of the pipeline, over a grid of data sizes and numbers of rate windows.
+#The data are synthetic (see picts_gif/synthetic.py): --scales multiplies the number of temperatures
+#of our usual measurement (217 temperatures, 7700 samples for each transient).
+#The compute stages are measured with the profiling events of the pipeline (see picts_gif/profiling.py):
+#ingestion (tdms_read, tdms_to_dataframe, set_current_value), zero_fix, trim, normalization,
+#create_index_for_t1_and_t2, calculate_en, spectrum and the whole from_transient_to_PICTS_spectrum.
+#The gates of the spectrum are also measured with each statistic of utilities.gate_statistics (gates_mean, gates_median, gates_trimmed_mean,
+#gates_hampel), so that the robust statistics are compared with the plain mean on the same transients.
+#The animations are measured on --frames frames of each plot class: rendering of the frames and encoding of the gif.
+#Each measurement is repeated --repeat times and the fastest run is kept.
+#
+#The results are written as json (--output). With --baseline, the results are compared with a previous json,
+#and the script exits with 1 if a stage is slower than the baseline by more than --tolerance.
+#
+#   python benchmarks/bench_pipeline.py --scales 1 10 --windows 6 30 --output bench.json
+#   python benchmarks/bench_pipeline.py --scales 1 10 --windows 6 30 --baseline bench.json
+
+BASE_TEMPERATURES = 217
+BASE_SAMPLES = 7700
+MIN_DIFFERENCE_S = 1e-3          #differences smaller than this are noise, never a regression
+
+
+def dataset(
+    output_dir : Path,
+    n_temperatures : int,
+    n_samples : int,
+    n_windows : int
+    ):
+    '''
+    Writes a synthetic dataset and its json. Zero fix and trim are enabled, so that their stages run,
+    and the rate windows are spread so that every t2 is inside the transient.
+    '''
+    transients = synthetic.generate_transients(n_temperatures=n_temperatures, n_samples=n_samples)
+    time_end = transients.index[-1]
+    t1_min = 1e-3
+    beta = 5
+    temperatures = transients.columns
+    configuration = synthetic.configuration(
+        transients,
+        set_zero=0,
+        trim_left=float(temperatures[len(temperatures) // 20]),
+        trim_right=float(temperatures[-1 - len(temperatures) // 20]),
+        n_windows=n_windows,
+        t1_min=t1_min,
+        beta=beta,
+        t1_shift=(0.9 * time_end / beta - t1_min) / max(n_windows - 1, 1)
+        )
+    tdms_path = output_dir / f'bench_{n_temperatures}_{n_samples}_{n_windows}.tdms'
+    json_path = tdms_path.with_suffix('.json')
+    synthetic.write_tdms(transients, tdms_path)
+    with open(json_path, 'w') as pfile:
+        json.dump(configuration, pfile)
+    return tdms_path, json_path
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def bench_compute(tdms_path : Path, json_path : Path):
+    '''
+    Runs the compute stages, as pipeline.compute does. Returns the wall time of each stage in seconds,
+    and the normalized transients, spectrum and gates.
+    '''
+    report = profiling.ProfileReport()
+    profiling.add_callback(report)
+    try:
+        start = time.perf_counter()
+        normalized_transient = input_handler.normalized_transient(
+            input_handler.read_transients_from_tdms(tdms_path, json_path), json_path
+            )
+        spectrum_start = time.perf_counter()
+        picts, gates = input_handler.from_transient_to_PICTS_spectrum(normalized_transient, json_path)
+        end = time.perf_counter()
+    finally:
+        profiling.remove_callback(report)
+
+    timings = {name : entry['wall_s'] for name, entry in report.summary().items()}
+    timings['from_transient_to_PICTS_spectrum'] = end - spectrum_start
+    timings['compute'] = end - start
+    return timings, (normalized_transient, picts, gates)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def bench_gates(results : tuple, json_path : Path) -> dict:
+    '''
+    Computes the gates of the spectrum with each statistic of utilities.gate_statistics, and returns the time of each in seconds.
+    '''
+    normalized_transient, _, gates = results
+    with open(json_path, 'r') as pfile:
+        t_avg = json.load(pfile)['t_avg']
+    values = normalized_transient.to_numpy(dtype=float)
+    positions = utilities.backfill_positions(normalized_transient.index.to_numpy(dtype=float), np.concatenate([gates[:,0], gates[:,1]]))
+    timings = {}
+    for statistic in utilities.GATE_STATISTICS:
+        start = time.perf_counter()
+        utilities.gate_statistics(values, positions, t_avg, statistic)
+        timings[f'gates_{statistic}'] = time.perf_counter() - start
+    return timings
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def bench_render(
+    plot : str,
+    results : tuple,
+    json_path : Path,
+    n_frames : int,
+    output_dir : Path,
+    global_palette : bool
+    ) -> dict:
+    '''
+    Renders n_frames frames of a plot class into a gif writer, and returns the time of rendering and of encoding.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from picts_gif.gif_writer import gif_writer
+    from picts_gif.picts_spectrum_plot import PictsSpectrumPlot
+    from picts_gif.picts_transient_plot import PictsTransientPlot
+
+    normalized_transient, picts, gates = results
+    fig, ax = plt.subplots(1,1, figsize=(5,5))
+    if plot == 'transient':
+        animation = PictsTransientPlot(fig, ax=ax, conf_file_path=json_path, transient_df=normalized_transient, gates_list=gates, animate=False)
+    else:
+        animation = PictsSpectrumPlot(fig, ax=ax, df=picts, animate=False)
+    n_frames = min(n_frames, animation.n_frames)
+
+    writer = gif_writer(fps=30, global_palette=global_palette)
+    writer.setup(fig, output_dir / f'{plot}.gif')
+    animation.ani_init()
+    start = time.perf_counter()
+    for frame in range(n_frames):
+        animation.ani_update(frame)
+        writer.grab_frame()
+    encode_start = time.perf_counter()
+    writer.finish()
+    end = time.perf_counter()
+    plt.close(fig)
+    return {f'render_{plot}' : encode_start - start, f'encode_{plot}' : end - encode_start, f'frames_{plot}' : n_frames}
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def run(
+    scales : list,
+    windows : list,
+    n_samples : int,
+    n_frames : int,
+    repeat : int,
+    global_palette : bool
+    ) -> list:
+    '''
+    Runs the benchmark over the grid of scales and rate windows. Returns a list of results, one for each point of the grid.
+    '''
+    #scipy is imported at the first call of calculate_en (see utilities.py): I don't want it in the measurements
+    utilities.calculate_en(np.array([1e-3]), np.array([5e-3]))
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_dir = Path(output_dir)
+        for scale in scales:
+            n_temperatures = max(int(round(BASE_TEMPERATURES * scale)), 2)
+            for n_windows in windows:
+                tdms_path, json_path = dataset(output_dir, n_temperatures, n_samples, n_windows)
+                timings = {}
+                for _ in range(repeat):
+                    compute_timings, outputs = bench_compute(tdms_path, json_path)
+                    compute_timings.update(bench_gates(outputs, json_path))
+                    for plot in ('spectrum', 'transient'):
+                        if n_frames > 0:
+                            compute_timings.update(bench_render(plot, outputs, json_path, n_frames, output_dir, global_palette))
+                    #I keep the fastest run of each stage
+                    for name, value in compute_timings.items():
+                        timings[name] = min(timings.get(name, value), value)
+
+                frames = {name : timings.pop(name) for name in list(timings) if name.startswith('frames_')}
+                result = {
+                    'n_temperatures' : n_temperatures,
+                    'n_samples' : n_samples,
+                    'n_windows' : n_windows,
+                    'frames' : frames,
+                    'stages' : timings
+                    }
+                results.append(result)
+                print(f"{n_temperatures:7d} temperatures x {n_samples} samples, {n_windows:3d} windows")
+                for name, value in timings.items():
+                    print(f"           {value * 1000:10.2f} ms  {name}")
+                tdms_path.unlink()
+    return results
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def compare(
+    results : list,
+    baseline : list,
+    tolerance : float
+    ) -> list:
+    '''
+    Compares the results with a baseline. Returns the list of regressions: the stages slower than
+    the baseline by more than tolerance (a fraction), for the same point of the grid.
+    '''
+    def key(result):
+        return (result['n_temperatures'], result['n_samples'], result['n_windows'])
+
+    previous = {key(result) : result['stages'] for result in baseline}
+    regressions = []
+    for result in results:
+        if key(result) not in previous:
+            continue
+        for name, value in result['stages'].items():
+            reference = previous[key(result)].get(name)
+            if reference is None:
+                continue
+            if value > reference * (1 + tolerance) and value - reference > MIN_DIFFERENCE_S:
+                regressions.append({
+                    'n_temperatures' : result['n_temperatures'],
+                    'n_samples' : result['n_samples'],
+                    'n_windows' : result['n_windows'],
+                    'stage' : name,
+                    'baseline_s' : reference,
+                    'current_s' : value,
+                    'ratio' : value / reference
+                    })
+    return regressions
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of each stage of picts_gif pipeline')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1., 10.], help='multiples of the number of temperatures of a usual measurement (217)')
+    parser.add_argument('--windows', type=int, nargs='+', default=[6, 30], help='numbers of rate windows')
+    parser.add_argument('--samples', type=int, default=BASE_SAMPLES, help='number of time samples of each transient')
+    parser.add_argument('--frames', type=int, default=30, help='frames rendered for each plot class. 0 skips the animations')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of each measurement, the fastest is kept')
+    parser.add_argument('--global-palette', action='store_true', help='encode the gifs with the global palette writer')
+    parser.add_argument('--output', type=str, default=None, help='where the json report is written')
+    parser.add_argument('--baseline', type=str, default=None, help='a previous json report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown with respect to the baseline, as a fraction')
+    args = parser.parse_args()
+
+    results = run(args.scales, args.windows, args.samples, args.frames, args.repeat, args.global_palette)
+    report = {
+        'environment' : {
+            'python' : platform.python_version(),
+            'platform' : platform.platform(),
+            'numpy' : np.__version__,
+            'pandas' : pd.__version__,
+            'picts_gif' : picts_gif.__version__,
+            },
+        'options' : vars(args),
+        'results' : results
+        }
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as pfile:
+            baseline = json.load(pfile)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        report['regressions'] = regressions
+
+    if args.output is not None:
+        with open(args.output, 'w') as pfile:
+            json.dump(report, pfile, indent=4)
+
+    for regression in regressions:
+        print(
+            f"FAIL {regression['stage']} ({regression['n_temperatures']} x {regression['n_samples']}, {regression['n_windows']} windows): "
+            f"{regression['baseline_s'] * 1000:.2f} ms -> {regression['current_s'] * 1000:.2f} ms"
+            )
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+#Import time benchmark of the CLI, based on 'python -X importtime'.
+#It runs two scenarios in a new interpreter:
+# - help:    picts_gif_start --help. It must not import pandas, numpy, scipy, nptdms or matplotlib
+# - compute: picts_gif_start export (a compute-only run). It must not import matplotlib.
+#            It uses a TDMS file and its json (--path, --dict); without them it runs on a synthetic dataset
+#For each scenario it records the wall time, the total import time and the slowest imports.
+#It exits with 1 if a forbidden module is imported or if an import time exceeds its budget,
+#so that startup regressions are caught.
+#
+#   python benchmarks/import_time.py --path data.tdms --dict dict.json --output import_time.json
+
+REPOSITORY = Path(__file__).resolve().parents[1]
+
+FORBIDDEN = {
+    'help' : ['pandas', 'numpy', 'scipy', 'nptdms', 'matplotlib'],
+    'compute' : ['matplotlib'],
+    }
+
+
+def parse_importtime(stderr : str) -> list:
+    '''
+    Parses the output of -X importtime. Returns a list of (module, self time in us, cumulative time in us, depth)
+    '''
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def run_scenario(
+    name : str,
+    arguments : list,
+    top : int = 10
+    ) -> dict:
+    '''
+    Runs 'python -X importtime -m picts_gif.main <arguments>' and returns the summary of the import times.
+    '''
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'picts_gif.main'] + arguments,
+        capture_output=True, text=True, cwd=REPOSITORY
+        )
+    wall = time.perf_counter() - start
+    if output.returncode != 0:
+        raise RuntimeError(f'Scenario {name} failed:\n{output.stderr[-2000:]}')
+
+    imports = parse_importtime(output.stderr)
+    modules = {module for module, _, _, _ in imports}
+    return {
+        'arguments' : arguments,
+        'wall_s' : wall,
+        'import_ms' : sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1000,
+        'slowest' : [
+            [module, cumulative / 1000]
+            for module, _, cumulative, depth in sorted(imports, key=lambda item: -item[2]) if depth == 0
+            ][:top],
+        'forbidden_imported' : sorted(m for m in FORBIDDEN[name] if m in modules),
+        }
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time benchmark of picts_gif CLI')
+    parser.add_argument('--path', type=str, default=None, help='TDMS file used by the compute scenario')
+    parser.add_argument('--dict', type=str, default=None, help='json file used by the compute scenario')
+    parser.add_argument('--output', type=str, default=None, help='where the json report is written')
+    parser.add_argument('--help-budget-ms', type=float, default=150., help='maximum import time of the help scenario')
+    parser.add_argument('--compute-budget-ms', type=float, default=2000., help='maximum import time of the compute scenario')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        path, dictionary = args.path, args.dict
+        if path is None or dictionary is None:
+            sys.path.insert(0, str(REPOSITORY))
+            from picts_gif import synthetic
+            path, dictionary, _ = synthetic.generate_dataset(output_dir)
+        compute_arguments = ['export', '--path', str(path), '--dict', str(dictionary), '--output-dir', output_dir, '--format', 'npz']
+        report = {
+            'help' : run_scenario('help', ['--help']),
+            'compute' : run_scenario('compute', compute_arguments),
+            }
+
+    failures = []
+    for name, budget in (('help', args.help_budget_ms), ('compute', args.compute_budget_ms)):
+        scenario = report[name]
+        print(f"{name:8s} wall {scenario['wall_s']:.3f} s, imports {scenario['import_ms']:.1f} ms (budget {budget:.0f} ms)")
+        for module, milliseconds in scenario['slowest'][:5]:
+            print(f"           {milliseconds:9.1f} ms  {module}")
+        if scenario['forbidden_imported']:
+            failures.append(f"{name}: imported {scenario['forbidden_imported']}")
+        if scenario['import_ms'] > budget:
+            failures.append(f"{name}: import time {scenario['import_ms']:.1f} ms over budget {budget:.0f} ms")
+
+    if args.output is not None:
+        with open(args.output, 'w') as pfile:
+            json.dump(report, pfile, indent=4)
+
+    for failure in failures:
+        print('FAIL', failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+import functools
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from picts_gif import batch
+from picts_gif import input_handler
+from picts_gif.watcher import warm_up_worker
+
+#async_batch.py runs a batch (see batch.py) as a pipeline, so that reading, computing and writing overlap.
+#In a sequential batch the CPU waits while a TDMS file is read from the network storage and while a gif is written.
+#Here an asyncio scheduler drives three stages:
+# - read: a thread hashes the next TDMS file (for the manifest) and reads and decodes it, while the previous samples are processed
+# - compute: a pool of worker processes normalizes the transients, computes the spectrum and renders the gif in a local temporary directory
+# - write: a thread moves the gif to the output directory (possibly on the network storage), and the manifest is updated
+#The stages are connected by bounded queues: when the workers are busy the reader stops after --prefetch samples,
+#so at most prefetch + workers + 1 samples are in memory at the same time, whatever the size of the campaign.
+#It is used by the batch subcommand with --workers:
+#   picts_gif_start batch --input-dir ./campaign --output-dir ./gifs --workers 4 --prefetch 2
+
+
+def render_sample(
+    data,
+    configuration_path : str,
+    output_file_path : str,
+    plot : str = 'all',
+    interval : float = 1.,
+    global_palette : bool = False
+    ) -> str:
+    '''
+    The job of a worker: from the transients read by the reader to the gif, as pipeline.compute and pipeline.render do.
+    '''
+    from picts_gif import pipeline
+    result = input_handler.compute_result(data, configuration_path)
+    pipeline.render(
+        plot, result.to_dataframe('transient'), result.to_dataframe('spectrum'), result.gates, configuration_path,
+        interval=interval, output_file_path=output_file_path, show=False, global_palette=global_palette, mask=result.mask
+        )
+    return output_file_path
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+async def _read_stage(samples, read_queue, threads, context, n_workers):
+    loop = asyncio.get_running_loop()
+    for tdms_path, json_path in samples:
+        output_file_path = context['output_dir'] / f'{tdms_path.stem}.gif'
+        try:
+            current = await loop.run_in_executor(threads, functools.partial(batch.fingerprint, tdms_path, json_path, **context['options']))
+            if not context['force'] and output_file_path.exists() and context['manifest'].get(output_file_path.name) == current:
+                context['outcome']['skipped'].append(output_file_path)
+                continue
+            data = await loop.run_in_executor(threads, input_handler.read_transients_from_tdms, tdms_path, json_path)
+        except Exception as error:
+            print(f"Failed {tdms_path}: {error}")
+            context['outcome']['failed'].append(output_file_path)
+            continue
+        #put waits while the queue is full: the reader never runs more than prefetch samples ahead of the workers
+        await read_queue.put((tdms_path, json_path, output_file_path, current, data))
+    for _ in range(n_workers):
+        await read_queue.put(None)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+async def _compute_stage(worker_id, read_queue, write_queue, processes, context):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await read_queue.get()
+        if item is None:
+            await write_queue.put(None)
+            return
+        tdms_path, json_path, output_file_path, current, data = item
+        temporary_path = Path(context['temporary_dir']) / f'{worker_id}_{output_file_path.name}'
+        try:
+            await loop.run_in_executor(
+                processes,
+                functools.partial(render_sample, data, json_path, temporary_path, **context['options'])
+                )
+        except Exception as error:
+            print(f"Failed {tdms_path}: {error}")
+            temporary_path = error
+        del data, item          #the transients are not needed anymore: I free the memory before waiting on the queue
+        await write_queue.put((output_file_path, current, temporary_path))
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+async def _write_stage(write_queue, threads, context, n_workers):
+    loop = asyncio.get_running_loop()
+    finished = 0
+    while finished < n_workers:
+        item = await write_queue.get()
+        if item is None:
+            finished += 1
+            continue
+        output_file_path, current, temporary_path = item
+        context['manifest'].pop(output_file_path.name, None)
+        if isinstance(temporary_path, Exception):
+            context['outcome']['failed'].append(output_file_path)
+        else:
+            await loop.run_in_executor(threads, shutil.move, str(temporary_path), str(output_file_path))
+            context['manifest'][output_file_path.name] = current
+            context['outcome']['built'].append(output_file_path)
+        await loop.run_in_executor(threads, batch.save_manifest, context['output_dir'], dict(context['manifest']))
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+async def run_batch_async(
+    input_dir : str,
+    output_dir : str,
+    configuration_path : str = None,
+    plot : str = 'all',
+    interval : float = 1.,
+    global_palette : bool = False,
+    force : bool = False,
+    workers : int = 2,
+    prefetch : int = 2
+    ) -> dict:
+    '''
+    Creates the animation of each sample of a directory, as batch.run_batch does, overlapping reading, computing and writing.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - input_dir, output_dir, configuration_path, plot, interval, global_palette, force:
+            as in batch.run_batch
+         - workers:
+            number of worker processes that compute and render
+         - prefetch:
+            number of samples read in advance, waiting for a free worker
+
+        ......................................................
+         Return:
+         - a dictionary with the lists of the 'built', 'skipped' (up to date) and 'failed' gifs
+        ......................................................
+         Raises
+         - ValueError
+            If workers or prefetch are smaller than 1.
+        ......................................................
+        ......................................................
+    '''
+    if workers < 1 or prefetch < 1: raise ValueError('workers and prefetch must be at least 1')
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    samples = batch.find_samples(input_dir, configuration_path)
+    context = {
+        'output_dir' : output_dir,
+        'options' : {'plot' : plot, 'interval' : interval, 'global_palette' : global_palette},
+        'force' : force,
+        'manifest' : batch.load_manifest(output_dir),
+        'outcome' : {'built' : [], 'skipped' : [], 'failed' : []},
+        }
+
+    read_queue = asyncio.Queue(maxsize=prefetch)
+    write_queue = asyncio.Queue(maxsize=workers)
+    #I/O runs in two threads (one reads, one writes), CPU bound work in the worker processes
+    with ThreadPoolExecutor(max_workers=2) as threads, \
+         ProcessPoolExecutor(max_workers=workers, initializer=warm_up_worker) as processes, \
+         tempfile.TemporaryDirectory() as temporary_dir:
+        context['temporary_dir'] = temporary_dir
+        await asyncio.gather(
+            _read_stage(samples, read_queue, threads, context, workers),
+            *(_compute_stage(i, read_queue, write_queue, processes, context) for i in range(workers)),
+            _write_stage(write_queue, threads, context, workers)
+            )
+    return context['outcome']
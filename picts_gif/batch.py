@@ -0,0 +1,246 @@
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+import picts_gif
+from picts_gif import profiling
+
+#batch.py creates the animations of a whole measurement campaign: a directory with a TDMS file for each sample,
+#and next to each TDMS its json with the same name (sample_01.tdms, sample_01.json, ...). It is called from the CLI as:
+#   picts_gif_start batch --input-dir ./campaign --output-dir ./gifs --plot all
+#A TDMS file without its json uses the json given with --dict, if any; otherwise it is skipped.
+#
+#In the output directory a build manifest (.picts_gif_manifest.json) records, for each gif:
+# - the sha256 of the TDMS file
+# - the sha256 of the effective configuration: the content of the json and the options of the CLI that change the gif
+# - the version of picts_gif
+#When the campaign is run again, only the gifs whose inputs, configuration or version changed (or that are missing) are rebuilt.
+#With --force all of them are rebuilt.
+
+MANIFEST_NAME = '.picts_gif_manifest.json'
+CHUNK_SIZE = 2**20                 #bytes read at a time when hashing a file
+
+
+def file_sha256(path : str) -> str:
+    '''
+    Returns the sha256 of a file, read in chunks so that large TDMS files are not loaded in memory.
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as pfile:
+        for chunk in iter(lambda: pfile.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def configuration_sha256(configuration_path : str, **options) -> str:
+    '''
+    Returns the sha256 of the effective configuration: the content of the json file and the options that change the output.
+    The json is parsed and written again with sorted keys, so changes of formatting or of keys order do not count.
+    '''
+    with open(configuration_path, 'r') as pfile:
+        configuration = json.load(pfile)
+    effective = json.dumps({'configuration' : configuration, 'options' : options}, sort_keys=True)
+    return hashlib.sha256(effective.encode()).hexdigest()
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def fingerprint(
+    tdms_path : str,
+    configuration_path : str,
+    **options
+    ) -> dict:
+    '''
+    Returns what the manifest records for an output: hashes of TDMS file and effective configuration, and package version.
+    '''
+    return {
+        'tdms_sha256' : file_sha256(tdms_path),
+        'config_sha256' : configuration_sha256(configuration_path, **options),
+        'version' : picts_gif.__version__
+        }
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def find_samples(
+    input_dir : str,
+    configuration_path : str = None
+    ) -> list:
+    '''
+    Returns the (TDMS, json) pairs of a directory, sorted by name.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - input_dir:
+            the directory with the TDMS files
+         - configuration_path:
+            the json used for the TDMS files without a json with the same name. If None, they are skipped
+
+        ......................................................
+         Return:
+         - a list of (TDMS path, json path) pairs
+        ......................................................
+        ......................................................
+    '''
+    samples = []
+    for tdms_path in sorted(Path(input_dir).glob('*.tdms')):
+        json_path = tdms_path.with_suffix('.json')
+        if json_path.exists():
+            samples.append((tdms_path, json_path))
+        elif configuration_path is not None:
+            samples.append((tdms_path, Path(configuration_path)))
+        else:
+            print(f"Skipped {tdms_path}: no json found")
+    return samples
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def load_manifest(output_dir : str) -> dict:
+    '''
+    Returns the manifest of an output directory, or an empty one if it does not exist.
+    '''
+    path = Path(output_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path, 'r') as pfile:
+        return json.load(pfile)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def save_manifest(output_dir : str, manifest : dict) -> None:
+    '''
+    Writes the manifest of an output directory. The file is replaced in one step, so an interrupted run never leaves it half written.
+    '''
+    path = Path(output_dir) / MANIFEST_NAME
+    temporary_path = path.with_suffix('.tmp')
+    with open(temporary_path, 'w') as pfile:
+        json.dump(manifest, pfile, indent=4, sort_keys=True)
+    os.replace(temporary_path, path)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def process_sample(
+    tdms_path : str,
+    configuration_path : str,
+    output_file_path : str,
+    plot : str = 'all',
+    interval : float = 1.,
+    global_palette : bool = False
+    ) -> None:
+    '''
+    Computes the spectrum of a sample and saves its animation, as the main CLI does.
+    '''
+    from picts_gif import pipeline
+    result = pipeline.compute_result(tdms_path, configuration_path)
+    with profiling.stage('render', plot=plot):
+        pipeline.render(
+            plot, result.to_dataframe('transient'), result.to_dataframe('spectrum'), result.gates, configuration_path,
+            interval=interval, output_file_path=output_file_path, show=False, global_palette=global_palette, mask=result.mask
+            )
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def run_batch(
+    input_dir : str,
+    output_dir : str,
+    configuration_path : str = None,
+    plot : str = 'all',
+    interval : float = 1.,
+    global_palette : bool = False,
+    force : bool = False
+    ) -> dict:
+    '''
+    Creates the animation of each sample of a directory, rebuilding only the stale ones.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - input_dir:
+            the directory with the TDMS and json files
+         - output_dir:
+            the directory where the gifs and the manifest are written. It is created if it does not exist
+         - configuration_path:
+            the json used for the TDMS files without their own json
+         - plot, interval, global_palette:
+            the options of the animation, as in the main CLI
+         - force:
+            if True, all the gifs are rebuilt
+
+        ......................................................
+         Return:
+         - a dictionary with the lists of the 'built', 'skipped' (up to date) and 'failed' gifs
+        ......................................................
+        ......................................................
+    '''
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    options = {'plot' : plot, 'interval' : interval, 'global_palette' : global_palette}
+    outcome = {'built' : [], 'skipped' : [], 'failed' : []}
+
+    for tdms_path, json_path in find_samples(input_dir, configuration_path):
+        output_file_path = output_dir / f'{tdms_path.stem}.gif'
+        key = output_file_path.name
+        current = fingerprint(tdms_path, json_path, **options)
+
+        if not force and output_file_path.exists() and manifest.get(key) == current:
+            outcome['skipped'].append(output_file_path)
+            continue
+
+        #The old entry is removed before building: if the build fails, the gif is rebuilt at the next run
+        manifest.pop(key, None)
+        try:
+            process_sample(tdms_path, json_path, output_file_path, **options)
+        except Exception as error:
+            print(f"Failed {tdms_path}: {error}")
+            outcome['failed'].append(output_file_path)
+            save_manifest(output_dir, manifest)
+            continue
+
+        #I save the manifest after each gif, so that an interrupted campaign restarts from where it stopped
+        manifest[key] = current
+        save_manifest(output_dir, manifest)
+        outcome['built'].append(output_file_path)
+
+    return outcome
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def main(argv : list = None):
+    '''
+    The batch subcommand. From here i manage input data from CLI.
+    '''
+    parser = argparse.ArgumentParser(prog='picts_gif_start batch', description='Create the animations of all the TDMS files of a directory, rebuilding only the stale ones')
+    parser.add_argument("-I", "--input-dir", type=str, required=True, help="The directory with the TDMS files and their json files. \n E.g.: --input-dir ./campaign")
+    parser.add_argument("-o", "--output-dir", type=str, required=True, help="The directory where the gifs are written. \n E.g.: --output-dir ./gifs")
+    parser.add_argument("-d", "--dict", type=str, default=None, help="The json used for the TDMS files without a json with the same name")
+    parser.add_argument("-pl", "--plot", type=str, default='all', choices=['transient', 'spectrum', 'all'], help="Specify what to animate")
+    parser.add_argument("-i", "--interval", type=float, default=1., help="The time between one frame and another, in ms")
+    parser.add_argument('--global-palette', action='store_true', help="Save the gifs with a single palette for all the frames")
+    parser.add_argument('--force', action='store_true', help="Rebuild all the gifs, also the ones that are up to date")
+    parser.add_argument('--profile', type=str, default=None, help="The path of a json file where time, cpu time and memory of each stage are written")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes. With 1 or more, reading, computing and writing of different samples overlap (see async_batch.py)")
+    parser.add_argument('--prefetch', type=int, default=2, help="With --workers, the number of samples read in advance")
+    args = parser.parse_args(argv)
+
+    with profiling.profile_to(args.profile):
+        if args.workers > 0:
+            import asyncio
+            from picts_gif.async_batch import run_batch_async
+            outcome = asyncio.run(run_batch_async(
+                args.input_dir, args.output_dir, args.dict, args.plot, args.interval, args.global_palette, args.force, args.workers, args.prefetch
+                ))
+        else:
+            outcome = run_batch(args.input_dir, args.output_dir, args.dict, args.plot, args.interval, args.global_palette, args.force)
+        print(f"Built {len(outcome['built'])}, up to date {len(outcome['skipped'])}, failed {len(outcome['failed'])}")
+
+    return 1 if outcome['failed'] else 0
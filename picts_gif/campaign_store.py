@@ -0,0 +1,284 @@
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import picts_gif
+from picts_gif.picts_result import PictsResult
+
+#CampaignStore archives the processed runs of a measurement campaign in a directory, instead of a pickle for each run.
+#Loading a campaign to compare samples does not need to decompress every file: the arrays are stored as .npy chunks,
+#opened with memory mapping, so a read touches on disk only the requested sample, temperatures and rate windows.
+#The layout of the directory is:
+#   store/
+#     index.json                      samples, configuration and chunks (with their temperature range) of each sample
+#     <sample>/time.npy               the time axis
+#     <sample>/gates.npy, en.npy      the rate windows
+#     <sample>/chunk_000_temperature.npy, chunk_000_transient.npy, chunk_000_spectrum.npy, ...
+#The temperatures of a sample are split in chunks of at most chunk_size temperatures. A chunk of transients is stored
+#with a row for each temperature, so the transients of a temperature are contiguous on disk.
+#New samples, and new temperatures of a sample, are written as new files: the files already in the store are never rewritten,
+#only index.json is replaced (in one step, as the manifest of batch.py).
+
+INDEX_NAME = 'index.json'
+CHUNK_SIZE = 64                    #temperatures in each chunk
+
+
+class CampaignStore:
+    """
+  CampaignStore handles a directory with the results of many samples, stored as memory mappable chunks.
+
+  .............................
+  Attributes:
+
+  path           : Path
+                  The directory of the store. It is created if it does not exist
+
+  chunk_size     : int
+                  The maximum number of temperatures in each chunk written by this object
+ ................................
+  Methods:
+
+  samples(self):
+    returns the names of the samples in the store.
+
+  add_sample(self, name, result, configuration):
+    writes a new sample.
+
+  append_temperatures(self, name, result):
+    adds the temperatures of a result to a sample already in the store.
+
+  read_result(self, name, t_min, t_max, rate_windows):
+    reads a sample, or a part of it, as a PictsResult.
+
+  read_transient(self, name, t_min, t_max), read_spectrum(self, name, t_min, t_max, rate_windows):
+    read a part of a sample as a dataframe.
+  """
+
+    def __init__(
+        self,
+        path : str,
+        chunk_size : int = CHUNK_SIZE
+        ):
+        if chunk_size < 1: raise ValueError('chunk_size must be at least 1')
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        index_path = self.path / INDEX_NAME
+        if index_path.exists():
+            with open(index_path, 'r') as pfile:
+                self._index = json.load(pfile)
+        else:
+            self._index = {'version' : picts_gif.__version__, 'samples' : {}}
+
+    def _save_index(self) -> None:
+        #The index is replaced in one step: an interrupted write never leaves the store without a valid index
+        path = self.path / INDEX_NAME
+        temporary_path = path.with_suffix('.tmp')
+        with open(temporary_path, 'w') as pfile:
+            json.dump(self._index, pfile, indent=4)
+        os.replace(temporary_path, path)
+
+    def _entry(self, name : str) -> dict:
+        if name not in self._index['samples']: raise KeyError(f'Sample {name} is not in the store')
+        return self._index['samples'][name]
+
+    def samples(self) -> list:
+        '''
+        Returns the names of the samples in the store, in the order they were added.
+        '''
+        return list(self._index['samples'])
+
+    def configuration(self, name : str) -> dict:
+        '''
+        Returns the configuration (the content of the json file) stored with a sample.
+        '''
+        return self._entry(name)['configuration']
+
+    def _write_chunks(self, name : str, result : PictsResult, first_chunk : int) -> list:
+        chunks = []
+        for i, start in enumerate(range(0, len(result.temperature), self.chunk_size)):
+            stop = start + self.chunk_size
+            chunk = f'chunk_{first_chunk + i:03d}'
+            np.save(self.path / name / f'{chunk}_temperature.npy', result.temperature[start:stop])
+            np.save(self.path / name / f'{chunk}_transient.npy', np.ascontiguousarray(result.transient[:, start:stop].T))
+            np.save(self.path / name / f'{chunk}_spectrum.npy', result.spectrum[start:stop])
+            temperatures = result.temperature[start:stop]
+            chunks.append({'name' : chunk, 't_min' : float(temperatures.min()), 't_max' : float(temperatures.max()), 'n_temperatures' : len(temperatures)})
+        return chunks
+
+    def add_sample(
+        self,
+        name : str,
+        result : PictsResult,
+        configuration : dict = None
+        ) -> None:
+        '''
+        Writes a new sample in the store.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - name:
+            the name of the sample, used also as name of its directory
+         - result:
+            a PictsResult with transients and spectrum (see pipeline.compute_result)
+         - configuration:
+            the content of the json file used for the run
+
+        ......................................................
+         Raises
+         - ValueError
+            If the name is not a valid directory name, if the sample is already in the store,
+            or if the spectrum of the result is not computed.
+        ......................................................
+        ......................................................
+        '''
+        if not name or Path(name).name != name or name.startswith('.'): raise ValueError(f'Not a valid sample name: {name}')
+        if name in self._index['samples']: raise ValueError(f'Sample {name} is already in the store')
+        if result.spectrum is None: raise ValueError('The spectrum of the result is not computed')
+
+        (self.path / name).mkdir()
+        np.save(self.path / name / 'time.npy', result.time)
+        np.save(self.path / name / 'gates.npy', result.gates)
+        np.save(self.path / name / 'en.npy', result.en)
+        self._index['samples'][name] = {
+            'configuration' : configuration,
+            'n_times' : len(result.time),
+            'n_windows' : len(result.en),
+            'chunks' : self._write_chunks(name, result, 0)
+            }
+        self._save_index()
+
+    def append_temperatures(
+        self,
+        name : str,
+        result : PictsResult
+        ) -> None:
+        '''
+        Adds the temperatures of a result to a sample already in the store, as new chunks. The stored chunks are not rewritten.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - name:
+            the name of the sample
+         - result:
+            a PictsResult with the new temperatures, computed with the same time axis and rate windows of the sample
+
+        ......................................................
+         Raises
+         - KeyError
+            If the sample is not in the store.
+         - ValueError
+            If time axis or rate windows are not the ones of the sample, or if some temperature is already stored.
+        ......................................................
+        ......................................................
+        '''
+        entry = self._entry(name)
+        if result.spectrum is None: raise ValueError('The spectrum of the result is not computed')
+        if not np.array_equal(result.time, self._load(name, 'time')): raise ValueError('The time axis is not the one of the sample')
+        if not np.array_equal(result.gates, self._load(name, 'gates')): raise ValueError('The rate windows are not the ones of the sample')
+        if np.isin(result.temperature, self._temperatures(name)).any(): raise ValueError('Some temperatures are already in the store')
+
+        entry['chunks'] += self._write_chunks(name, result, len(entry['chunks']))
+        self._save_index()
+
+    def _temperatures(self, name : str) -> np.ndarray:
+        return np.concatenate([self._load(name, f"{chunk['name']}_temperature") for chunk in self._entry(name)['chunks']])
+
+    def _selected_chunks(self, name : str, t_min : float, t_max : float):
+        #yields each chunk with some temperature in [t_min, t_max], its temperatures and the mask of the selected ones.
+        #The limits of each chunk are in the index: the chunks outside the range are never opened
+        low = -np.inf if t_min is None else t_min
+        high = np.inf if t_max is None else t_max
+        for chunk in self._entry(name)['chunks']:
+            if chunk['t_max'] < low or chunk['t_min'] > high:
+                continue
+            temperature = self._load(name, f"{chunk['name']}_temperature")
+            yield chunk['name'], temperature, (temperature >= low) & (temperature <= high)
+
+    def _load(self, name : str, array : str, mmap_mode : str = None) -> np.ndarray:
+        return np.load(self.path / name / f'{array}.npy', mmap_mode=mmap_mode)
+
+    def read_result(
+        self,
+        name : str,
+        t_min : float = None,
+        t_max : float = None,
+        rate_windows : list = None
+        ) -> PictsResult:
+        '''
+        Reads a sample, or a part of it, as a PictsResult.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - name:
+            the name of the sample
+         - t_min, t_max:
+            only the temperatures in [t_min, t_max] are read. None means no limit
+         - rate_windows:
+            the positions of the rate windows to read. If None, all of them
+
+        ......................................................
+         Return:
+         - a PictsResult with the requested temperatures, in the order they were stored, and rate windows.
+           Only the chunks with some requested temperature are opened, with memory mapping, and only the selected rows are read
+        ......................................................
+         Raises
+         - KeyError
+            If the sample is not in the store.
+        ......................................................
+        ......................................................
+        '''
+        entry = self._entry(name)
+        windows = slice(None) if rate_windows is None else list(rate_windows)
+        temperatures, transients, spectra = [np.empty(0)], [np.empty((0, entry['n_times']))], [np.empty((0, entry['n_windows']))[:, windows]]
+        for chunk, temperature, keep in self._selected_chunks(name, t_min, t_max):
+            temperatures.append(temperature[keep])
+            transients.append(self._load(name, f'{chunk}_transient', 'r')[keep])
+            spectra.append(self._load(name, f'{chunk}_spectrum', 'r')[keep][:, windows])
+
+        return PictsResult(
+            np.concatenate(transients).T,           #the chunks have a row for each temperature
+            self._load(name, 'time'),
+            np.concatenate(temperatures),
+            gates=self._load(name, 'gates')[windows],
+            en=self._load(name, 'en')[windows],
+            spectrum=np.concatenate(spectra)
+            )
+
+    def read_transient(
+        self,
+        name : str,
+        t_min : float = None,
+        t_max : float = None
+        ) -> pd.DataFrame:
+        '''
+        Reads the normalized transients of a sample, with time as index and temperature as columns. See read_result.
+        '''
+        return self.read_result(name, t_min, t_max).to_dataframe('transient')
+
+    def read_spectrum(
+        self,
+        name : str,
+        t_min : float = None,
+        t_max : float = None,
+        rate_windows : list = None
+        ) -> pd.DataFrame:
+        '''
+        Reads the PICTS spectrum of a sample, with temperature as index and rate windows as columns, as read_result does.
+        The chunks of the transients are never opened.
+        '''
+        entry = self._entry(name)
+        windows = slice(None) if rate_windows is None else list(rate_windows)
+        temperatures, spectra = [np.empty(0)], [np.empty((0, entry['n_windows']))[:, windows]]
+        for chunk, temperature, keep in self._selected_chunks(name, t_min, t_max):
+            temperatures.append(temperature[keep])
+            spectra.append(self._load(name, f'{chunk}_spectrum', 'r')[keep][:, windows])
+        return pd.DataFrame(
+            np.concatenate(spectra),
+            index=pd.Index(np.concatenate(temperatures), name=PictsResult.TEMPERATURE_NAME),
+            columns=pd.Index(self._load(name, 'en')[windows].round(3), name=PictsResult.RATE_WINDOW_NAME)
+            )
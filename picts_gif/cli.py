@@ -0,0 +1,31 @@
+import argparse
+
+#cli.py has the options shared by the CLI of the animation (main.py) and by its subcommands, with the code that reads them.
+#It imports only argparse: the subcommands do not depend on main.py, and --help answers without importing numpy or matplotlib.
+
+
+def add_selection_arguments(parser : argparse.ArgumentParser) -> None:
+    '''
+    Adds to a parser the options that select the temperatures to read (see utilities.select_temperatures).
+    '''
+    parser.add_argument("--t-min", type=float, default=None, help="The lowest temperature to read, in K. E.g.: --t-min 150")
+    parser.add_argument("--t-max", type=float, default=None, help="The highest temperature to read, in K. E.g.: --t-max 250")
+    parser.add_argument("--t-stride", type=int, default=1, help="Read one temperature every t-stride. E.g.: --t-stride 5")
+    parser.add_argument(
+        "--temperatures", 
+        type=float, 
+        nargs='+', 
+        default=None, 
+        help="An explicit list of temperatures to read: for each value the closest temperature of the ramp is taken. E.g.: --temperatures 150 200 250"
+        )
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def selection_from_arguments(args : argparse.Namespace):
+    '''
+    Returns the temperature selection given from CLI, or None if all the temperatures are needed.
+    '''
+    if args.t_min is None and args.t_max is None and args.t_stride == 1 and args.temperatures is None:
+        return None
+    return {'t_min' : args.t_min, 't_max' : args.t_max, 'stride' : args.t_stride, 'values' : args.temperatures}
@@ -0,0 +1,259 @@
+import numpy as np
+import pandas as pd
+
+#exponential_fit.py finds the emission rate at each temperature by fitting the normalized transient with one or two exponentials:
+#   y(t) = A1 exp(-e1 t) [+ A2 exp(-e2 t)] + c
+#Fitting the columns one by one with scipy.optimize costs a python loop and a full optimization for each temperature.
+#Here all the columns are fitted together:
+# - the initial estimates come from a linear fit of log(y - c) against t, done with sums over the time axis for all the columns
+# - the estimates are refined with Levenberg-Marquardt, vectorized on the columns: at each iteration the jacobians
+#   of all the columns are built together and the small normal equations are solved with a single batched np.linalg.solve.
+#   Each column keeps its own damping, and stops when it converged
+#The rates are fitted as log(e), so that they stay positive. The columns are processed in chunks, to bound the memory of the jacobians.
+
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-8                   #relative decrease of the cost below which a column has converged
+CHUNK_SIZE = 256                   #columns fitted together
+
+
+def model(
+    t : np.ndarray,
+    parameters : np.ndarray
+    ) -> np.ndarray:
+    '''
+    Returns the sum of exponentials for each column: an array with a row for each column and a column for each time.
+    The parameters of a column are (A1, log e1, [A2, log e2,] c).
+    '''
+    return _evaluate(t, parameters)[1]
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _evaluate(t, parameters):
+    #returns the exponentials exp(-e t) of each column (columns x exponentials x times) and the model.
+    #The exponentials are kept: the jacobian at the same parameters is built from them, without computing exp again
+    rates = np.exp(parameters[:, 1:-1:2])
+    decays = np.exp(-rates[:, :, None] * t)
+    values = np.einsum('mk,mkn->mn', parameters[:, 0:-1:2], decays) + parameters[:, -1:]
+    return decays, values
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _jacobian(t, parameters, decays, weights):
+    #a row for each parameter and a column for each time (columns x parameters x times):
+    #so J J^T and J r are batched matrix products on contiguous rows
+    n_exponentials = decays.shape[1]
+    jacobian = np.empty((parameters.shape[0], parameters.shape[1], len(t)))
+    rates = np.exp(parameters[:, 1:-1:2])
+    for k in range(n_exponentials):
+        jacobian[:, 2*k] = decays[:, k] * weights
+        jacobian[:, 2*k + 1] = (-parameters[:, 2*k, None] * rates[:, k, None] * t) * jacobian[:, 2*k]
+    jacobian[:, -1] = weights
+    return jacobian
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def initial_estimates(
+    t : np.ndarray,
+    y : np.ndarray,
+    weights : np.ndarray,
+    n_exponentials : int = 1
+    ) -> np.ndarray:
+    '''
+    Returns the starting parameters of each column, from a linear fit of log(y - c) against t.
+    c is the mean of the last 10% of the transient. For two exponentials the rate found is split in a faster and a slower one.
+    '''
+    tail = max(len(t) // 10, 1)
+    offset = (y[:, -tail:] * weights[:, -tail:]).sum(axis=1) / np.maximum(weights[:, -tail:].sum(axis=1), 1)
+    z = y - offset[:, None]
+    #only the points well above the noise are used: the weights z^2 compensate the logarithm, that enlarges the noise of small values
+    #the maximum starts from -inf, so a column without valid points has no warning and no valid point
+    valid = (weights > 0) & (z > 0.05 * np.max(np.where(weights > 0, z, -np.inf), axis=1, keepdims=True))
+    w = np.where(valid, z, 0.)**2
+    log_z = np.log(np.where(valid, z, 1.))
+    s, st, sz = w.sum(axis=1), (w * t).sum(axis=1), (w * log_z).sum(axis=1)
+    stt, stz = (w * t * t).sum(axis=1), (w * t * log_z).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (s * stz - st * sz) / (s * stt - st**2)
+        amplitude = np.exp((sz - slope * st) / s)
+    #columns without a decay (flat or noisy): a rate of a few inverse time spans is a reasonable start
+    fallback = 3 / (t[-1] - t[0])
+    rate = np.where(np.isfinite(slope) & (slope < 0), -slope, fallback)
+    amplitude = np.where(np.isfinite(amplitude), amplitude, 1.)
+
+    if n_exponentials == 1:
+        return np.column_stack([amplitude, np.log(rate), offset])
+    return np.column_stack([amplitude / 2, np.log(rate * 3), amplitude / 2, np.log(rate / 3), offset])
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _levenberg_marquardt(t, y, weights, parameters, max_iterations, tolerance):
+    #The working arrays hold only the columns still running: when some columns stop, they are saved and
+    #the arrays are compacted once, so the iterations never copy the data of the whole chunk
+    columns = np.arange(len(parameters))
+    result, result_cost, converged = parameters.copy(), np.empty(len(parameters)), np.zeros(len(parameters), dtype=bool)
+    decays, values = _evaluate(t, parameters)
+    residuals = (y - values) * weights
+    cost = (residuals**2).sum(axis=1)
+    #a cost below tolerance^2 times the energy of the signal is an exact fit: it can not decrease anymore, but it converged
+    exact_cost = tolerance**2 * ((y * weights)**2).sum(axis=1)
+    damping = np.full(len(parameters), 1e-3)
+    log_rate_limits = np.log([1e-3 / (t[-1] - t[0]), 1e3 / np.min(np.diff(t))])
+    identity = np.eye(parameters.shape[1])
+
+    for _ in range(max_iterations):
+        jacobian = _jacobian(t, parameters, decays, weights)
+        jtj = jacobian @ jacobian.transpose(0, 2, 1)
+        gradient = (jacobian @ residuals[:, :, None])[:, :, 0]
+        #Marquardt damping: the diagonal is scaled, plus a small term for the parameters without effect
+        diagonal = np.einsum('mkk->mk', jtj)
+        system = jtj + (damping[:, None] * diagonal + 1e-12)[:, :, None] * identity
+        step = np.linalg.solve(system, gradient[:, :, None])[:, :, 0]
+
+        candidate = parameters + step
+        candidate[:, 1:-1:2] = np.clip(candidate[:, 1:-1:2], *log_rate_limits)
+        candidate_decays, candidate_values = _evaluate(t, candidate)
+        candidate_residuals = (y - candidate_values) * weights
+        candidate_cost = (candidate_residuals**2).sum(axis=1)
+
+        better = np.isfinite(candidate_cost) & (candidate_cost < cost)
+        stop = (better & ((cost - candidate_cost) <= tolerance * cost)) | (np.where(better, candidate_cost, cost) <= exact_cost)
+        #copyto with a mask writes the accepted columns in place, without the temporary copies of fancy indexing
+        np.copyto(parameters, candidate, where=better[:, None])
+        np.copyto(decays, candidate_decays, where=better[:, None, None])
+        np.copyto(residuals, candidate_residuals, where=better[:, None])
+        np.copyto(cost, candidate_cost, where=better)
+        damping = np.where(better, damping / 10, damping * 10)
+
+        #a column stops when its cost does not decrease anymore (converged), or when no step reduces it (not converged)
+        finished = stop | (damping > 1e10)
+        if finished.any():
+            result[columns[finished]], result_cost[columns[finished]] = parameters[finished], cost[finished]
+            converged[columns[stop]] = True
+            running = ~finished
+            columns, parameters, decays, residuals, cost, damping = columns[running], parameters[running], decays[running], residuals[running], cost[running], damping[running]
+            y, weights, exact_cost = y[running], weights[running], exact_cost[running]
+            if len(columns) == 0:
+                break
+
+    #the columns still running after max_iterations did not converge
+    result[columns], result_cost[columns] = parameters, cost
+    return result, result_cost, converged
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def fit_exponentials(
+    t : np.ndarray,
+    values : np.ndarray,
+    n_exponentials : int = 1,
+    max_iterations : int = MAX_ITERATIONS,
+    tolerance : float = TOLERANCE,
+    chunk_size : int = CHUNK_SIZE
+    ) -> dict:
+    '''
+    Fits each column of values with one or two exponentials plus a constant, all the columns together.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - t:
+            the time axis, a value for each row of values
+         - values:
+            2D numpy array, a row for each time and a column for each transient. NaN values are ignored
+         - n_exponentials:
+            1 or 2
+         - max_iterations, tolerance:
+            Levenberg-Marquardt stops after max_iterations, or when the relative decrease of the cost is below tolerance
+         - chunk_size:
+            the number of columns fitted together
+
+        ......................................................
+         Return:
+         - a dictionary of numpy arrays, with a row for each column of values:
+            'rates' and 'amplitudes' (a column for each exponential, the fastest first), 'offset',
+            'residuals' (root mean square of the residuals) and 'converged'.
+            The columns with fewer valid points than the parameters are not fitted: their values are NaN and converged is False
+        ......................................................
+         Raises
+         - ValueError
+            If n_exponentials is not 1 or 2, or if t and values do not have the same number of rows.
+        ......................................................
+        ......................................................
+    '''
+    if n_exponentials not in (1, 2): raise ValueError('n_exponentials must be 1 or 2')
+    t = np.asarray(t, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if values.ndim != 2 or values.shape[0] != len(t): raise ValueError('values must have a row for each time')
+
+    #the columns are the batch: a row for each transient makes the sums along time contiguous
+    y = np.ascontiguousarray(values.T)
+    weights = (~np.isnan(y)).astype(float)
+    y = np.where(weights > 0, y, 0.)
+
+    n_parameters = 2*n_exponentials + 1
+    parameters = np.full((y.shape[0], n_parameters), np.nan)
+    cost = np.full(y.shape[0], np.nan)
+    converged = np.zeros(y.shape[0], dtype=bool)
+    #a column with fewer valid points than the parameters (e.g. all NaN) has no fit
+    fitted = np.flatnonzero(weights.sum(axis=1) >= n_parameters)
+    for start in range(0, len(fitted), chunk_size):
+        chunk = fitted[start : start + chunk_size]
+        first_guess = initial_estimates(t, y[chunk], weights[chunk], n_exponentials)
+        parameters[chunk], cost[chunk], converged[chunk] = _levenberg_marquardt(t, y[chunk], weights[chunk], first_guess, max_iterations, tolerance)
+
+    amplitudes = parameters[:, 0:-1:2]
+    rates = np.exp(parameters[:, 1:-1:2])
+    order = np.argsort(-rates, axis=1)            #the fastest exponential first
+    return {
+        'rates' : np.take_along_axis(rates, order, axis=1),
+        'amplitudes' : np.take_along_axis(amplitudes, order, axis=1),
+        'offset' : parameters[:, -1],
+        'residuals' : np.sqrt(cost / np.maximum(weights.sum(axis=1), 1)),
+        'converged' : converged
+        }
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def fit_transients(
+    transient_norm : pd.DataFrame,
+    n_exponentials : int = 1,
+    t_start : float = 0.,
+    t_stop : float = None
+    ) -> pd.DataFrame:
+    '''
+    Fits the normalized transients of each temperature with one or two exponentials.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - transient_norm:
+            the normalized transients, with time as index and temperature as columns
+         - n_exponentials:
+            1 or 2
+         - t_start, t_stop:
+            the time range of the fit. By default from the switch off of the light (t = 0) to the end of the transient
+
+        ......................................................
+         Return:
+         - a dataframe with temperature as index and, for each exponential, the emission rate and the amplitude,
+           then the offset, the root mean square of the residuals and whether the fit converged
+        ......................................................
+        ......................................................
+    '''
+    time = transient_norm.index.to_numpy(dtype=float)
+    rows = (time >= t_start) & (time <= (np.inf if t_stop is None else t_stop))
+    fit = fit_exponentials(time[rows], transient_norm.to_numpy(dtype=float)[rows], n_exponentials)
+
+    table = {}
+    for k in range(n_exponentials):
+        table[f'Emission rate {k + 1} (Hz)'] = fit['rates'][:, k]
+        table[f'Amplitude {k + 1}'] = fit['amplitudes'][:, k]
+    table['Offset'] = fit['offset']
+    table['Residual'] = fit['residuals']
+    table['Converged'] = fit['converged']
+    return pd.DataFrame(table, index=pd.Index(transient_norm.columns.to_numpy(dtype=float), name=transient_norm.columns.name))
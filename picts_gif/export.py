@@ -0,0 +1,236 @@
+import argparse
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import picts_gif
+from picts_gif import pipeline
+from picts_gif import profiling
+from picts_gif import quality_control
+from picts_gif import utilities
+from picts_gif.campaign_store import CampaignStore
+from picts_gif.picts_result import PictsResult
+from picts_gif.cli import add_selection_arguments, selection_from_arguments
+
+#export.py writes the numbers of a run (transients, spectrum, gates and emission rates) to columnar files,
+#without creating any animation. It is called from the CLI as:
+#   picts_gif_start export --path data.tdms --dict dict.json --output-dir ./output --format csv
+#matplotlib is never imported by this module, so batch jobs that only need the numbers start faster and use less memory.
+
+FORMATS = ['csv', 'npz', 'parquet', 'store']
+
+
+def gates_table(
+    gates : np.ndarray, 
+    en : np.ndarray = None
+    ) -> pd.DataFrame:
+    '''
+    Returns a dataframe with a row for each rate window: t1, t2 and the emission rate.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - gates:
+            numpy array with a (t1, t2) pair for each rate window, as returned by from_transient_to_PICTS_spectrum
+         - en:
+            the emission rate of each rate window, as in the en of a PictsResult. If None, en = x / t1 with the x of each beta = t2 / t1
+            (see utilities.rate_window_constant): the equation is solved once for each beta, not for each window
+
+        ......................................................
+         Return:
+         - a dataframe with columns 't1 (s)', 't2 (s)' and 'Rate Window (Hz)'
+        ......................................................
+        ......................................................
+    '''
+    if en is None:
+        #t2 / t1 is beta up to the rounding of t2 = beta t1
+        betas, inverse = np.unique(np.round(gates[:,1] / gates[:,0], 12), return_inverse=True)
+        en = np.array([utilities.rate_window_constant(beta) for beta in betas])[inverse] / gates[:,0]
+    table = pd.DataFrame({
+        't1 (s)' : gates[:,0],
+        't2 (s)' : gates[:,1],
+        'Rate Window (Hz)' : en
+        })
+    table.index.name = 'Gate'
+    return table
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def export_results(
+    output_dir : str,
+    normalized_transient : pd.DataFrame,
+    picts : pd.DataFrame,
+    gates : np.ndarray,
+    file_format : str = 'csv',
+    metadata : dict = None,
+    sample : str = None,
+    en : np.ndarray = None
+    ) -> list:
+    '''
+    Writes transients, spectrum, gates table and emission rates in output_dir.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - output_dir:
+            the directory where the files are written. It is created if it does not exist
+         - normalized_transient, picts, gates:
+            the outputs of pipeline.compute
+         - file_format:
+            'csv' (one file for each table), 'npz' (a single numpy archive) or 'parquet' (one file for each table,
+            it needs pyarrow or fastparquet installed) or 'store' (output_dir is a campaign store, see campaign_store.py)
+         - metadata:
+            a dictionary written as metadata.json next to the data. In a store, its configuration is kept with the sample
+         - sample:
+            with 'store', the name of the sample. If it is already in the store, its new temperatures are appended
+         - en:
+            the emission rate of each rate window (the en of the PictsResult). If None, it is computed from the gates (see gates_table)
+
+        ......................................................
+         Return:
+         - the list of the written files
+        ......................................................
+         Raises
+         - ValueError
+            If file_format is not supported, or if the sample name is missing with 'store'.
+        ......................................................
+        ......................................................
+    '''
+    if file_format not in FORMATS: raise ValueError(f'Format must be one of {FORMATS}')
+    if file_format == 'store' and sample is None: raise ValueError('A sample name is needed to write in a store')
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    table = gates_table(gates, en)
+    written = []
+
+    if file_format == 'store':
+        #no metadata.json here: the store keeps the configuration in its index, and a file would be overwritten by the next sample
+        result = PictsResult(
+            normalized_transient.to_numpy(), normalized_transient.index.to_numpy(), normalized_transient.columns.to_numpy(),
+            gates=gates, en=table['Rate Window (Hz)'].to_numpy(), spectrum=picts.to_numpy()
+            )
+        store = CampaignStore(output_dir)
+        if sample in store.samples():
+            store.append_temperatures(sample, result)
+        else:
+            store.add_sample(sample, result, None if metadata is None else metadata.get('configuration'))
+        return [output_dir / sample]
+
+    if file_format == 'npz':
+        path = output_dir / 'picts.npz'
+        np.savez(
+            path,
+            time=normalized_transient.index.to_numpy(),
+            temperature=normalized_transient.columns.to_numpy(dtype=float),
+            transients=normalized_transient.to_numpy(),
+            spectrum_temperature=picts.index.to_numpy(),
+            spectrum=picts.to_numpy(),
+            t1=table['t1 (s)'].to_numpy(),
+            t2=table['t2 (s)'].to_numpy(),
+            emission_rates=table['Rate Window (Hz)'].to_numpy()
+            )
+        written.append(path)
+    else:
+        #csv and parquet: a file for each table. Parquet wants strings as column names
+        tables = {'transients' : normalized_transient, 'spectrum' : picts, 'gates' : table}
+        for name, df in tables.items():
+            path = output_dir / f'{name}.{file_format}'
+            if file_format == 'csv':
+                df.to_csv(path)
+            else:
+                df = df.copy()
+                df.columns = df.columns.astype(str)
+                df.to_parquet(path)
+            written.append(path)
+
+    if metadata is not None:
+        path = output_dir / 'metadata.json'
+        with open(path, 'w') as pfile:
+            json.dump(metadata, pfile, indent=4)
+        written.append(path)
+
+    return written
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def main(argv : list = None):
+    '''
+    The export subcommand. From here i manage input data from CLI.
+    '''
+    parser = argparse.ArgumentParser(prog='picts_gif_start export', description='Write transients, spectrum, gates and emission rates to files')
+
+    parser.add_argument(
+        "-p",
+        "--path",
+        type=str,
+        required=True,
+        help="The path to the tdms file. \n E.g.: --path /home/user/desktop/data.tdms"
+        )
+
+    parser.add_argument(
+        "-d",
+        "--dict",
+        type=str,
+        required=True,
+        help="The path to the dictionary json file. \n E.g.: --dict /home/user/desktop/dict.json"
+        )
+
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        type=str,
+        required=True,
+        help="The directory where the files are written. \n E.g.: --output-dir ./output"
+        )
+
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        default='csv',
+        choices=FORMATS,
+        help="The format of the files. With store, the output directory is a campaign store and the run is added as a sample. E.g.: --format npz"
+        )
+
+    parser.add_argument(
+        '--sample',
+        type=str,
+        default=None,
+        help="With --format store, the name of the sample in the store. Default: the name of the tdms file"
+        )
+
+    parser.add_argument(
+        '--profile',
+        type=str,
+        default=None,
+        help="The path of a json file where time, cpu time and memory of each stage of the run are written. E.g.: --profile report.json"
+        )
+
+    add_selection_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    with profiling.profile_to(args.profile):
+        selection = selection_from_arguments(args)
+        result = pipeline.compute_result(args.path, args.dict, selection)
+        normalized_transient, picts, gates = result.to_dataframe('transient'), result.to_dataframe('spectrum'), result.gates
+
+        with open(args.dict, "r") as pfile:
+            configuration = json.load(pfile)
+        metadata = {
+            'source' : str(args.path),
+            'configuration' : configuration,
+            'selection' : selection,
+            'version' : picts_gif.__version__
+            }
+        #the transients rejected by the quality control, and why
+        if result.quality is not None:
+            metadata['quality_control'] = quality_control.summary(result.quality, result.temperature)
+
+        with profiling.stage('export', format=args.format):
+            sample = args.sample if args.sample is not None else Path(args.path).stem
+            written = export_results(args.output_dir, normalized_transient, picts, gates, args.format, metadata, sample, result.en)
+        for path in written:
+            print(f"Saved {path}")
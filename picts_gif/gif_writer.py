@@ -0,0 +1,234 @@
+from io import BytesIO
+import struct
+import numpy as np
+from PIL import Image
+from matplotlib.animation import PillowWriter
+from typing import List, Tuple
+from picts_gif import profiling
+
+#The PillowWriter of matplotlib quantizes every frame of the animation on its own and writes it whole.
+#In our animations most of the frame is the static axes, and between one frame and the next only a few pixels change.
+#The GlobalPaletteGifWriter handles this case:
+# - identical consecutive frames are merged, extending the duration of the previous frame
+# - a single palette is computed for the whole animation, and each frame is quantized against it
+# - only the bounding box that changed since the previous frame is written, and inside that box
+#   the unchanged pixels are marked as transparent (GIF disposal method 1, 'do not dispose')
+
+#GIF format reference: https://www.w3.org/Graphics/GIF/spec-gif89a.txt
+
+TRANSPARENT_INDEX = 255          #the last palette entry is reserved for transparency
+MAX_PALETTE_SAMPLES = 16         #maximum number of frames used to compute the global palette
+
+
+class ProfiledPillowWriter(PillowWriter):
+    """
+  ProfiledPillowWriter is matplotlib's PillowWriter, with the rendering of each frame and the encoding of the gif
+  measured as profiling stages ('gif_grab_frame' and 'gif_encode', see profiling.py).
+  """
+
+    def grab_frame(self, **savefig_kwargs):
+        with profiling.stage('gif_grab_frame'):
+            super().grab_frame(**savefig_kwargs)
+
+    def finish(self):
+        if not self._frames: raise RuntimeError('no frames grabbed')
+        with profiling.stage('gif_encode', n_frames=len(self._frames), writer='pillow'):
+            super().finish()
+
+
+class GlobalPaletteGifWriter(PillowWriter):
+    """
+  GlobalPaletteGifWriter writes a GIF with a global palette and delta frames.
+  It is a drop in replacement of matplotlib's PillowWriter, and it can be passed to FuncAnimation.save
+
+  .............................
+  Attributes:
+
+  fps            : int
+                  Movie frame rate (per second)
+ ................................
+  Methods:
+
+  grab_frame(self):
+    called by FuncAnimation for each frame. The frame is stored only if it differs from the previous one,
+    otherwise the duration of the previous one is extended.
+
+  finish(self):
+    called by FuncAnimation at the end of the animation. It computes the global palette and writes the file.
+    If no frame was grabbed (e.g. the animation failed on its first frame), nothing is written and a RuntimeError is raised.
+  """
+
+    def setup(self, fig, outfile, dpi=None):
+        super().setup(fig, outfile, dpi=dpi)
+        self._frames = []              #list of RGB numpy arrays, without consecutive duplicates
+        self._durations = []           #duration in ms of each stored frame
+
+    def grab_frame(self, **savefig_kwargs):
+        with profiling.stage('gif_grab_frame'):
+            buf = BytesIO()
+            self.fig.savefig(buf, **{**savefig_kwargs, "format": "rgba", "dpi": self.dpi})
+            width, height = self.frame_size
+            frame = np.frombuffer(buf.getbuffer(), dtype=np.uint8).reshape(height, width, 4)[:, :, :3].copy()
+
+        #If nothing changed, I don't store the frame: the previous frame simply lasts longer
+        if self._frames and np.array_equal(frame, self._frames[-1]):
+            self._durations[-1] += 1000 / self.fps
+            return
+        self._frames.append(frame)
+        self._durations.append(1000 / self.fps)
+
+    def finish(self):
+        #FuncAnimation calls finish also when a frame fails: the error says why there is no gif, instead of an IndexError on the first frame
+        if not self._frames: raise RuntimeError('no frames grabbed')
+        with profiling.stage('gif_encode', n_frames=len(self._frames), writer='global_palette'):
+            self._write()
+
+    def _write(self):
+        palette = _global_palette(self._frames)
+
+        #palette image used by PIL to quantize each frame against the global palette
+        palette_image = Image.new('P', (1, 1))
+        palette_image.putpalette(palette)
+
+        with open(self.outfile, 'wb') as gif_file:
+            height, width = self._frames[0].shape[:2]
+            gif_file.write(b'GIF89a')
+            gif_file.write(struct.pack('<HHBBB', width, height, 0xF7, 0, 0))   #logical screen with a 256 colors global table
+            gif_file.write(bytes(palette))
+            gif_file.write(b'!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')          #loop forever
+
+            previous = None
+            elapsed = 0.
+            for frame, duration in zip(self._frames, self._durations):
+                #GIF delays are in hundredths of second. I round the cumulative time to avoid drifting
+                delay = int(round((elapsed + duration) / 10)) - int(round(elapsed / 10))
+                elapsed += duration
+
+                if previous is None:
+                    box = (0, 0, width, height)
+                    indexes = _quantize(frame, palette_image)
+                else:
+                    box = _changed_box(previous, frame)
+                    left, top, right, bottom = box
+                    indexes = _quantize(frame[top:bottom, left:right], palette_image)
+                    #the pixels that did not change are left transparent, so that the previous frame shows through
+                    unchanged = np.all(frame[top:bottom, left:right] == previous[top:bottom, left:right], axis=2)
+                    indexes[unchanged] = TRANSPARENT_INDEX
+                previous = frame
+
+                #graphic control extension: disposal method 1 (do not dispose) and transparency flag
+                gif_file.write(struct.pack('<BBBBHBB', 0x21, 0xF9, 4, (1 << 2) | 1, delay, TRANSPARENT_INDEX, 0))
+                gif_file.write(_image_block(indexes, palette, box[:2]))
+            gif_file.write(b';')
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def gif_writer(
+    fps : int = 30,
+    global_palette : bool = False
+    ) -> PillowWriter:
+    '''
+    Returns the writer used to save the animations as gif.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - fps:
+            frames per second of the gif
+         - global_palette:
+            if True, a GlobalPaletteGifWriter is returned, otherwise matplotlib's PillowWriter (ProfiledPillowWriter)
+
+        ......................................................
+         Return:
+         - the writer to pass to FuncAnimation.save
+        ......................................................
+        ......................................................
+    '''
+    if global_palette:
+        return GlobalPaletteGifWriter(fps=fps)
+    return ProfiledPillowWriter(fps=fps)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _global_palette(frames : List[np.ndarray]) -> bytes:
+    '''
+    Computes one palette (256 RGB entries) for all the frames.
+    The palette is computed on a sample of frames, stacked one on top of the other.
+    The last entry is reserved to transparency, and it is a copy of the first one.
+    '''
+    step = max(1, len(frames) // MAX_PALETTE_SAMPLES)
+    sample = np.concatenate(frames[::step] + [frames[-1]], axis=0)
+    quantized = Image.fromarray(sample, 'RGB').quantize(colors=TRANSPARENT_INDEX, method=Image.Quantize.MEDIANCUT)
+    colors = quantized.getpalette()[:3*TRANSPARENT_INDEX]
+    colors += [0] * (3*TRANSPARENT_INDEX - len(colors))
+    return bytes(colors + colors[:3])
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _quantize(
+    frame : np.ndarray,
+    palette_image : Image.Image
+    ) -> np.ndarray:
+    '''
+    Maps each pixel of an RGB frame to the nearest color of the global palette. Returns the array of indexes.
+    '''
+    indexes = np.array(Image.fromarray(frame, 'RGB').quantize(palette=palette_image, dither=Image.Dither.NONE))
+    #the transparent entry has the same color of the first one. Pixels mapped on it are moved to the first one
+    indexes[indexes == TRANSPARENT_INDEX] = 0
+    return indexes
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _changed_box(
+    previous : np.ndarray,
+    frame : np.ndarray
+    ) -> Tuple[int, int, int, int]:
+    '''
+    Returns the bounding box (left, top, right, bottom) of the pixels that differ between two frames.
+    '''
+    changed = np.any(frame != previous, axis=2)
+    rows = np.flatnonzero(changed.any(axis=1))
+    columns = np.flatnonzero(changed.any(axis=0))
+    return int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _image_block(
+    indexes : np.ndarray,
+    palette : bytes,
+    offset : Tuple[int, int]
+    ) -> bytes:
+    '''
+    Returns the image descriptor and the LZW compressed data of a frame, placed at offset in the logical screen.
+    The compression is done by PIL: I save the frame as a single image gif, and I copy its image data.
+    '''
+    image = Image.fromarray(indexes, 'P')
+    image.putpalette(palette)
+    buf = BytesIO()
+    image.save(buf, format='GIF', optimize=False, interlace=False)
+    data = buf.getvalue()
+
+    #I skip header, logical screen descriptor and global color table
+    position = 13
+    if data[10] & 0x80:
+        position += 3 * 2 ** ((data[10] & 0x07) + 1)
+    #I skip the extensions, if any
+    while data[position] == 0x21:
+        position += 2
+        while data[position]:
+            position += data[position] + 1
+        position += 1
+
+    #image descriptor. I move the frame in its position and I drop the local color table flag
+    height, width = indexes.shape
+    flags = data[position + 9]
+    descriptor = struct.pack('<BHHHHB', 0x2C, offset[0], offset[1], width, height, flags & 0x40)
+    position += 10
+    if flags & 0x80:
+        position += 3 * 2 ** ((flags & 0x07) + 1)
+    return descriptor + data[position:-1]
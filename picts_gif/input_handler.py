@@ -1,7 +1,11 @@
 import pandas as pd
 import numpy as np
 from picts_gif import utilities
+from picts_gif import profiling
+from picts_gif import quality_control
+from picts_gif.picts_result import PictsResult
 import json
+import warnings
 
 
 
@@ -9,7 +13,8 @@ import json
 def read_transients_from_tdms(
       path : str, 
       configuration_path : str, 
-      data_group_name : str = 'Measured Data' 
+      data_group_name : str = 'Measured Data',
+      selection : dict = None
    ) -> pd.DataFrame :
       '''
       This method transforms a TDMS file in a Dataframe.
@@ -24,6 +29,9 @@ def read_transients_from_tdms(
             path to a json file with all needed information to analyze the input data.
          - data_group_name: str
             the string key in wich data are stored in TDMS file. 'Measured Data' by defaoult
+         - selection: dict
+            the temperatures to read: a dictionary with the arguments of utilities.select_temperatures 
+            (t_min, t_max, stride, values). If None, all the temperatures are read
         
          ......................................................
          RETURN:
@@ -40,18 +48,37 @@ def read_transients_from_tdms(
       # This option is not universal, but specific to our data acquisition system.
       #Becouse a problem in data acquisition software (LabVIEW) the data transient stored are inverted 
       #To have the proper data, i have to return the inverted dataframe
-      data = -utilities.convert_tdms_file_to_dataframe(path, data_group_name)
+      set_zero = configuration['set_zero']
+      if selection is None:
+         data = -utilities.convert_tdms_file_to_dataframe(path, data_group_name)
+      else:
+         #Only the selected channels are read. The channel used to fix the zero of the time axis (set_zero)
+         #is read anyway, and set_zero becomes its position among the channels read
+         temperatures = utilities.tdms_temperatures(path, data_group_name)
+         positions = list(utilities.select_temperatures(temperatures, **selection))
+         read_positions = positions
+         if set_zero != 'auto':
+            reference = range(len(temperatures))[set_zero]
+            read_positions = sorted(set(positions) | {reference})
+            set_zero = read_positions.index(reference)
+         data = -utilities.convert_tdms_file_to_dataframe(path, data_group_name, read_positions)
       
       
       data = utilities.set_column_and_index_name(data)
       
       # set the correct value of the current. Transient current values come out from current amplifier. So, to have 
       # proper values of current i need to take in account the gain of current amplifier
-      data = utilities.set_current_value(data, configuration['gain'])
+      with profiling.stage('set_current_value', **profiling.array_info(data)):
+         data = utilities.set_current_value(data, configuration['gain'])
         
       #Set the zero in x-axis. Dataframe represent current transient in function of time and temperature. Dataframe index are time values,
       #I want to set the value zero of my index exactly when current drop down. See README.md -> EXTRA for more information
-      data = utilities.check_and_fix_zero_x_axis_if_trigger_value_is_corrupted(data, configuration['set_zero'])
+      with profiling.stage('zero_fix', **profiling.array_info(data)):
+         data = utilities.check_and_fix_zero_x_axis_if_trigger_value_is_corrupted(data, set_zero)
+      
+      #The reference channel of the zero is dropped, if it was not selected
+      if selection is not None and read_positions != positions:
+         data = data.iloc[:, [read_positions.index(position) for position in positions]]
       
       #Some trim of data. Data at low temperature are too noisy. I want to drop them. 
       #The temperature is controlled during the experiment, through a linear thermal ramp.
@@ -65,7 +92,9 @@ def read_transients_from_tdms(
          ):
             left_index_cut = configuration['trim_left']
             right_index_cut = configuration['trim_right']
-            data = utilities.trim_dataframe(data, left_index_cut, right_index_cut)
+            with profiling.stage('trim', **profiling.array_info(data)) as info:
+               data = utilities.trim_dataframe(data, left_index_cut, right_index_cut)
+               info['trimmed_shape'] = list(data.shape)
        
       return data 
 
@@ -121,7 +150,8 @@ def normalized_transient(
           ......................................................
          Raises
          - ValueError
-            If the calculated i_light value is smaller than i_dark ones.
+            If the calculated i_light value is smaller than i_dark ones, with the ranges of the dictionary.
+            With 'auto' ranges or with the quality control, the columns that can not be normalized are NaN and a warning is given instead.
          ......................................................
          ......................................................
         '''
@@ -138,18 +168,12 @@ def normalized_transient(
         # and equal to one in the moments of light, I need to know the values ​​of the dark current and the light current. 
         #The signal is noisy, so it's best to average over a given range
         
-        #recover the values ​​of the dark current and light current from dictionary
-        i_dark_range = [configuration['i_dark_left'], configuration['i_dark_right']]
-        i_light_range = [configuration['i_light_left'], configuration['i_light_right'] ]
-
-        #the value of the light and dark currents are the averages of the values ​​of the currents in the assigned ranges
-        i_light = transient.loc[i_light_range[0]:i_light_range[1]].mean()
-        i_dark = transient.loc[i_dark_range[0]:i_dark_range[1]].mean()
-
-        #check if light current and dark current have proper values.        
-        if (i_light <= i_dark).any(): raise ValueError('In normalized_transient: i_light smaller than i_dark.')
-        
-        transient_norm = (transient-i_dark)/(i_light-i_dark)  #normalizing in this way allows you to set the dark current to zero and the light current to one
+        #The values ​​of the dark current and light current are the averages over the ranges of the dictionary, 
+        #or over the windows found for each column when they are 'auto' (see normalization_values).
+        #The work is done on the numpy array, the dataframe only gives index and columns back
+        with profiling.stage('normalization', **profiling.array_info(transient)):
+           values, _ = normalization_values(transient.to_numpy(dtype=float), transient.index.to_numpy(dtype=float), configuration, transient.columns)
+           transient_norm = pd.DataFrame(values, index=transient.index, columns=transient.columns, copy=False)
        
         return transient_norm
      
@@ -157,9 +181,166 @@ def normalized_transient(
 ###############################################################################################################################################################
 
    
+def normalization_values(
+       values : np.ndarray, 
+       time : np.ndarray, 
+       configuration : dict, 
+       temperatures = None
+       ):
+        '''
+         This method normalizes the transients of a numpy array, with the ranges of the configuration.
+         Each of the two ranges (i_light_left/right and i_dark_left/right) can be 'auto': then it is found for each column
+         (see utilities.detect_normalization_windows), and the columns that can not be normalized become NaN instead of stopping the run.
+         If the key 'quality_control' of the configuration is enabled, also the columns flagged by quality_control.quality_flags become NaN.
+         If the key 'baseline' is 'polynomial' or 'exponential', a baseline fitted on the dark window of each column is subtracted first
+         (see utilities.fit_baseline, with the keys 'baseline_order' and 'baseline_time_constant').
+         .....................................................
+         .....................................................
+
+         The input parameters are:
+         - values: 
+            2D numpy array of the transients, a row for each time and a column for each temperature
+         - time:
+            the increasing time axis
+         - configuration:
+            the content of the json file
+         - temperatures:
+            the temperature of each column, used only in the warnings
+        
+         ......................................................
+         Return:
+         - the normalized transients, a new numpy array
+         - a dictionary of numpy arrays, with a value for each column: the rows of the windows ('light_start', 'light_stop',
+           'dark_start', 'dark_stop', stop excluded), the currents 'i_light' and 'i_dark' and 'normalizable'.
+           With the quality control, also 'quality': the flags of quality_control.quality_flags
+         ......................................................
+         Raises
+         - ValueError
+            If the calculated i_light value is smaller than i_dark ones, when no range is 'auto' and the quality control is disabled.
+         ......................................................
+         ......................................................
+        '''
+        ranges = {name : [configuration[f'i_{name}_left'], configuration[f'i_{name}_right']] for name in ('light', 'dark')}
+        auto = [name for name, window in ranges.items() if 'auto' in window]
+        
+        if not auto:
+           #the same ranges for all the columns, as they have always been
+           detected = None
+           windows = {'normalizable' : np.ones(values.shape[1], dtype=bool)}
+           for name, (left, right) in ranges.items():
+              windows[f'{name}_start'] = np.full(values.shape[1], np.searchsorted(time, left, side='left'))
+              windows[f'{name}_stop'] = np.full(values.shape[1], np.searchsorted(time, right, side='right'))
+        else:
+           detected = utilities.detect_normalization_windows(values)
+           windows = {'normalizable' : detected['detected']}
+           for name, (left, right) in ranges.items():
+              if name in auto:
+                 windows[f'{name}_start'], windows[f'{name}_stop'] = detected[f'{name}_start'], detected[f'{name}_stop']
+              else:
+                 windows[f'{name}_start'] = np.full(values.shape[1], np.searchsorted(time, left, side='left'))
+                 windows[f'{name}_stop'] = np.full(values.shape[1], np.searchsorted(time, right, side='right'))
+        
+        #The dark current drifts with the temperature, and during a transient its slow tail biases the t2 gate.
+        #With the key 'baseline', a low order model fitted on the dark window of each column is subtracted before the means and the gates.
+        #The dark window is short, so its terms are kept only if significant and the correction is capped at 'baseline_max_correction'
+        #times i_light - i_dark (see utilities.fit_baseline): a wrong extrapolation can not swap light and dark
+        owned = False
+        if configuration.get('baseline'):
+           with profiling.stage('baseline', model=configuration['baseline'], **profiling.array_info(values)):
+              light, dark = utilities.column_window_means(
+                 values, np.array([windows['light_start'], windows['dark_start']]), np.array([windows['light_stop'], windows['dark_stop']])
+                 )
+              corrected = utilities.fit_baseline(
+                 values, time, windows['dark_start'], windows['dark_stop'], configuration['baseline'], 
+                 configuration.get('baseline_order', 1), configuration.get('baseline_time_constant'),
+                 max_correction=configuration.get('baseline_max_correction', 0.05) * np.nan_to_num(light - dark)
+                 )
+              values = np.subtract(values, corrected, out=corrected)       #the baseline array is reused, the input is not changed
+              owned = True
+        
+        if not auto:
+           i_light = utilities.range_mean(values, time, *ranges['light'])
+           i_dark = utilities.range_mean(values, time, *ranges['dark'])
+        else:
+           i_light = utilities.column_window_means(values, windows['light_start'], windows['light_stop'])
+           i_dark = utilities.column_window_means(values, windows['dark_start'], windows['dark_stop'])
+        
+        #With the quality control, the flagged columns are masked instead of stopping the run (see quality_control.py)
+        thresholds = quality_control.settings(configuration)
+        if thresholds is not None:
+           with profiling.stage('quality_control', **profiling.array_info(values)):
+              windows['quality'] = quality_control.quality_flags(values, time, i_light, i_dark, detected, **thresholds)
+           windows['normalizable'] &= windows['quality']['good']
+        elif not auto:
+           if (i_light <= i_dark).any(): raise ValueError('In normalized_transient: i_light smaller than i_dark.')
+        
+        #A column that can not be normalized does not stop the run: it becomes NaN, and I say which ones
+        windows['normalizable'] &= i_light > i_dark
+        if not windows['normalizable'].all():
+           flagged = np.flatnonzero(~windows['normalizable'])
+           names = flagged if temperatures is None else np.asarray(temperatures)[flagged]
+           warnings.warn(f'In normalized_transient: {len(flagged)} transients can not be normalized and are set to NaN: {list(names)}')
+           i_light, i_dark = np.where(windows['normalizable'], i_light, np.nan), np.where(windows['normalizable'], i_dark, np.nan)
+        
+        windows['i_light'], windows['i_dark'] = i_light, i_dark
+        #normalizing in this way allows you to set the dark current to zero and the light current to one
+        if owned:
+           values -= i_dark
+           values /= i_light - i_dark
+           return values, windows
+        return (values - i_dark) / (i_light - i_dark), windows
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+
+def normalization_windows(
+       transient : pd.DataFrame, 
+       configuration_path : str
+       ) -> pd.DataFrame:
+        '''
+         This method returns the windows used to normalize each transient, as normalized_transient finds them.
+         .....................................................
+         .....................................................
+
+         The input parameters are:
+         - transient: 
+            the raw transient dataframe from 'read_transient_from_*'    
+         - configuration_path:
+            path to a json file with all needed information to analyze the input data
+        
+         ......................................................
+         Return:
+         - a dataframe with temperature as index and, as columns, the time ranges of the windows (i_light_left, i_light_right, 
+           i_dark_left, i_dark_right), the currents i_light and i_dark and whether the transient can be normalized
+         ......................................................
+         ......................................................
+        '''
+        with open(configuration_path, "r") as pfile:
+            configuration = json.load(pfile)
+        time = transient.index.to_numpy(dtype=float)
+        with warnings.catch_warnings():
+           warnings.simplefilter('ignore')          #here the flagged columns are in the table
+           _, windows = normalization_values(transient.to_numpy(dtype=float), time, configuration)
+        
+        table = {}
+        for name in ('light', 'dark'):
+           start, stop = windows[f'{name}_start'], windows[f'{name}_stop']
+           empty = stop <= start
+           table[f'i_{name}_left'] = np.where(empty, np.nan, time[np.minimum(start, len(time) - 1)])
+           table[f'i_{name}_right'] = np.where(empty, np.nan, time[np.maximum(stop - 1, 0)])
+        table['i_light'], table['i_dark'] = windows['i_light'], windows['i_dark']
+        table['normalizable'] = windows['normalizable']
+        return pd.DataFrame(table, index=transient.columns)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+   
 def from_transient_to_PICTS_spectrum (
        transient_norm : pd.DataFrame, 
-       configuration_path : str
+       configuration_path : str,
+       uncertainty : bool = False
        ):
         '''
          This method transforms the normalized_transient dataframe into a dataframe containing the PICTS spectrum.
@@ -172,6 +353,8 @@ def from_transient_to_PICTS_spectrum (
             dataframe to analyze    
          - parameters_path:
             path to a json file with all needed information to analyze the input data
+         - uncertainty:
+            if True, the uncertainty of the spectrum is returned too (see picts_uncertainty_values)
         
          ......................................................
          Return:
@@ -179,6 +362,8 @@ def from_transient_to_PICTS_spectrum (
             a dataframe with the picts spectrum, with temperature as index and 'rate window' as columns.    
          - gates:
             a numpy array with a collection of pair float. Each pair represent a rate window
+         - bands:
+            only if uncertainty is True, a dictionary of dataframes shaped as picts: 'std', 'lower' and 'upper'
          ......................................................
          REFERENCES:
          For a better understanding of what a PICTS spectrum is and what a rate window represents see:
@@ -197,36 +382,192 @@ def from_transient_to_PICTS_spectrum (
             configuration = json.load(pfile)
         
         
+        result = PictsResult.from_dataframe(transient_norm)
+        picts_spectrum_values(result, configuration)
+        
+        #I put in order index and columns
+        picts = result.to_dataframe('spectrum')
+        picts.index.name = transient_norm.columns.name
+        
+        if uncertainty:
+           picts_uncertainty_values(result, configuration)
+           bands = {name : result.to_dataframe(name).set_axis(picts.index, axis=0) for name in ('std', 'lower', 'upper')}
+           return picts, result.gates, bands
+        return  picts, result.gates
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+
+def rate_window_values(
+       configuration : dict, 
+       time : np.ndarray = None
+       ):
+        '''
+         This method returns the t1 and t2 values of the rate windows of the configuration.
+         If the configuration has 'en_min' and 'en_max', the emission rates of the windows are log spaced between them 
+         and t1 is moved on the time axis (see utilities.create_log_spaced_t1_and_t2_values). Otherwise t1 is linear, 
+         from 't1_min' with steps of 't1_shift' (see utilities.create_t1_and_t2_values).
+         .....................................................
+         .....................................................
+
+         The input parameters are:
+         - configuration:
+            the content of the json file
+         - time:
+            the time axis of the transients, used only with the log spaced windows
+        
+         ......................................................
+         Return:
+         - t1 and t2, two numpy arrays with a value for each rate window
+         ......................................................
+         ......................................................
+        '''
+        if 'en_min' in configuration and 'en_max' in configuration:
+           return utilities.create_log_spaced_t1_and_t2_values(
+              configuration['en_min'], configuration['en_max'], configuration['n_windows'], configuration['beta'], time
+              )
+        return utilities.create_t1_and_t2_values(configuration['t1_min'], configuration['t1_shift'], configuration['n_windows'], configuration['beta'])
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def picts_spectrum_values(
+       result : PictsResult, 
+       configuration : dict
+       ) -> PictsResult:
+        '''
+         This method computes the PICTS spectrum of the normalized transients of a result, working on its numpy arrays.
+         It fills gates, en and spectrum of the result. See from_transient_to_PICTS_spectrum for the dataframe version.
+         .....................................................
+         .....................................................
+
+         The input parameters are:
+         - result: 
+            a PictsResult with the normalized transients    
+         - configuration:
+            the content of the json file
+        
+         ......................................................
+         Return:
+         - the same result, with gates, en and spectrum
+         ......................................................
+         ......................................................
+        '''
         #To have a PICTS spectrum, it is necessary to evaluate the difference of the current values ​​of the transients in two successive instants t1 and t2. 
         #Each pair generates a curve of the PICTS spectrum. The spectrum is a collection of these curves.
         #I calculate the values ​​of t1 and t2
-        t1, t2 = utilities.create_t1_and_t2_values(configuration['t1_min'], configuration['t1_shift'], configuration['n_windows'], configuration['beta'])
-        
+        t1, t2 = rate_window_values(configuration, result.time)
         
-        #Index of t1 and t2 values. Needed for using iloc later, since iloc has problems with tolerance.
-        #This method allows you to enumerate the values ​​of the indexes (which are floats with many digits after the comma).
-        #In this way, the first index corresponds to 1, the second to 2, etc., etc.
-        #This allows me to have a one-to-one correspondence between the values ​​of t1 and t2 
-        #and the indices of the time values ​​of the dataframe, which otherwise I would not know
-        t1_index, t2_index = utilities.create_index_for_t1_and_t2(transient_norm, t1, t2)
+        #Positions of t1 and t2 values in the time axis, needed to take rows by position since floats have problems with tolerance.
+        #The position is the one of the first time >= t (see utilities.backfill_positions)
+        with profiling.stage('create_index_for_t1_and_t2', n_windows=len(t1)):
+           t1_index = utilities.backfill_positions(result.time, t1)
+           t2_index = utilities.backfill_positions(result.time, t2)
         
-
         # Now I calculate emission rate from rate windows
-        en = utilities.calculate_en(t1, t2 = configuration['beta']*t1)
-        # Calculate picts signal for each rate window 
-        picts = pd.concat(
-           [transient_norm.iloc[t1-configuration['t_avg']:t1+configuration['t_avg']].mean()     #current value at istant t1
-           - transient_norm.iloc[t2-configuration['t_avg']:t2+configuration['t_avg']].mean() #current value at istant t2 \  
-               for t1,t2 in zip(t1_index,t2_index)], # i do it for every t1 and t2 pair
-            axis=1 
-            )
+        #With t2 = beta t1 the equation of en is solved once, then en = x / t1 for all the windows (see utilities.rate_window_constant)
+        with profiling.stage('calculate_en', n_windows=len(t1)):
+           result.en = utilities.rate_window_constant(configuration['beta']) / t1
         
-        #I put in order index and columns
-        picts.index=picts.index.astype(float) # more convinient for data analysis
-        picts.columns = pd.Index(en.round(3))           # there is nothing special in the number 3
-        picts.columns.name = 'Rate Window (Hz)'
-        gates = np.array([t1, t2]).T       # I traspose it so that each row corresponds to a rate window. In fact rate window coincide with (t1 - t2)^{-1}
+        # Calculate picts signal for each rate window: current value at istant t1 minus current value at istant t2.
+        # The means of all the gates are computed together, on views of the transients array.
+        # With the key 'gate_statistic' the mean can be replaced by a robust statistic (see utilities.gate_statistics)
+        with profiling.stage('spectrum', **profiling.array_info(result.transient)):
+           means = utilities.gate_statistics(
+              result.transient, np.concatenate([t1_index, t2_index]), configuration['t_avg'], configuration.get('gate_statistic', 'mean')
+              )
+           result.spectrum = np.ascontiguousarray((means[:len(t1)] - means[len(t1):]).T)     #a row for each temperature
+        
+        result.gates = np.array([t1, t2]).T       # I traspose it so that each row corresponds to a rate window. In fact rate window coincide with (t1 - t2)^{-1}
+        return result
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def picts_uncertainty_values(
+       result : PictsResult, 
+       configuration : dict
+       ) -> PictsResult:
+        '''
+         This method estimates the uncertainty of the PICTS spectrum of a result, from the samples inside the gates (see utilities.spectrum_uncertainty).
+         It fills the uncertainty of the result: the standard deviation of each point and a bootstrap confidence band.
+         The optional keys of the json file are 'n_bootstrap' (default 200), 'confidence' (default 0.95) and 'bootstrap_seed'.
+         .....................................................
+         .....................................................
 
+         The input parameters are:
+         - result: 
+            a PictsResult with the normalized transients and the gates of the spectrum (see picts_spectrum_values)
+         - configuration:
+            the content of the json file
         
-        return  picts, gates
+         ......................................................
+         Return:
+         - the same result, with its uncertainty
+         ......................................................
+         Raises
+         - ValueError
+            If the spectrum is not computed yet.
+         ......................................................
+         ......................................................
+        '''
+        if result.gates is None: raise ValueError('The spectrum is not computed yet')
+        #The band is the one of the mean gates: with a robust 'gate_statistic' it is an estimate of the band of the spectrum
+        positions = [utilities.backfill_positions(result.time, t) for t in result.gates.T]
+        with profiling.stage('uncertainty', **profiling.array_info(result.transient)):
+           result.uncertainty = utilities.spectrum_uncertainty(
+              result.transient, 
+              *positions, 
+              configuration['t_avg'], 
+              n_bootstrap=configuration.get('n_bootstrap', 200), 
+              confidence=configuration.get('confidence', 0.95), 
+              seed=configuration.get('bootstrap_seed')
+              )
+        return result
 
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+
+def compute_result(
+       transient : pd.DataFrame, 
+       configuration_path : str,
+       uncertainty : bool = False
+       ) -> PictsResult:
+        '''
+         This method normalizes the raw transients and computes the PICTS spectrum, as normalized_transient 
+         and from_transient_to_PICTS_spectrum do, but it keeps everything in numpy arrays.
+         .....................................................
+         .....................................................
+
+         The input parameters are:
+         - transient: 
+            the raw transient dataframe from 'read_transient_from_*'    
+         - configuration_path:
+            path to a json file with all needed information to analyze the input data
+         - uncertainty:
+            if True, the uncertainty of the spectrum is computed too (see picts_uncertainty_values)
+        
+         ......................................................
+         Return:
+         - a PictsResult. Its to_dataframe method gives the dataframes of normalized_transient and from_transient_to_PICTS_spectrum.
+           Its mask says which temperatures were normalized, its quality has the flags of the quality control (None if it is disabled)
+         ......................................................
+         Raises
+         - ValueError
+            If the calculated i_light value is smaller than i_dark ones, as in normalization_values.
+         ......................................................
+         ......................................................
+        '''
+        with open(configuration_path, "r") as pfile:
+            configuration = json.load(pfile)
+        
+        result = PictsResult.from_dataframe(transient)
+        with profiling.stage('normalization', **profiling.array_info(result.transient)):
+           result.transient, windows = normalization_values(result.transient, result.time, configuration, result.temperature)
+        #the plots skip the masked columns, the export writes the summary of the quality control
+        result.mask = windows['normalizable']
+        result.quality = windows.get('quality')
+        picts_spectrum_values(result, configuration)
+        return picts_uncertainty_values(result, configuration) if uncertainty else result
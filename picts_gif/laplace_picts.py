@@ -0,0 +1,187 @@
+import hashlib
+import numpy as np
+import pandas as pd
+
+#laplace_picts.py computes a Laplace-PICTS spectrum: for each temperature, the distribution f(e) of the emission rates
+#whose exponentials sum to the normalized transient
+#   y(t) = sum_e f(e) exp(-e t)
+#The two gates spectrum of from_transient_to_PICTS_spectrum is a boxcar filter, too broad to resolve traps with close
+#emission rates. Inverting the Laplace transform resolves them, but the inversion is ill conditioned,
+#so it is regularized (Tikhonov): f minimizes ||K f - y||^2 + alpha^2 ||f||^2, where K is the kernel exp(-e t).
+#The kernel depends only on the time axis and on the emission rates grid, not on the temperature:
+# - its SVD, K = U S V^T, is computed once and kept in a cache (see get_kernel)
+# - the solution is f = V diag(s / (s^2 + alpha^2)) U^T y, so all the temperatures are solved together
+#   with two matrix products, instead of an optimization for each temperature.
+
+KERNEL_CACHE_SIZE = 8              #kernels kept in memory
+REGULARIZATION = 1e-3              #alpha, relative to the largest singular value of the kernel
+N_RATES = 100                      #points of the emission rates grid
+MIN_ROWS = 2                       #valid rows needed to invert a column: fewer give a NaN distribution
+
+_kernel_cache = {}
+
+
+class LaplaceKernel:
+    """
+  LaplaceKernel holds the SVD of the kernel exp(-e t) for a time axis and a grid of emission rates.
+
+  .............................
+  Attributes:
+
+  time           : np.ndarray
+                  The time axis, in s
+
+  rates          : np.ndarray
+                  The grid of emission rates, in Hz
+
+  u, s, vt       : np.ndarray
+                  The thin SVD of the kernel: kernel = u @ diag(s) @ vt
+ ................................
+  Methods:
+
+  solve(self, values, regularization):
+    returns the regularized distribution of the emission rates of each column of values.
+  """
+
+    def __init__(
+        self,
+        time : np.ndarray,
+        rates : np.ndarray
+        ):
+        self.time = np.asarray(time, dtype=float)
+        self.rates = np.asarray(rates, dtype=float)
+        self.u, self.s, self.vt = np.linalg.svd(np.exp(-np.outer(self.time, self.rates)), full_matrices=False)
+
+    def solve(
+        self,
+        values : np.ndarray,
+        regularization : float = REGULARIZATION
+        ) -> np.ndarray:
+        '''
+        Returns the Tikhonov solution for each column of values (a row for each time): an array with a row for each rate.
+        '''
+        alpha = regularization * self.s[0]
+        filter_factors = self.s / (self.s**2 + alpha**2)
+        return (self.vt.T * filter_factors) @ (self.u.T @ values)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def get_kernel(
+    time : np.ndarray,
+    rates : np.ndarray
+    ) -> LaplaceKernel:
+    '''
+    Returns the kernel of a time axis and of a rates grid. The SVD is computed only the first time they are seen.
+    '''
+    time = np.ascontiguousarray(time, dtype=float)
+    rates = np.ascontiguousarray(rates, dtype=float)
+    key = hashlib.sha1(time.tobytes() + b'|' + rates.tobytes()).hexdigest()
+    if key not in _kernel_cache:
+        if len(_kernel_cache) >= KERNEL_CACHE_SIZE:
+            _kernel_cache.pop(next(iter(_kernel_cache)))        #the oldest kernel
+        _kernel_cache[key] = LaplaceKernel(time, rates)
+    return _kernel_cache[key]
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def rates_grid(
+    time : np.ndarray,
+    n_rates : int = N_RATES
+    ) -> np.ndarray:
+    '''
+    Returns a log spaced grid of emission rates that can be measured on a time axis:
+    from the inverse of the duration of the transient to the inverse of two time steps.
+    '''
+    return np.geomspace(1 / (time[-1] - time[0]), 1 / (2 * (time[1] - time[0])), n_rates)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def laplace_inversion(
+    time : np.ndarray,
+    values : np.ndarray,
+    rates : np.ndarray,
+    regularization : float = REGULARIZATION
+    ) -> np.ndarray:
+    '''
+    Returns the distribution of the emission rates of each column of values.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - time:
+            the time axis, a value for each row of values
+         - values:
+            2D numpy array, a row for each time and a column for each transient
+         - rates:
+            the grid of emission rates
+         - regularization:
+            alpha, relative to the largest singular value of the kernel. Larger values give smoother distributions
+
+        ......................................................
+         Return:
+         - 2D numpy array with a row for each column of values and a column for each rate.
+           The columns with less than MIN_ROWS valid values (e.g. the ones masked by quality_control) give a row of NaN
+        ......................................................
+        ......................................................
+    '''
+    values = np.asarray(values, dtype=float)
+    nan = np.isnan(values)
+    distribution = np.full((values.shape[1], len(rates)), np.nan)
+
+    #all the complete columns share the kernel: they are solved together
+    complete = ~nan.any(axis=0)
+    distribution[complete] = get_kernel(time, rates).solve(values[:, complete], regularization).T
+
+    #a column with NaN has its own time axis: its kernel is built without the missing rows.
+    #A column without enough valid rows has no kernel, and its distribution stays NaN
+    for column in np.flatnonzero(~complete & ((~nan).sum(axis=0) >= MIN_ROWS)):
+        valid = ~nan[:, column]
+        distribution[column] = LaplaceKernel(time[valid], rates).solve(values[valid, column], regularization)
+    return distribution
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def laplace_spectrum(
+    transient_norm : pd.DataFrame,
+    rates : np.ndarray = None,
+    regularization : float = REGULARIZATION,
+    t_start : float = 0.,
+    t_stop : float = None
+    ) -> pd.DataFrame:
+    '''
+    Computes the Laplace-PICTS spectrum of the normalized transients.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - transient_norm:
+            the normalized transients, with time as index and temperature as columns
+         - rates:
+            the grid of emission rates. If None, N_RATES log spaced rates that can be measured in the time range (see rates_grid)
+         - regularization:
+            alpha, relative to the largest singular value of the kernel
+         - t_start, t_stop:
+            the time range used. By default from the switch off of the light (t = 0) to the end of the transient
+
+        ......................................................
+         Return:
+         - a dataframe with temperature as index and emission rates as columns: each row is the distribution
+           of the emission rates at that temperature
+        ......................................................
+        ......................................................
+    '''
+    time = transient_norm.index.to_numpy(dtype=float)
+    rows = (time >= t_start) & (time <= (np.inf if t_stop is None else t_stop))
+    time = time[rows]
+    rates = rates_grid(time) if rates is None else np.asarray(rates, dtype=float)
+
+    distribution = laplace_inversion(time, transient_norm.to_numpy(dtype=float)[rows], rates, regularization)
+    return pd.DataFrame(
+        distribution,
+        index=pd.Index(transient_norm.columns.to_numpy(dtype=float), name=transient_norm.columns.name),
+        columns=pd.Index(rates, name='Emission rate (Hz)')
+        )
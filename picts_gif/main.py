@@ -1,14 +1,24 @@
 import argparse
+import importlib
+import sys
 from enum import Enum
-from pathlib import Path
-import matplotlib.pyplot as plt
-from picts_gif import input_handler 
-from picts_gif.picts_spectrum_plot import PictsSpectrumPlot
-from picts_gif.picts_transient_plot import PictsTransientPlot
+from picts_gif.cli import add_selection_arguments, selection_from_arguments
 
 
 #The main.py manages the user interface through a Command Line Interface (CLI)
 
+#Besides the animation, the CLI has some subcommands, called as: picts_gif_start <subcommand> ...
+#Each subcommand lives in its own module, with its own main(argv). The module is imported only when it is called.
+SUBCOMMANDS = {
+    'compare' : 'picts_gif.picts_comparison_plot',     #animates the spectra of more samples on a shared temperature axis
+    'explore' : 'picts_gif.picts_explorer',     #interactive choice of the rate windows, with sliders
+    'export' : 'picts_gif.export',     #writes transients and spectrum to csv/npz/parquet files, without matplotlib
+    'average' : 'picts_gif.ramp_average',     #averages repeated ramps of a sample on a common temperature grid
+    'batch' : 'picts_gif.batch',     #creates the gifs of all the samples of a directory, rebuilding only the stale ones
+    'synthetic' : 'picts_gif.synthetic',     #writes a synthetic dataset (TDMS and json) with a known ground truth
+    'watch' : 'picts_gif.watcher',     #daemon that creates the gif of each new TDMS file of a directory
+    }
+
 class PlotConfig(Enum):
     '''
     This simple enum class handles the options callable by the CLI
@@ -32,10 +42,18 @@ class PlotConfig(Enum):
 ###############################################################################################################################################################
 ###############################################################################################################################################################
 
-def main(): 
+def main(argv : list = None): 
     '''
    This is the main methods. From here i manage input data from CLI. 
     '''
+    if argv is None:
+        argv = sys.argv[1:]
+    
+    #If the first argument is a subcommand, I pass the other arguments to its module
+    if argv and argv[0] in SUBCOMMANDS:
+        module = importlib.import_module(SUBCOMMANDS[argv[0]])
+        return module.main(argv[1:])
+    
     parser = argparse.ArgumentParser()
     
     #I describe the first, the others are created with the same logic
@@ -111,60 +129,66 @@ def main():
     
     #by default the animation is not shown
     parser.set_defaults(show=False)
+    
+    #to write a report with time and memory of each stage
+    parser.add_argument(
+        '--profile', 
+        type=str, 
+        default=None, 
+        help= "The path of a json file where time, cpu time and memory of each stage of the run are written. E.g.: --profile report.json"
+        )
+    
+    #to save a smaller gif, faster
+    parser.add_argument(
+        '--global-palette', 
+        action='store_true', 
+        help= "Save the gif with a single palette for all the frames, writing only the part of each frame that changed. Smaller files, faster saving"
+        )
+    
+    #to shade the uncertainty of the spectrum
+    parser.add_argument(
+        '--uncertainty', 
+        action='store_true', 
+        help= "Shade a bootstrap confidence band around each curve of the PICTS spectrum (see the keys n_bootstrap and confidence of the json file)"
+        )
+    
+    #to read and animate only some temperatures. The other channels of the tdms file are never decoded
+    add_selection_arguments(parser)
    
    
         
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    if not args.output_file_path.endswith(".gif"):
+    if args.output_file_path is not None and not args.output_file_path.endswith(".gif"):
         print(".gif extension added")
         args.output_file_path += ".gif"
 
-    #I manage the inputs
-    data = input_handler.read_transients_from_tdms(args.path, args.dict)
-    normalized_transient = input_handler.normalized_transient(data, args.dict)
-    picts, gates = input_handler.from_transient_to_PICTS_spectrum(normalized_transient, args.dict)
-
-    plots = []
-  
-   
-    #I have to handle different types of inputs. 
-    #I might want to start the transient animation only, or the PICTS spectrum animation, 
-    #or both at the same time. These are three simple cases that I have implemented.
-    
-    interval = float(args.interval)
-    if args.plot == PlotConfig.transient:
-        fig, ax = plt.subplots(1,1, figsize=(5,5))
-        plots.append( 
-            PictsTransientPlot(fig, ax=ax, conf_file_path=args.dict, transient_df=normalized_transient, gates_list=gates, interval= interval)
-        )
-
-    elif args.plot == PlotConfig.spectrum:
-        fig, ax = plt.subplots(1,1, figsize=(5,5))
-        plots.append( 
-            PictsSpectrumPlot(fig, ax=ax, df=picts, interval=interval)
-        )
-    elif args.plot == PlotConfig.all:
-        fig, ax = plt.subplots(1,2, figsize=(10,4))
-        plots += [
-            PictsSpectrumPlot(fig, ax=ax[0], df=picts, interval=interval),
-            PictsTransientPlot(fig, ax=ax[1], conf_file_path=args.dict, transient_df=normalized_transient, gates_list=gates, interval=interval)
-        ]
+    #The pipeline (pandas, nptdms, scipy and matplotlib) is imported only now, so that --help and the wrong inputs answer immediately
+    from picts_gif import pipeline
+    from picts_gif import profiling
 
-    #By default I don't show the animation but I just save it.
-    if args.show:
-        plt.show()
-    #The destination to save the output must be entered
-    elif args.output_file_path is None:
-            print("No animations will be saved.")
-    #Save the plot. I manage the creation of the destination folder
-    else:
-        path = Path(args.output_file_path).parent
-        Path(path).mkdir(parents=True, exist_ok=True)
-        for plot in plots:
-            plot.save(args.output_file_path)
+    #If required, I collect the events of each stage of the run. The report is written also if the run fails
+    with profiling.profile_to(args.profile):
+        #I manage the inputs
+        result = pipeline.compute_result(args.path, args.dict, selection_from_arguments(args), uncertainty=args.uncertainty)
+        normalized_transient, picts, gates = result.to_dataframe('transient'), result.to_dataframe('spectrum'), result.gates
+        bands = {name : result.to_dataframe(name) for name in ('lower', 'upper')} if args.uncertainty else None
 
-    plt.close()
+        #I create the animation, and I show or save it
+        with profiling.stage('render', plot=args.plot.value):
+            pipeline.render(
+                args.plot.value, 
+                normalized_transient, 
+                picts, 
+                gates, 
+                args.dict, 
+                interval=float(args.interval), 
+                output_file_path=args.output_file_path, 
+                show=args.show, 
+                global_palette=args.global_palette,
+                mask=result.mask,
+                bands=bands
+                )
 
 ###############################################################################################################################################################
 ###############################################################################################################################################################
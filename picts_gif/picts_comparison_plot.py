@@ -0,0 +1,232 @@
+import argparse
+from pathlib import Path
+from matplotlib.animation import FuncAnimation
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from picts_gif.gif_writer import gif_writer
+from picts_gif import profiling
+
+#PictsComparisonPlot overlays the PICTS spectra of more samples (or of the same sample after different annealing steps).
+#The spectra are measured on different temperatures, so before the animation starts each of them is interpolated,
+#once, on a common temperature grid. Then the animation sweeps the grid: at each frame all the curves advance by one
+#point of the grid. The Line2D objects are created once and each frame only changes their data, with views of the
+#interpolated arrays, so the cost of a frame does not depend on the size of the spectra.
+#It is called from the CLI as:
+#   picts_gif_start compare --path a.tdms b.tdms --dict a.json b.json --labels "as grown" "annealed" -o compare.gif
+
+
+def align_to_grid(
+    spectra : list,
+    rate_window : int,
+    grid : np.ndarray
+    ) -> np.ndarray:
+    '''
+    Interpolates a rate window of each spectrum on a common temperature grid.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - spectra:
+            list of PICTS spectra, dataframes with temperature as index and rate windows as columns
+         - rate_window:
+            the position of the column (the rate window) to take from each spectrum
+         - grid:
+            the common temperatures
+
+        ......................................................
+         Return:
+         - a numpy array with a row for each spectrum and a column for each temperature of the grid.
+           Outside the temperature range of a spectrum the values are NaN
+        ......................................................
+        ......................................................
+    '''
+    aligned = np.full((len(spectra), len(grid)), np.nan)
+    for i, spectrum in enumerate(spectra):
+        temperature = spectrum.index.to_numpy(dtype=float)
+        order = np.argsort(temperature)          #np.interp needs increasing temperatures
+        aligned[i] = np.interp(grid, temperature[order], spectrum.iloc[:, rate_window].to_numpy(dtype=float)[order], left=np.nan, right=np.nan)
+    return aligned
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+class PictsComparisonPlot:
+    """
+  PictsComparisonPlot handles the animation of more PICTS spectra on a shared temperature axis.
+
+  .............................
+  Attributes:
+
+  fig            : `~matplotlib.figure.Figure`
+                  The figure object used to get needed events, such as draw or resize.
+
+  ax             : ~matplotlib.axes.Axes
+                  The axes object used to get needed events, such as set axis in a graph.
+
+  spectra        : list
+                  The PICTS spectra to compare, dataframes from from_transient_to_PICTS_spectrum
+
+  labels         : list
+                  The name of each spectrum in the legend. If None, 'Sample 1', 'Sample 2', ...
+
+  rate_window    : int
+                  The position of the rate window (column) shown for each spectrum
+
+  n_points       : int
+                  Number of temperatures of the common grid. If None, the number of temperatures of the longest spectrum
+
+  interval       : float
+                  Parameter, delay between frames in ms
+
+  animate        : bool
+                  If False, no FuncAnimation is created and the frames are driven from outside, e.g. by PictsCompositePlot
+
+  n_frames       : int
+                  The number of frames of the animation, one for each temperature of the grid
+ ................................
+  Methods:
+
+  reset(self):
+    clears the curves and moves the cursor back to the first temperature of the grid.
+
+  ani_init(self):
+    sets limits, labels and legend of the axes.
+
+  ani_update(self, frame):
+    advances all the curves up to the temperature frame of the grid.
+  """
+
+    def __init__(
+        self,
+        fig : plt.figure,
+        ax : plt.axes,
+        spectra : list,
+        labels : list = None,
+        rate_window : int = 0,
+        n_points : int = None,
+        interval : float = 1.,         #interval = delay between frames
+        animate : bool = True          #if False, the frames are driven from outside (see PictsCompositePlot)
+        ):
+        if not isinstance(spectra, list) or len(spectra) == 0 or not all(isinstance(df, pd.DataFrame) for df in spectra):
+            raise TypeError("Problem with the spectra list")
+        if not isinstance(interval, float): raise TypeError("Interval: not a number")
+        labels = [f'Sample {i + 1}' for i in range(len(spectra))] if labels is None else labels
+        if len(labels) != len(spectra): raise ValueError("A label is needed for each spectrum")
+
+        self.ax = ax
+        self.spectra = spectra
+        self.labels = labels
+        self.rate_window = rate_window
+
+        #The common grid covers all the spectra. Each spectrum is interpolated on it only once, here
+        n_points = max(len(df) for df in spectra) if n_points is None else n_points
+        self.grid = np.linspace(min(df.index.min() for df in spectra), max(df.index.max() for df in spectra), n_points)
+        self.values = align_to_grid(spectra, rate_window, self.grid)
+        self.n_frames = len(self.grid)
+
+        self.ax.set_title("Picts Spectra")
+        self.lines = [
+            self.ax.plot([], [], label=f"{label} ({df.columns[rate_window]} Hz)")[0]
+            for label, df in zip(labels, spectra)
+            ]
+        self.cursor = self.ax.axvline(self.grid[0], color='grey', linestyle='--', linewidth=0.8)
+
+        #See PictsSpectrumPlot for more information about FuncAnimation
+        self.func_anim = None
+        if animate:
+            self.func_anim = FuncAnimation(
+                fig,
+                self.ani_update,
+                init_func=self.ani_init ,
+                interval=interval,
+                frames=self.n_frames      #total number of images that make up the animation
+                )
+
+    def reset(self) -> None:
+        '''
+        Goes back to the first temperature of the grid, clearing the curves already drawn.
+        '''
+        for line in self.lines:
+            line.set_data([], [])
+        self.cursor.set_xdata([self.grid[0], self.grid[0]])
+
+    def ani_init(self) -> list:
+        """
+        ani_init handles the start of the animation: limits, labels and legend of the axes.
+       ......................................................
+         Return:
+         - lines:
+            the list of the artists of the animation
+         ......................................................
+         ......................................................
+        """
+        finite = self.values[np.isfinite(self.values)]
+        low, high = (finite.min(), finite.max()) if finite.size else (0., 1.)
+        margin = (high - low) / 10 or 0.1
+        self.ax.set_xlim(self.grid[0] - self.grid[0]/10, self.grid[-1] + self.grid[-1]/10)
+        self.ax.set_ylim(low - margin, high + margin)
+        self.ax.set_xlabel('Temperature (K)')
+        self.ax.set_ylabel('PICTS signal (a.u.)')
+        self.ax.legend(loc='upper right', fontsize='small')
+        return self.lines + [self.cursor]
+
+    def ani_update(self, frame) -> list:
+        """
+        ani_update handles each frame of the animation: each curve is drawn up to the temperature frame of the grid.
+        .............................
+        Attributes:
+        - frame:
+             The first argument will be the next value in frames
+           ......................................................
+         Return:
+         - lines:
+            the list of the artists of the animation
+         ......................................................
+         ......................................................
+        """
+        #slices of numpy arrays are views: no data is copied
+        for line, values in zip(self.lines, self.values):
+            line.set_data(self.grid[:frame + 1], values[:frame + 1])
+        self.cursor.set_xdata([self.grid[frame], self.grid[frame]])
+        return self.lines + [self.cursor]
+
+    #save the animation in a .gif file
+    def save(self, output_file_path, global_palette : bool = False):
+        print(f"Saving animation {output_file_path}")
+        with profiling.stage('save', plot='comparison', n_frames=self.n_frames):
+            self.func_anim.save(output_file_path, writer=gif_writer(fps=30, global_palette=global_palette) )
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def main(argv : list = None):
+    '''
+    The compare subcommand. From here i manage input data from CLI.
+    '''
+    parser = argparse.ArgumentParser(prog='picts_gif_start compare', description='Animate the PICTS spectra of more samples on a shared temperature axis')
+    parser.add_argument("-p", "--path", type=str, nargs='+', required=True, help="The paths to the tdms files. \n E.g.: --path a.tdms b.tdms")
+    parser.add_argument("-d", "--dict", type=str, nargs='+', required=True, help="The json of each tdms file, or a single json for all of them")
+    parser.add_argument("-l", "--labels", type=str, nargs='+', default=None, help="The name of each sample in the legend")
+    parser.add_argument("-r", "--rate-window", type=int, default=0, help="The position of the rate window to compare. E.g.: --rate-window 0 for the first one")
+    parser.add_argument("-i", "--interval", type=float, default=1., help="The time between one frame and another, in ms")
+    parser.add_argument("-o", "--output-file-path", type=str, default=None, help="The gif file. If not given, the animation is shown")
+    parser.add_argument('--global-palette', action='store_true', help="Save the gif with a single palette for all the frames")
+    args = parser.parse_args(argv)
+
+    dictionaries = args.dict * len(args.path) if len(args.dict) == 1 else args.dict
+    if len(dictionaries) != len(args.path): parser.error('give a json for each tdms file, or a single one')
+
+    from picts_gif import pipeline
+    spectra = [pipeline.compute(path, dictionary)[1] for path, dictionary in zip(args.path, dictionaries)]
+    labels = args.labels if args.labels is not None else [Path(path).stem for path in args.path]
+
+    if args.output_file_path is not None:
+        plt.switch_backend('Agg')
+    fig, ax = plt.subplots(1,1, figsize=(6,5))
+    animation = PictsComparisonPlot(fig, ax, spectra, labels, rate_window=args.rate_window, interval=float(args.interval))
+    if args.output_file_path is None:
+        plt.show()
+    else:
+        animation.save(args.output_file_path, global_palette=args.global_palette)
+    plt.close(fig)
@@ -0,0 +1,131 @@
+from matplotlib.animation import FuncAnimation
+import matplotlib.pyplot as plt
+from picts_gif.gif_writer import gif_writer
+from picts_gif import profiling
+
+#When more animations share the same figure, giving each of them its own FuncAnimation means
+#that the figure is rendered once for each animation, and each animation saves its own gif.
+#PictsCompositePlot drives more plot classes from a single FuncAnimation:
+#at each frame it advances all the plots, so the figure is rendered only once and a single gif is written.
+
+#The plots must be created with animate = False, so that they do not create their own FuncAnimation.
+#Each plot must have n_frames, lines, ani_init, ani_update and reset: reset brings the plot back to its first frame,
+#so that a new start of the composite does not find the plots at their end. PictsSpectrumPlot, PictsTransientPlot
+#and PictsComparisonPlot have all of them.
+#A plot that alone would repeat itself with a new state at each restart has n_cycles: the transient plot shows all the
+#transients once for each rate window, and its ani_init moves to the next window. Here it lasts n_cycles * n_frames frames,
+#and ani_init is called at the start of each cycle. Each plot is advanced until it reaches its last frame, then it stays still
+#while the longer animations go on. The animation does not repeat: each ani_init of the composite resets all the plots.
+
+PLOT_INTERFACE = ('n_frames', 'lines', 'func_anim', 'ani_init', 'ani_update', 'reset')      #what the composite uses of each plot
+
+
+class PictsCompositePlot:
+    """
+  PictsCompositePlot handles the synchronized animation of more plots in the same figure.
+
+  .............................
+  Attributes:
+
+  fig            : `~matplotlib.figure.Figure`
+                  The figure object used to get needed events, such as draw or resize.
+
+  plots          : list
+                  The plot objects to animate (e.g. PictsSpectrumPlot, PictsTransientPlot, PictsComparisonPlot), created with animate = False.
+                  Each of them must have n_frames, lines, ani_init, ani_update and reset
+
+  interval       : float
+                  Parameter, delay between frames in ms
+
+  n_frames       : int
+                  The number of frames of the animation, that is the one of the longest plot (n_cycles * n_frames)
+ ................................
+  Methods:
+
+  ani_init(self):
+    resets each plot and calls its ani_init.
+
+  ani_update(self):
+    calls ani_update of each plot that has not finished yet, and ani_init of the plots that start a new cycle.
+  """
+
+    def __init__(
+        self,
+        fig : plt.figure,
+        plots : list,
+        interval : float = 1.          #interval = delay between frames
+        ):
+        if not isinstance(plots, list) or len(plots) == 0: raise TypeError("Problem with the plots list")
+        if not isinstance(interval, float): raise TypeError("Interval: not a number")
+        for plot in plots:
+            if not all(hasattr(plot, name) for name in PLOT_INTERFACE): raise TypeError(f"{type(plot).__name__} can not be driven by PictsCompositePlot")
+            if plot.func_anim is not None: raise ValueError("The plots must be created with animate = False")
+
+        self.plots = plots
+        self.n_frames = max(self.plot_frames(plot) for plot in plots)
+
+        #One FuncAnimation for all the plots. See PictsSpectrumPlot for more information
+        self.func_anim = FuncAnimation(
+            fig,
+            self.ani_update,
+            init_func=self.ani_init ,
+            interval=interval,
+            repeat=False,             #a new start would find the plots at their end
+            frames=self.n_frames      #total number of images that make up the animation
+            )
+
+    @staticmethod
+    def plot_frames(plot) -> int:
+        '''
+        Returns the number of frames of a plot in the composite animation: n_frames for each of its cycles.
+        '''
+        return plot.n_frames * getattr(plot, 'n_cycles', 1)
+
+    def ani_init(self) -> list:
+        """
+        ani_init handles the start of the animation. FuncAnimation can call it more times (e.g. when saving, or when the figure is resized),
+        so each plot is reset to its first frame before its ani_init.
+       ......................................................
+         Return:
+         - lines:
+            the list of the artists of all the plots
+         ......................................................
+         ......................................................
+        """
+        lines = []
+        for plot in self.plots:
+            plot.reset()
+            lines += plot.ani_init()
+        return lines
+
+    def ani_update(self, frame) -> list:
+        """
+        ani_update handles each frame of the animation. All the plots share the same frame:
+        each plot is advanced only if it has not reached its last frame, and a new cycle starts with its ani_init.
+        .............................
+        Attributes:
+        - frame:
+             The first argument will be the next value in frames
+           ......................................................
+         Return:
+         - lines:
+            the list of the artists of all the plots
+         ......................................................
+         ......................................................
+        """
+        lines = []
+        for plot in self.plots:
+            if frame < self.plot_frames(plot):
+                cycle, step = divmod(frame, plot.n_frames)
+                if step == 0 and cycle > 0:
+                    plot.ani_init()
+                lines += plot.ani_update(step)
+            else:
+                lines += plot.lines
+        return lines
+
+    #save the animation in a single .gif file
+    def save(self, output_file_path, global_palette : bool = False):
+        print(f"Saving animation {output_file_path}")
+        with profiling.stage('save', plot='composite', n_frames=self.n_frames):
+            self.func_anim.save(output_file_path, writer=gif_writer(fps=30, global_palette=global_palette) )
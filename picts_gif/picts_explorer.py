@@ -0,0 +1,229 @@
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from picts_gif import input_handler
+from picts_gif import utilities
+
+#PictsExplorer is an interactive window to choose the rate windows: t1_min, t1_shift, beta and t_avg are sliders,
+#and the PICTS spectrum is recomputed and redrawn at each move of a slider. It is called from the CLI as:
+#   picts_gif_start explore --path data.tdms --dict dict.json
+#The data are read and normalized only once. To keep each update fast on full size ramps:
+# - the cumulative sums of the transients along time are computed once (utilities.cumulative_sums). The mean over the rows
+#   of a gate (utilities.gate_bounds) is then (sums[stop] - sums[start]) / (counts[stop] - counts[start]): two rows for each gate,
+#   whatever t_avg is (utilities.window_means). NaN values are skipped, as pandas mean does
+# - the indexes of t1 and t2 are found with a binary search on the time axis, as get_indexer(method='backfill') does (utilities.backfill_positions)
+# - with t2 = beta t1, the equation of the emission rate (see utilities.en_2gates_high_injection) depends on
+#   x = en t1 and beta only. So x is solved once for each beta (utilities.rate_window_constant), and en = x / t1 for all the windows
+#The results are the same of from_transient_to_PICTS_spectrum, see the spectrum method.
+
+
+class PictsExplorer:
+    """
+  PictsExplorer handles an interactive PICTS spectrum, with sliders for the rate windows parameters.
+
+  .............................
+  Attributes:
+
+  transient_norm : pd.Dataframe
+                  Normalized current transient dataframe from InputHandler
+
+  configuration  : dict
+                  The content of the json file. It gives the starting values of the sliders and the number of windows
+
+  last_update_s  : float
+                  The time spent by the last recompute of the spectrum, in seconds
+ ................................
+  Methods:
+
+  spectrum(self, t1_min, t1_shift, beta, t_avg):
+    returns picts and gates, as from_transient_to_PICTS_spectrum does, without matplotlib.
+
+  create_figure(self):
+    creates the figure with the spectrum and the sliders, redrawn with blitting when a slider moves.
+
+  show(self):
+    opens the window with the spectrum and the sliders.
+  """
+
+    def __init__(
+        self,
+        transient_norm : pd.DataFrame,
+        configuration_path : str
+        ):
+        if not isinstance(transient_norm, pd.DataFrame): raise TypeError("Problem with input dataframe")
+        with open(configuration_path, "r") as pfile:
+            self.configuration = json.load(pfile)
+
+        self.transient_norm = transient_norm
+        self.time = transient_norm.index.to_numpy(dtype=float)
+        self.temperature = pd.Index(transient_norm.columns.astype(float), name=transient_norm.columns.name)
+
+        #cumulative sums along time, with a row of zeros on top: the sum of rows [start:stop] is sums[stop] - sums[start]
+        self._sums, self._counts = utilities.cumulative_sums(transient_norm.to_numpy(dtype=float))
+
+        self.last_update_s = None
+
+    def emission_rates(self, t1 : np.ndarray, beta : float) -> np.ndarray:
+        '''
+        Returns en for each t1, with t2 = beta t1. The equation is solved only the first time a beta is seen (see utilities.rate_window_constant).
+        '''
+        return utilities.rate_window_constant(beta) / t1
+
+    def _gate_means(self, positions : np.ndarray, t_avg : int) -> np.ndarray:
+        #The rows of each gate are those of transient_norm.iloc[position - t_avg : position + t_avg], as in utilities.gate_means
+        start, stop = utilities.gate_bounds(len(self.time), positions, t_avg)
+        return utilities.window_means(self._sums, self._counts, start[:, None], stop[:, None])
+
+    def spectrum_values(
+        self,
+        t1_min : float,
+        t1_shift : float,
+        beta : float,
+        t_avg : int,
+        n_windows : int = None
+        ):
+        '''
+        Returns the values of the spectrum as a numpy array (temperature x windows), en, t1 and t2.
+        '''
+        start = time.perf_counter()
+        n_windows = self.configuration['n_windows'] if n_windows is None else n_windows
+        t1, t2 = utilities.create_t1_and_t2_values(t1_min, t1_shift, n_windows, beta)
+        means = self._gate_means(utilities.backfill_positions(self.time, np.concatenate([t1, t2])), int(t_avg))
+        values = (means[:n_windows] - means[n_windows:]).T
+        en = self.emission_rates(t1, beta)
+        self.last_update_s = time.perf_counter() - start
+        return values, en, t1, t2
+
+    def spectrum(
+        self,
+        t1_min : float,
+        t1_shift : float,
+        beta : float,
+        t_avg : int,
+        n_windows : int = None
+        ):
+        '''
+        Returns the PICTS spectrum for the given parameters.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - t1_min, t1_shift, beta, t_avg:
+            the parameters of the rate windows, as in the json file
+         - n_windows:
+            number of rate windows. If None, the one of the json file
+
+        ......................................................
+         Return:
+         - picts:
+            a dataframe with the picts spectrum, with temperature as index and 'rate window' as columns,
+            as returned by from_transient_to_PICTS_spectrum
+         - gates:
+            a numpy array with a (t1, t2) pair for each rate window
+        ......................................................
+        ......................................................
+        '''
+        values, en, t1, t2 = self.spectrum_values(t1_min, t1_shift, beta, t_avg, n_windows)
+        picts = pd.DataFrame(values, index=self.temperature, columns=pd.Index(en.round(3), name='Rate Window (Hz)'))
+        return picts, np.array([t1, t2]).T
+
+    def create_figure(self):
+        '''
+        Creates the interactive figure: the spectrum on top, and a slider for each parameter below.
+        The curves, the legend and the status text are drawn with blitting: when a slider moves only they and the sliders
+        are drawn again on a saved background, and the whole figure is drawn only when the curves go out of the y limits.
+        '''
+        import matplotlib.pyplot as plt
+        from matplotlib.widgets import Slider
+
+        configuration = self.configuration
+        time_step = self.time[1] - self.time[0]
+        time_end = self.time[-1]
+
+        fig = plt.figure(figsize=(8,7))
+        ax = fig.add_axes([0.1, 0.4, 0.85, 0.53])
+        ax.set_xlabel(f'{self.temperature.name or "Temperature (K)"}')
+        ax.set_ylabel('PICTS signal')
+
+        values, en, _, _ = self.spectrum_values(configuration['t1_min'], configuration['t1_shift'], configuration['beta'], configuration['t_avg'])
+        lines = [ax.plot(self.temperature, values[:,i], label=f'{en[i]:.3f} Hz', animated=True)[0] for i in range(values.shape[1])]
+        legend = ax.legend(loc='upper right', fontsize='small')
+        legend.set_animated(True)
+        status = fig.text(0.2, 0.01, '', animated=True)
+        animated = lines + [legend, status]
+
+        #one slider for each parameter. The ranges keep every t2 inside the transient, for reasonable values of the others.
+        #drawon = False: the sliders do not ask for a draw of the whole figure, update draws them
+        sliders = {
+            't1_min' : Slider(fig.add_axes([0.2, 0.25, 0.65, 0.03]), 't1_min (s)', time_step, time_end / 2, valinit=configuration['t1_min']),
+            't1_shift' : Slider(fig.add_axes([0.2, 0.19, 0.65, 0.03]), 't1_shift (s)', 0., time_end / (2 * max(len(lines), 1)), valinit=configuration['t1_shift']),
+            'beta' : Slider(fig.add_axes([0.2, 0.13, 0.65, 0.03]), 'beta', 1.1, 20., valinit=configuration['beta']),
+            't_avg' : Slider(fig.add_axes([0.2, 0.07, 0.65, 0.03]), 't_avg', 1, max(len(self.time) // 20, 2), valinit=configuration['t_avg'], valstep=1),
+            }
+        for slider in sliders.values():
+            slider.drawon = False
+
+        background = {}
+
+        #after each draw of the whole figure I save it without the animated artists, then I draw them on top
+        def on_draw(_):
+            background['figure'] = fig.canvas.copy_from_bbox(fig.bbox)
+            for artist in animated:
+                fig.draw_artist(artist)
+
+        def update(moved):
+            start = time.perf_counter()
+            values, en, _, _ = self.spectrum_values(*(sliders[name].val for name in ('t1_min', 't1_shift', 'beta', 't_avg')))
+            for i, line in enumerate(lines):
+                line.set_ydata(values[:,i])
+                legend.get_texts()[i].set_text(f'{en[i]:.3f} Hz')
+
+            bottom, top = ax.get_ylim()
+            low, high = np.nanmin(values, initial=np.inf), np.nanmax(values, initial=-np.inf)
+            if 'figure' not in background or low < bottom or high > top:
+                #the curves go out of the axes: I enlarge the y limits and draw the whole figure
+                if np.isfinite(low) and np.isfinite(high):
+                    margin = 0.05 * (high - low) or 0.05
+                    ax.set_ylim(min(bottom, low - margin), max(top, high + margin))
+                status.set_text(f'recomputed in {self.last_update_s * 1000:.1f} ms')
+                fig.canvas.draw_idle()
+                return
+
+            fig.canvas.restore_region(background['figure'])
+            fig.draw_artist(moved.ax)
+            status.set_text(f'recomputed in {self.last_update_s * 1000:.1f} ms, updated in {(time.perf_counter() - start) * 1000:.1f} ms')
+            for artist in animated:
+                fig.draw_artist(artist)
+            fig.canvas.blit(fig.bbox)
+
+        fig.canvas.mpl_connect('draw_event', on_draw)
+        for slider in sliders.values():
+            slider.on_changed(lambda _, slider=slider: update(slider))
+        self.sliders = sliders          #I keep a reference, otherwise the sliders stop responding
+        return fig
+
+    def show(self) -> None:
+        '''
+        Opens the interactive window.
+        '''
+        import matplotlib.pyplot as plt
+        self.create_figure()
+        plt.show()
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def main(argv : list = None):
+    '''
+    The explore subcommand. From here i manage input data from CLI.
+    '''
+    parser = argparse.ArgumentParser(prog='picts_gif_start explore', description='Choose the rate windows interactively')
+    parser.add_argument("-p", "--path", type=str, required=True, help="The path to the tdms file. \n E.g.: --path /home/user/desktop/data.tdms")
+    parser.add_argument("-d", "--dict", type=str, required=True, help="The path to the dictionary json file. \n E.g.: --dict /home/user/desktop/dict.json")
+    args = parser.parse_args(argv)
+
+    data = input_handler.read_transients_from_tdms(args.path, args.dict)
+    transient_norm = input_handler.normalized_transient(data, args.dict)
+    PictsExplorer(transient_norm, args.dict).show()
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+#PictsResult collects the outputs of a run as contiguous numpy arrays: normalized transients, time and temperature axes,
+#gates, emission rates and PICTS spectrum. Between the stages of the pipeline the arrays are passed as they are,
+#so there is no index alignment and no copy of the data. The dataframes used by the plots and by the export are
+#built by to_dataframe as views of the same arrays: they cost nothing, also for full size ramps.
+
+
+class PictsResult:
+    """
+  PictsResult holds the results of a PICTS analysis as numpy arrays.
+
+  .............................
+  Attributes:
+
+  transient      : np.ndarray
+                  The normalized current transients, a row for each time and a column for each temperature
+
+  time           : np.ndarray
+                  The time axis, in s
+
+  temperature    : np.ndarray
+                  The temperature axis, in K
+
+  gates          : np.ndarray
+                  A (t1, t2) pair for each rate window. None until the spectrum is computed
+
+  en             : np.ndarray
+                  The emission rate of each rate window, in Hz. None until the spectrum is computed
+
+  spectrum       : np.ndarray
+                  The PICTS spectrum, a row for each temperature and a column for each rate window. None until it is computed
+
+  mask           : np.ndarray
+                  True for each temperature that was normalized, False for the ones set to NaN. None if not known
+
+  quality        : dict
+                  The flags of the quality control of each temperature (see quality_control.py). None if it was not done
+
+  uncertainty    : dict
+                  The 'std', 'lower' and 'upper' arrays of the spectrum, shaped as the spectrum (see utilities.spectrum_uncertainty). None if not computed
+ ................................
+  Methods:
+
+  from_dataframe(cls, transient):
+    creates a result from a transient dataframe, with time as index and temperature as columns.
+
+  to_dataframe(self, table):
+    returns the transients, the spectrum or its uncertainty as a dataframe that shares the memory of the arrays.
+  """
+
+    #no __dict__ for each instance: the attributes are only these
+    __slots__ = ('transient', 'time', 'temperature', 'gates', 'en', 'spectrum', 'mask', 'quality', 'uncertainty')
+
+    TIME_NAME = 'Time (s)'
+    TEMPERATURE_NAME = 'Temperature (K)'
+    RATE_WINDOW_NAME = 'Rate Window (Hz)'
+
+    def __init__(
+        self,
+        transient : np.ndarray,
+        time : np.ndarray,
+        temperature : np.ndarray,
+        gates : np.ndarray = None,
+        en : np.ndarray = None,
+        spectrum : np.ndarray = None,
+        mask : np.ndarray = None,
+        quality : dict = None,
+        uncertainty : dict = None
+        ):
+        #ascontiguousarray copies only if the input is not already a contiguous float array
+        self.transient = np.ascontiguousarray(transient, dtype=float)
+        self.time = np.ascontiguousarray(time, dtype=float)
+        self.temperature = np.ascontiguousarray(temperature, dtype=float)
+        if self.transient.shape != (len(self.time), len(self.temperature)):
+            raise ValueError('The transients must have a row for each time and a column for each temperature')
+        self.gates = None if gates is None else np.ascontiguousarray(gates, dtype=float)
+        self.en = None if en is None else np.ascontiguousarray(en, dtype=float)
+        self.spectrum = None if spectrum is None else np.ascontiguousarray(spectrum, dtype=float)
+        self.mask = None if mask is None else np.asarray(mask, dtype=bool)
+        self.quality = quality
+        self.uncertainty = uncertainty
+
+    @classmethod
+    def from_dataframe(cls, transient : pd.DataFrame):
+        '''
+        Creates a result from a transient dataframe, with time as index and temperature as columns.
+        '''
+        if not isinstance(transient, pd.DataFrame): raise TypeError("Problem with input dataframe")
+        return cls(transient.to_numpy(dtype=float), transient.index.to_numpy(dtype=float), transient.columns.to_numpy(dtype=float))
+
+    def to_dataframe(self, table : str = 'spectrum') -> pd.DataFrame:
+        '''
+        Returns a table of the result as a dataframe, as the functions of input_handler return it.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - table:
+            'transient' for the normalized transients (time as index, temperature as columns),
+            'spectrum' for the PICTS spectrum (temperature as index, rate windows as columns),
+            'std', 'lower' or 'upper' for the uncertainty of the spectrum, with the same index and columns
+
+        ......................................................
+         Return:
+         - a dataframe that shares the memory of the arrays: no data is copied
+        ......................................................
+         Raises
+         - ValueError
+            If the table is unknown, or if the spectrum or its uncertainty is asked before it is computed.
+        ......................................................
+        ......................................................
+        '''
+        temperature = pd.Index(self.temperature, name=self.TEMPERATURE_NAME, copy=False)
+        if table == 'transient':
+            return pd.DataFrame(self.transient, index=pd.Index(self.time, name=self.TIME_NAME, copy=False), columns=temperature, copy=False)
+        if table == 'spectrum':
+            if self.spectrum is None: raise ValueError('The spectrum is not computed yet')
+            #there is nothing special in the number 3, as in from_transient_to_PICTS_spectrum
+            return pd.DataFrame(self.spectrum, index=temperature, columns=pd.Index(self.en.round(3), name=self.RATE_WINDOW_NAME), copy=False)
+        if table in ('std', 'lower', 'upper'):
+            if self.uncertainty is None: raise ValueError('The uncertainty of the spectrum is not computed yet')
+            return pd.DataFrame(self.uncertainty[table], index=temperature, columns=pd.Index(self.en.round(3), name=self.RATE_WINDOW_NAME), copy=False)
+        raise ValueError(f'Unknown table: {table}')
@@ -1,6 +1,11 @@
-from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib.animation import FuncAnimation
+from matplotlib.collections import PolyCollection
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
+from picts_gif.gif_writer import gif_writer
+from picts_gif import profiling
+from picts_gif import utilities
 
 #There are many ways to implement animations in matplotlib.
 #I have chosen to use classes. 
@@ -34,9 +39,27 @@ class PictsSpectrumPlot:
 
   interval       : float
                   Parameter, delay between frames in ms 
+  
+  animate        : bool
+                  If False, no FuncAnimation is created and the frames are driven from outside, e.g. by PictsCompositePlot
+  
+  selection      : dict
+                  The temperatures to plot (t_min, t_max, stride, values), see utilities.select_temperatures. If None, all of them
+  
+  mask           : np.ndarray
+                  A boolean for each temperature, False for the points to skip (e.g. the ones rejected by the quality control). If None, none is skipped
+  
+  bands          : dict
+                  The 'lower' and 'upper' dataframes of the uncertainty of df (see input_handler.picts_uncertainty_values), shaded around each curve. If None, no band is drawn
+  
+  n_frames       : int
+                  The exact number of frames of the animation, one for each point of each curve
  ................................
   Methods:
   
+  reset(self):
+    goes back to the first point of the first curve, clearing the curves already drawn.
+  
   ani_init(self): 
     manage the animation to start and end. When repeat = True, the method is called at the end of each animation to start it all over again.
     In ani_init the graphical elements that will accompany all the animation and the logic that allows the interruption of the animation are initialized.
@@ -53,27 +76,50 @@ class PictsSpectrumPlot:
         fig : plt.figure, 
         ax : plt.axes, 
         df : pd.DataFrame, 
-        interval : float = 1.          #interval = delay between frames
+        interval : float = 1.,         #interval = delay between frames
+        animate : bool = True,         #if False, the frames are driven from outside (see PictsCompositePlot)
+        selection : dict = None,       #the temperatures to plot. If None, all of them
+        mask : np.ndarray = None,      #False for the temperatures to skip. If None, none is skipped
+        bands : dict = None            #the 'lower' and 'upper' dataframes of the uncertainty of df. If None, no band is drawn
         ):
         if not isinstance(df, pd.DataFrame): raise TypeError("Problem with input dataframe")
         if not isinstance(interval, float): raise TypeError("Interval: not a number")
+        #the masked temperatures have no spectrum: the curves join the points around them
+        #the bands follow the same rows of the spectrum
+        bands = None if bands is None else {name : bands[name] for name in ('lower', 'upper')}
+        if mask is not None:
+            df = df.iloc[np.asarray(mask, dtype=bool)]
+            bands = None if bands is None else {name : band.iloc[np.asarray(mask, dtype=bool)] for name, band in bands.items()}
+        if selection is not None:
+            rows = utilities.select_temperatures(df.index, **selection)
+            df = df.iloc[rows]
+            bands = None if bands is None else {name : band.iloc[rows] for name, band in bands.items()}
         self.ax = ax
         self.df = df
+        self.bands = bands
         self.ax.set_title("Picts Spectrum")
         
+        self.number_of_columns = df.shape[1]                     #number of columns in dataframe
+        self.number_of_points_per_line = df.shape[0]             #number of rows in dataframe
+        
+        #Each curve is drawn one point at a time, so the animation has exactly one frame for each point of each curve. 
+        #When saving, FuncAnimation stops here instead of padding the gif with identical frames up to save_count
+        self.n_frames = self.number_of_columns * self.number_of_points_per_line
+        
         #FunctionAnimation is the Matplotlib class around which everything revolves. 
         #For a better understanding of its use, please refer to the relevant documentation
         #https://matplotlib.org/stable/api/_as_gen/matplotlib.animation.FuncAnimation.html?highlight=funcanimation#matplotlib.animation.FuncAnimation
-        self.func_anim = FuncAnimation(
-            fig,
-            self.ani_update,         #ani_update and ani_init they are part of the architecture with which FuncAnimation is built
-            init_func=self.ani_init , #I recommend the detailed documentation at the link for greater understanding
-            interval=interval,        
-            save_count = 1500         #This index defines the upper limit of the saved frames when calling the method to save the animation
-            )
+        #When animate is False, no FuncAnimation is created: another object calls ani_init and ani_update
+        self.func_anim = None
+        if animate:
+            self.func_anim = FuncAnimation(
+                fig,
+                self.ani_update,         #ani_update and ani_init they are part of the architecture with which FuncAnimation is built
+                init_func=self.ani_init , #I recommend the detailed documentation at the link for greater understanding
+                interval=interval,        
+                frames=self.n_frames      #total number of images that make up the animation
+                )
         
-        self.number_of_columns = df.shape[1]                     #number of columns in dataframe
-        self.number_of_points_per_line = df.shape[0]             #number of rows in dataframe
         self.column_index = 0                                    #it will be incremented every time we plot a curve
         self.current_column = df.columns[self.column_index]      #takes into account the column we are in
         self.point_index = 0                                     #it will be incremented every time we plot a point of a curve
@@ -85,6 +131,26 @@ class PictsSpectrumPlot:
         for i in range(self.number_of_columns):                  #Here it is initialized with two lists that will contain the x, y elements of the axes,
                                                                  #and a label that will be updated at each frame
             self.lines += self.ax.plot([], [], label = f"Rate window: {self.df.columns[i]}")
+        
+        #A band for each curve, drawn with the points of its curve. It is a single polygon (lower side forward, upper side back),
+        #whose vertices are replaced at each frame instead of creating a new fill_between
+        self.shades = []
+        if self.bands is not None:
+            for line in self.lines:
+                self.shades.append(self.ax.add_collection(PolyCollection([], facecolor=line.get_color(), alpha=0.25, linewidth=0)))
+
+    #goes back to the state before the first frame
+    def reset(self) -> None:
+        '''
+        Goes back to the first point of the first curve, clearing the curves and the bands already drawn.
+        '''
+        self.column_index = 0
+        self.current_column = self.df.columns[self.column_index]
+        self.point_index = 0
+        for line in self.lines:
+            line.set_data([], [])
+        for shade in self.shades:
+            shade.set_verts([])
 
     #Each animation starts and ends by calling this method. 
     #When repeat = True, the method is called at the end of each animation to start it all over again
@@ -111,15 +177,18 @@ class PictsSpectrumPlot:
             self.df.index.min() - self.df.index.min()/10, 
             self.df.index.max() + self.df.index.max()/10
             )
+        #with the bands, the limits include them
+        low = self.df.min().min() if self.bands is None else min(self.df.min().min(), self.bands['lower'].min().min())
+        high = self.df.max().max() if self.bands is None else max(self.df.max().max(), self.bands['upper'].max().max())
         self.ax.set_ylim(
-            self.df.min().min() - self.df.min().min()/10, 
-            self.df.max().max() + self.df.max().max()/10
+            low - low/10, 
+            high + high/10
             )
         self.ax.set_xlabel('Temperature (K)')
         self.ax.set_ylabel('PICTS signal (a.u.)')
         
         #lines is the iterable that carries information between the various methods. It is a list that at each cycle is filled with all the information to be plotted
-        return self.lines
+        return self.lines + self.shades
 
     #for each frame of the animation the class calls this method
     def ani_update(self, frame) -> list:
@@ -145,8 +214,9 @@ class PictsSpectrumPlot:
         # if the following conditions are met, the animation is finished:
         #If I am at the last column of the dataframe and if the number of points I have plotted is greater than or equal to the number of points I had to plot
         if self.current_column == self.df.columns[-1] and self.point_index >= self.number_of_points_per_line:
-            self.func_anim.event_source.stop()
-            return self.lines
+            if self.func_anim is not None:
+                self.func_anim.event_source.stop()
+            return self.lines + self.shades
 
         
 
@@ -165,13 +235,22 @@ class PictsSpectrumPlot:
 
         # I add a point to the current graph
         self.lines[self.column_index].set_data(column_data_x, column_data_y)
+        
+        # and to its band
+        if self.shades:
+            lower = self.bands['lower'][self.current_column].to_numpy()[:self.point_index]
+            upper = self.bands['upper'][self.current_column].to_numpy()[:self.point_index]
+            x = np.asarray(column_data_x, dtype=float)
+            self.shades[self.column_index].set_verts([np.column_stack([np.concatenate([x, x[::-1]]), np.concatenate([lower, upper[::-1]])])])
 
         self.point_index += 1
 
-        return self.lines
+        return self.lines + self.shades
     
-    #save the animation in a .gif file
-    def save(self, output_file_path):
+    #save the animation in a .gif file.
+    #With global_palette = True the gif is written with one palette and only the changed part of each frame (see gif_writer.py)
+    def save(self, output_file_path, global_palette : bool = False):
         print(f"Saving animation {output_file_path}")
-        self.func_anim.save(output_file_path, writer=PillowWriter(fps=30) )
+        with profiling.stage('save', plot='spectrum', n_frames=self.n_frames):
+            self.func_anim.save(output_file_path, writer=gif_writer(fps=30, global_palette=global_palette) )
             
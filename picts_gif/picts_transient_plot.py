@@ -1,8 +1,11 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib.animation import FuncAnimation
 import json
 import pandas as pd
+from picts_gif.gif_writer import gif_writer
+from picts_gif import profiling
+from picts_gif import utilities
 
 
 #There are many ways to implement animations in matplotlib.
@@ -41,9 +44,27 @@ class PictsTransientPlot:
   
   interval       : float
                   Parameter, delay between frames in ms 
+  
+  animate        : bool
+                  If False, no FuncAnimation is created and the frames are driven from outside, e.g. by PictsCompositePlot
+  
+  selection      : dict
+                  The temperatures to animate (t_min, t_max, stride, values), see utilities.select_temperatures. If None, all of them
+  
+  mask           : np.ndarray
+                  A boolean for each temperature, False for the transients to skip (e.g. the ones rejected by the quality control). If None, none is skipped
+  
+  n_frames       : int
+                  The exact number of frames of the animation, one for each selected transient
+  
+  n_cycles       : int
+                  The number of times the animation is repeated, one for each rate window (see PictsCompositePlot)
   ................................
   Methods:
   
+  reset(self):
+    goes back to the first rate window, removing the lines of the gates already drawn.
+  
   ani_init(self): 
     manage the animation to start and end. When repeat = True, the method is called at the end of each animation to start it all over again.
     In ani_init the graphical elements that will accompany all the animation and the logic that allows the interruption of the animation are initialized.
@@ -64,7 +85,10 @@ class PictsTransientPlot:
       conf_file_path : str, 
       transient_df : pd.DataFrame, 
       gates_list : np.ndarray, 
-      interval : float = 1.          #interval = delay between frames in ms
+      interval : float = 1.,         #interval = delay between frames in ms
+      animate : bool = True,         #if False, the frames are driven from outside (see PictsCompositePlot)
+      selection : dict = None,       #the temperatures to animate. If None, all of them
+      mask : np.ndarray = None       #False for the temperatures to skip. If None, none is skipped
       ): 
       
       
@@ -76,20 +100,35 @@ class PictsTransientPlot:
       if not isinstance(interval, float): raise TypeError("Problem with the interval parameter")
       
       self.ax = ax
+      
+      #The masked transients are NaN: they are not animated. The selection is made among the others
+      if mask is not None:
+        transient_df = transient_df.iloc[:, np.asarray(mask, dtype=bool)]
+      
+      #Only the selected temperatures are animated
+      if selection is not None:
+        transient_df = transient_df.iloc[:, utilities.select_temperatures(transient_df.columns, **selection)]
+      
+      #The animation shows one transient for each frame, so it has exactly as many frames as the selected temperatures. 
+      #When saving, FuncAnimation stops here instead of padding the gif with identical frames up to save_count
+      self.n_frames = len(transient_df.columns)
+      self.n_cycles = len(gates_list)
         
         #FunctionAnimation is the Matplotlib class around which everything revolves. 
         #For a better understanding of its use, please refer to the relevant documentation
         #https://matplotlib.org/stable/api/_as_gen/matplotlib.animation.FuncAnimation.html?highlight=funcanimation#matplotlib.animation.FuncAnimation
-      self.func_anim = FuncAnimation(
-          fig, 
-          self.ani_update,                    #ani_update and ani_init they are part of the architecture with which FuncAnimation is built. 
-                                              #I recommend the detailed documentation at the link for greater understanding
-          init_func=self.ani_init , 
-          interval=interval, 
-          repeat=True,                        #when the animation is finished, it restart from beginning
-          frames=len(transient_df.columns),   #total number of images that make up the animation. Coincides with the number of transients to plot.
-          save_count = 1500                   #This index defines the upper limit of the saved frames when calling the method to save the animation
-          )
+        #When animate is False, no FuncAnimation is created: another object calls ani_init and ani_update
+      self.func_anim = None
+      if animate:
+        self.func_anim = FuncAnimation(
+            fig, 
+            self.ani_update,                    #ani_update and ani_init they are part of the architecture with which FuncAnimation is built. 
+                                                #I recommend the detailed documentation at the link for greater understanding
+            init_func=self.ani_init , 
+            interval=interval, 
+            repeat=True,                        #when the animation is finished, it restart from beginning
+            frames=self.n_frames,               #total number of images that make up the animation. Coincides with the number of transients to plot.
+            )
         
       self.transient_df = transient_df
       self.gates_list = gates_list
@@ -110,6 +149,19 @@ class PictsTransientPlot:
       #Scatter and Arrow are two graphical elements that I initialize and that will subsequently be defined and inserted overlapping the graph
       self.scatter = None  
       self.arrow = None
+      self.gate_lines = []                    #the dashed lines of the gates drawn so far
+ 
+    #goes back to the state before the first ani_init
+    def reset(self) -> None:
+        '''
+        Goes back to the first rate window and to the first transient, removing the lines of the gates already drawn.
+        '''
+        for line in self.gate_lines:
+          line.remove()
+        self.gate_lines = []
+        self.gate_index = -1
+        self.column_index = 0
+        self.current_column = self.transient_df.columns[self.column_index]
  
     #Each animation starts and ends by calling this method. 
     #When repeat = True, the method is called at the end of each animation to start it all over again
@@ -133,12 +185,10 @@ class PictsTransientPlot:
 
         # I define some parameters for the plot
         #These settings allow me to automatically center the figure in the graph
-        t_init = self.configuration['t1_min']
-        beta = self.configuration['beta']
-        n_windows = self.configuration['n_windows']
+        #the axis ends after the largest t2, whatever the spacing of the rate windows (linear or log spaced)
         self.ax.set_xlim(
           -0.015, 
-          t_init + beta*t_init*n_windows
+          1.1 * self.gates_list[:, 1].max()
           )
         self.ax.set_ylim(
           self.transient_df.index.min(), 
@@ -161,8 +211,10 @@ class PictsTransientPlot:
         self.current_column = self.transient_df.columns[self.column_index]
         
         #I add to the plot some vertical dashed lines that will indicate the interval of the rate window
-        self.ax.axvline(x = gate[0], label = f't1 - {round(gate[0], 2)}', color=self.colors[self.gate_index], linestyle="dashed")
-        self.ax.axvline(x = gate[1], label = f't2 - {round(gate[1], 2)}', color=self.colors[self.gate_index], linestyle="dashed")
+        #the colors are reused after the last one of the cycle
+        color = self.colors[self.gate_index % len(self.colors)]
+        self.gate_lines.append(self.ax.axvline(x = gate[0], label = f't1 - {round(gate[0], 2)}', color=color, linestyle="dashed"))
+        self.gate_lines.append(self.ax.axvline(x = gate[1], label = f't2 - {round(gate[1], 2)}', color=color, linestyle="dashed"))
 
         column_name = self.transient_df.columns[self.column_index]
 
@@ -195,7 +247,8 @@ class PictsTransientPlot:
         # if the following conditions are met, the animation is finished:
         #if all the pairs (t1, t2) have been plotted and if I am at the last column of the dataframe
         if self.gate_index == len(self.gates_list) - 1 and self.current_column == self.transient_df.columns[-1]:
-            self.func_anim.event_source.stop()
+            if self.func_anim is not None:
+              self.func_anim.event_source.stop()
             return self.lines     #I always return the list lines
 
        
@@ -241,8 +294,11 @@ class PictsTransientPlot:
         return self.lines 
       
 
-    def save(self, output_file_path):
+    #save the animation in a .gif file.
+    #With global_palette = True the gif is written with one palette and only the changed part of each frame (see gif_writer.py)
+    def save(self, output_file_path, global_palette : bool = False):
         print(f"Saving animation {output_file_path}")
-        self.func_anim.save(output_file_path, writer=PillowWriter(fps=30) )
+        with profiling.stage('save', plot='transient', n_frames=self.n_frames):
+            self.func_anim.save(output_file_path, writer=gif_writer(fps=30, global_palette=global_palette) )
             
 
@@ -0,0 +1,147 @@
+from pathlib import Path
+from picts_gif import input_handler
+from picts_gif import profiling
+
+#pipeline.py collects the two stages of a run, so that the CLI and the other entry points share them:
+# - compute: from the TDMS file to the normalized transients and the PICTS spectrum. It never imports matplotlib
+# - render: from the dataframes to the animation, shown on screen and/or saved as gif.
+#   matplotlib is imported only here, so that the runs that only need the numbers do not pay for it
+
+
+def compute(
+    path : str,
+    configuration_path : str,
+    selection : dict = None
+    ):
+    '''
+    Reads a TDMS file and computes the normalized transients and the PICTS spectrum.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - path:
+            string with file path of TDMS file
+         - configuration_path:
+            path to a json file with all needed information to analyze the input data.
+         - selection:
+            the temperatures to read (t_min, t_max, stride, values), see utilities.select_temperatures. If None, all of them
+
+        ......................................................
+         Return:
+         - normalized_transient:
+            dataframe with the normalized current transients, with time as index and temperature as columns
+         - picts:
+            dataframe with the picts spectrum, with temperature as index and 'rate window' as columns.
+         - gates:
+            numpy array with a (t1, t2) pair for each rate window
+        ......................................................
+        ......................................................
+    '''
+    result = compute_result(path, configuration_path, selection)
+    #the dataframes are views of the arrays of the result: no data is copied
+    return result.to_dataframe('transient'), result.to_dataframe('spectrum'), result.gates
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def compute_result(
+    path : str,
+    configuration_path : str,
+    selection : dict = None,
+    uncertainty : bool = False
+    ):
+    '''
+    Reads a TDMS file and computes normalized transients and PICTS spectrum, as compute does, 
+    but returns them as a PictsResult (see picts_result.py), with the numpy arrays of all the results.
+    With uncertainty = True the result has the uncertainty bands of the spectrum too.
+    '''
+    with profiling.stage('compute', path=str(path)):
+        data = input_handler.read_transients_from_tdms(path, configuration_path, selection=selection)
+        result = input_handler.compute_result(data, configuration_path, uncertainty)
+    return result
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def render(
+    plot : str,
+    normalized_transient,
+    picts,
+    gates,
+    configuration_path : str,
+    interval : float = 1.,
+    output_file_path : str = None,
+    show : bool = False,
+    global_palette : bool = False,
+    mask = None,
+    bands : dict = None
+    ) -> None:
+    '''
+    Creates the animation and shows and/or saves it.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - plot:
+            what to animate: 'transient', 'spectrum' or 'all'
+         - normalized_transient, picts, gates:
+            the outputs of compute
+         - configuration_path:
+            path to the json file
+         - interval:
+            delay between frames in ms
+         - output_file_path:
+            path of the gif. If None, the animation is not saved
+         - show:
+            if True, the animation is shown on screen
+         - global_palette:
+            if True, the gif is saved with a global palette and delta frames (see gif_writer.py)
+         - mask:
+            a boolean for each temperature, False for the ones both plots skip (the mask of compute_result). If None, none is skipped
+         - bands:
+            the 'lower' and 'upper' dataframes of the uncertainty of picts, shaded around the spectrum. If None, no band is drawn
+        ......................................................
+        ......................................................
+    '''
+    #If the animation is not shown, there is no need of an interactive backend: Agg is faster to start and works without a display
+    import matplotlib
+    if not show:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from picts_gif.picts_spectrum_plot import PictsSpectrumPlot
+    from picts_gif.picts_transient_plot import PictsTransientPlot
+    from picts_gif.picts_composite_plot import PictsCompositePlot
+
+    #I have to handle different types of inputs.
+    #I might want to start the transient animation only, or the PICTS spectrum animation,
+    #or both at the same time. These are three simple cases that I have implemented.
+    if plot == 'transient':
+        fig, ax = plt.subplots(1,1, figsize=(5,5))
+        animation = PictsTransientPlot(fig, ax=ax, conf_file_path=configuration_path, transient_df=normalized_transient, gates_list=gates, interval=interval, mask=mask)
+
+    elif plot == 'spectrum':
+        fig, ax = plt.subplots(1,1, figsize=(5,5))
+        animation = PictsSpectrumPlot(fig, ax=ax, df=picts, interval=interval, mask=mask, bands=bands)
+
+    elif plot == 'all':
+        #The two panels are driven by a single animation: each frame is rendered once, and a single gif is saved
+        fig, ax = plt.subplots(1,2, figsize=(10,4))
+        animation = PictsCompositePlot(fig, plots=[
+            PictsSpectrumPlot(fig, ax=ax[0], df=picts, interval=interval, animate=False, mask=mask, bands=bands),
+            PictsTransientPlot(fig, ax=ax[1], conf_file_path=configuration_path, transient_df=normalized_transient, gates_list=gates, interval=interval, animate=False, mask=mask)
+            ], interval=interval)
+    else:
+        raise ValueError(f'Unknown plot option: {plot}')
+
+    #By default I don't show the animation but I just save it.
+    if show:
+        plt.show()
+    #The destination to save the output must be entered
+    elif output_file_path is None:
+        print("No animations will be saved.")
+    #Save the plot. I manage the creation of the destination folder
+    else:
+        Path(output_file_path).parent.mkdir(parents=True, exist_ok=True)
+        animation.save(output_file_path, global_palette=global_palette)
+
+    plt.close(fig)
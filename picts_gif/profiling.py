@@ -0,0 +1,178 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+#profiling.py records how long each stage of the pipeline takes.
+#The stages (TDMS reading, zero fix, normalization, spectrum, gif encoding, ...) are wrapped in
+#   with profiling.stage('name') as info:
+#       ...
+#       info['shape'] = data.shape      #optional information about the stage, such as the size of the arrays
+#When the stage ends, an event is sent to every registered callback. The event is a dictionary with:
+# - stage: the name of the stage
+# - wall_s: wall time in seconds
+# - cpu_s: cpu time of the process in seconds
+# - peak_rss_mb: peak resident memory of the whole process in MB, since it started, read at the end of the stage (None if not available).
+#   It is the high-water mark of the process, not the peak of the stage: a stage that allocates less than an earlier one shows the earlier peak
+# - peak_rss_growth_mb: how much the stage raised the peak of the process, in MB. It is zero if the stage stayed below the earlier peak
+# - the information added by the stage
+#If no callback is registered, stage and array_info do nothing, so the instrumentation costs nothing in a normal run.
+#
+#ProfileReport is a callback that collects the events and writes them to a json file (CLI option --profile, see profile_to).
+#Any other callable can be registered with add_callback, e.g. to forward the events to other metrics systems.
+
+try:
+    import resource
+except ImportError:        #resource is not available on Windows
+    resource = None
+
+_callbacks = []
+
+
+def add_callback(callback : Callable[[dict], None]) -> None:
+    '''
+    Registers a callable that receives an event (a dictionary) at the end of each stage.
+    '''
+    _callbacks.append(callback)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def remove_callback(callback : Callable[[dict], None]) -> None:
+    '''
+    Removes a callable registered with add_callback.
+    '''
+    _callbacks.remove(callback)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def peak_rss_mb():
+    '''
+    Returns the peak resident memory of the process in MB since it started (ru_maxrss), or None if it is not available.
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #Linux gives kilobytes, macOS gives bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def array_info(data) -> dict:
+    '''
+    Returns shape and size in bytes of a numpy array or of a pandas dataframe.
+    If no callback is registered nobody reads them, so an empty dictionary is returned without looking at the data.
+    '''
+    if not _callbacks:
+        return {}
+    return {'shape' : list(data.shape), 'nbytes' : int(data.nbytes if hasattr(data, 'nbytes') else data.memory_usage(deep=False).sum())}
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+@contextmanager
+def stage(name : str, **info):
+    '''
+    Context manager that measures a stage of the pipeline and sends the event to the callbacks.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - name:
+            the name of the stage
+         - info:
+            extra information about the stage. The stage can add more information to the yielded dictionary
+
+        ......................................................
+        ......................................................
+    '''
+    if not _callbacks:
+        yield info
+        return
+
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    start_peak = peak_rss_mb()
+    try:
+        yield info
+    finally:
+        peak = peak_rss_mb()
+        event = {
+            'stage' : name,
+            'wall_s' : time.perf_counter() - start_wall,
+            'cpu_s' : time.process_time() - start_cpu,
+            'peak_rss_mb' : peak,
+            'peak_rss_growth_mb' : None if peak is None else peak - start_peak,
+            **info
+            }
+        for callback in list(_callbacks):
+            callback(event)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+class ProfileReport:
+    """
+  ProfileReport collects the events of the stages, and writes them to a json file.
+  It is a callback: register it with add_callback.
+
+  .............................
+  Attributes:
+
+  events         : list
+                  the events received, in order
+
+ ................................
+  Methods:
+
+  summary(self):
+    returns, for each stage, the number of calls, total wall and cpu time, and the maximum peak memory
+
+  save(self, path):
+    writes events and summary to a json file
+  """
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event : dict) -> None:
+        self.events.append(event)
+
+    def summary(self) -> dict:
+        summary = {}
+        for event in self.events:
+            entry = summary.setdefault(event['stage'], {'calls' : 0, 'wall_s' : 0., 'cpu_s' : 0., 'peak_rss_mb' : None})
+            entry['calls'] += 1
+            entry['wall_s'] += event['wall_s']
+            entry['cpu_s'] += event['cpu_s']
+            if event['peak_rss_mb'] is not None:
+                entry['peak_rss_mb'] = max(entry['peak_rss_mb'] or 0., event['peak_rss_mb'])
+        return summary
+
+    def save(self, path : str) -> None:
+        with open(path, 'w') as pfile:
+            json.dump({'summary' : self.summary(), 'events' : self.events}, pfile, indent=4)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+@contextmanager
+def profile_to(path : str):
+    '''
+    Context manager that collects the events of the stages run inside it in a ProfileReport, and writes it to path (the CLI option --profile).
+    The callback is removed and the report is written also if the run raises. If path is None, nothing is collected.
+    '''
+    if path is None:
+        yield None
+        return
+    report = ProfileReport()
+    add_callback(report)
+    try:
+        yield report
+    finally:
+        remove_callback(report)
+        report.save(path)
+        print(f"Profile report saved in {path}")
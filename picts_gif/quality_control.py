@@ -0,0 +1,123 @@
+import numpy as np
+from picts_gif import utilities
+
+#quality_control.py checks each transient of a run before the spectrum is computed. A single bad channel (a saturated
+#amplifier, a trigger that fired late, a temperature where the light did not switch on) used to stop the whole run
+#with the ValueError of normalized_transient, or to spoil the spectrum without a warning.
+#Here all the columns are checked together, with a few vectorized operations on the transients array:
+# - saturated: too many rows at the largest (or smallest) value of the column, the signal was clipped
+# - non_monotonic: after the switch off of the light the mean of the current grows from a block of rows to the next one
+# - light_below_dark: the light current is not larger than the dark current
+# - noisy: the noise is too large with respect to i_light - i_dark
+# - trigger_misaligned: the light switches off too far from t = 0
+#The columns with a flag are masked: normalization_values sets them to NaN, and the plots skip them.
+#The check is enabled by the key "quality_control" of the json file: true, or a dictionary with the thresholds
+#of quality_flags, e.g. "quality_control" : {"max_noise" : 0.1}
+
+FLAGS = ('saturated', 'non_monotonic', 'light_below_dark', 'noisy', 'trigger_misaligned')
+
+SATURATION_ROWS = 0.01             #fraction of the rows at the extreme value of a column above which it is saturated
+MAX_NOISE = 0.05                   #largest noise, relative to i_light - i_dark
+N_BLOCKS = 20                      #blocks of rows of the decay compared for the monotonicity
+TRIGGER_TOLERANCE = 0.02           #largest distance of the switch off from t = 0, as a fraction of the duration of the transient
+
+
+def quality_flags(
+    values : np.ndarray,
+    time : np.ndarray,
+    i_light : np.ndarray,
+    i_dark : np.ndarray,
+    detected : dict = None,
+    saturation_rows : float = SATURATION_ROWS,
+    max_noise : float = MAX_NOISE,
+    n_blocks : int = N_BLOCKS,
+    trigger_tolerance : float = TRIGGER_TOLERANCE
+    ) -> dict:
+    '''
+    Checks all the transients together and flags the ones that should not enter the spectrum.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - values:
+            2D numpy array of the raw transients, a row for each time and a column for each temperature
+         - time:
+            the increasing time axis
+         - i_light, i_dark:
+            the light and dark currents of each column (see input_handler.normalization_values)
+         - detected:
+            the output of utilities.detect_normalization_windows, if already computed. Otherwise it is computed here
+         - saturation_rows, max_noise, n_blocks, trigger_tolerance:
+            the thresholds of the flags, see the constants of this module
+
+        ......................................................
+         Return:
+         - a dictionary of numpy arrays, with a value for each column: a boolean array for each name of FLAGS,
+           'noise' (the standard deviation of the noise) and 'good' (True if the column has no flag)
+        ......................................................
+        ......................................................
+    '''
+    values = np.asarray(values, dtype=float)
+    n_rows = values.shape[0]
+    detected = utilities.detect_normalization_windows(values) if detected is None else detected
+    noise, drop = detected['noise'], detected['drop']
+    step = i_light - i_dark
+    flags = {}
+
+    #A clipped signal sits on the same value for many rows. A noiseless column would look saturated, so it needs some noise
+    with np.errstate(invalid='ignore'):
+        at_extreme = (values == np.nanmax(values, axis=0)).sum(axis=0) + (values == np.nanmin(values, axis=0)).sum(axis=0)
+    flags['saturated'] = (noise > 0) & (at_extreme > saturation_rows * n_rows)
+
+    #The decay is split in n_blocks blocks of rows for each column, and the means of all the blocks come from a single cumulative sum.
+    #A block may be larger than the previous one only within the noise of the two means
+    margin = max(2, n_rows // 100)
+    start = np.minimum(drop + margin, n_rows - 1)
+    bounds = (start + (n_rows - start) * np.arange(n_blocks + 1)[:, None] / n_blocks).astype(int)
+    means = utilities.column_window_means(values, bounds[:-1], bounds[1:])
+    block_rows = np.maximum(np.diff(bounds, axis=0)[0], 1)
+    tolerance = 3 * np.sqrt(2 / block_rows) * noise + 0.01 * np.abs(step)
+    with np.errstate(invalid='ignore'):
+        flags['non_monotonic'] = (np.diff(means, axis=0) > tolerance).any(axis=0)
+
+        flags['light_below_dark'] = ~(step > 0)
+        flags['noisy'] = (step > 0) & ~(noise <= max_noise * step)
+
+    switch_off = time[np.minimum(drop, n_rows - 1)]
+    flags['trigger_misaligned'] = np.abs(switch_off) > trigger_tolerance * (time[-1] - time[0])
+
+    flags['noise'] = noise
+    flags['good'] = ~np.any([flags[name] for name in FLAGS], axis=0)
+    return flags
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def settings(configuration : dict):
+    '''
+    Returns the thresholds of quality_flags given in the configuration, {} for the default ones, or None if the check is disabled.
+    '''
+    value = configuration.get('quality_control', False)
+    if value is True:
+        return {}
+    return dict(value) if value else None
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def summary(
+    flags : dict,
+    temperatures : np.ndarray
+    ) -> dict:
+    '''
+    Returns a json serializable summary of quality_flags: the number of checked transients, the number of rejected ones,
+    the number of transients with each flag, and the flags of each rejected temperature.
+    '''
+    temperatures = np.asarray(temperatures, dtype=float)
+    rejected = np.flatnonzero(~flags['good'])
+    return {
+        'n_transients' : int(len(flags['good'])),
+        'n_rejected' : int(len(rejected)),
+        'flags' : {name : int(np.count_nonzero(flags[name])) for name in FLAGS},
+        'rejected' : {str(temperatures[i]) : [name for name in FLAGS if flags[name][i]] for i in rejected}
+        }
@@ -0,0 +1,233 @@
+import argparse
+import json
+from pathlib import Path
+from typing import Tuple
+import numpy as np
+import picts_gif
+from picts_gif import profiling
+from picts_gif import utilities
+from picts_gif.picts_result import PictsResult
+
+#ramp_average.py averages repeated ramps of the same sample, to beat the noise.
+#Each ramp is measured at slightly different temperatures (the wf_<T> channels), so the transients can not be stacked as they are:
+#each ramp is resampled on a common temperature grid, interpolating linearly between its two nearest temperatures.
+#The time axes of the ramps can differ too (e.g. the trigger offset found by set_zero 'auto' moves by a sample): each ramp is resampled
+#on the time axis of the first one in the same way, and the rows outside of it are NaN.
+#The ramps are processed one at a time: RampAccumulator keeps only the running sums and the counts of the grid,
+#so only one ramp is in memory, whatever the number of ramps. It is called from the CLI as:
+#   picts_gif_start average --path ramp1.tdms ramp2.tdms ramp3.tdms --dict dict.json --output-dir ./average
+
+
+def resample_columns(
+    values : np.ndarray,
+    temperatures : np.ndarray,
+    grid : np.ndarray
+    ) -> np.ndarray:
+    '''
+    Interpolates linearly the columns of values (one for each temperature) on the temperatures of the grid.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - values:
+            2D numpy array, a row for each time (or rate window) and a column for each temperature
+         - temperatures:
+            the temperature of each column, in any order
+         - grid:
+            the temperatures of the resampled columns
+
+        ......................................................
+         Return:
+         - a new numpy array with a column for each temperature of the grid.
+           The columns of the grid outside the temperatures of the ramp, or next to a NaN column, are NaN
+        ......................................................
+        ......................................................
+    '''
+    temperatures = np.asarray(temperatures, dtype=float)
+    if len(temperatures) < 2: raise ValueError('At least two temperatures are needed to resample a ramp')
+    order = np.argsort(temperatures)
+    sorted_temperatures = temperatures[order]
+
+    #left and right neighbours of each temperature of the grid, and the weight of the right one
+    left = np.clip(np.searchsorted(sorted_temperatures, grid, side='right') - 1, 0, len(temperatures) - 2)
+    width = sorted_temperatures[left + 1] - sorted_temperatures[left]
+    weight = np.divide(grid - sorted_temperatures[left], width, out=np.zeros(len(grid)), where=width > 0)
+
+    #two gathers, then the interpolation is done in place on the first one
+    resampled = values[:, order[left]]
+    resampled *= 1 - weight
+    resampled += weight * values[:, order[left + 1]]
+    resampled[:, (grid < sorted_temperatures[0]) | (grid > sorted_temperatures[-1])] = np.nan
+    return resampled
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+class RampAccumulator:
+    """
+  RampAccumulator averages the results of more ramps on a common temperature grid, adding one ramp at a time.
+
+  .............................
+  Attributes:
+
+  grid           : np.ndarray
+                  The common temperatures, in K
+
+  n_ramps        : int
+                  The number of ramps added
+
+  counts         : np.ndarray
+                  The number of ramps that contributed to each temperature of the grid
+ ................................
+  Methods:
+
+  add(self, result):
+    resamples a ramp on the grid and adds it to the running sums.
+
+  result(self):
+    returns the averaged transients and spectrum as a PictsResult.
+  """
+
+    def __init__(self, grid : np.ndarray):
+        self.grid = np.asarray(grid, dtype=float)
+        self.n_ramps = 0
+        self.counts = np.zeros(len(self.grid), dtype=int)
+        #the sums and the counts of each point: a NaN point of a ramp is skipped, without discarding the rest of its column
+        self._time = self._gates = self._en = None
+        self._transient_sum = self._transient_count = None
+        self._spectrum_sum = self._spectrum_count = None
+
+    def add(self, result : PictsResult) -> None:
+        '''
+        Resamples the transients and the spectrum of a ramp on the grid and adds them to the running sums.
+        The transients are first resampled on the time axis of the first ramp. All the ramps must have the same rate windows,
+        within a time step (the log spaced windows are moved on the time axis of each ramp).
+        '''
+        if result.spectrum is None: raise ValueError('The spectrum of the result is not computed')
+        if self._time is None:
+            self._time, self._gates, self._en = result.time.copy(), result.gates.copy(), result.en.copy()
+            self._transient_sum = np.zeros((len(self._time), len(self.grid)))
+            self._transient_count = np.zeros((len(self._time), len(self.grid)), dtype=np.int32)
+            self._spectrum_sum = np.zeros((len(self.grid), len(self._en)))
+            self._spectrum_count = np.zeros((len(self.grid), len(self._en)), dtype=np.int32)
+        elif result.gates.shape != self._gates.shape or not np.allclose(result.gates, self._gates, rtol=0., atol=np.min(np.diff(self._time))):
+            raise ValueError('The rate windows of the ramp are not the ones of the first ramp')
+
+        with profiling.stage('accumulate', **profiling.array_info(result.transient)):
+            transient = result.transient
+            if not np.array_equal(result.time, self._time):
+                #the rows are interpolated as the columns: the time takes the place of the temperature
+                transient = resample_columns(transient.T, result.time, self._time).T
+            transient = resample_columns(transient, result.temperature, self.grid)
+            self.counts += ~np.isnan(transient).all(axis=0)
+            self._accumulate(transient, self._transient_sum, self._transient_count)
+            spectrum = resample_columns(result.spectrum.T, result.temperature, self.grid).T
+            self._accumulate(spectrum, self._spectrum_sum, self._spectrum_count)
+        self.n_ramps += 1
+
+    @staticmethod
+    def _accumulate(values, sums, counts):
+        #the NaN points are set to zero in place, so the resampled array is not copied again
+        valid = ~np.isnan(values)
+        counts += valid
+        np.copyto(values, 0., where=~valid)
+        sums += values
+
+    def result(self) -> PictsResult:
+        '''
+        Returns the average of the ramps added so far, as a PictsResult on the grid. Its mask is False on the temperatures that no ramp covered,
+        which are NaN.
+        '''
+        if self.n_ramps == 0: raise ValueError('No ramp was added')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            transient = self._transient_sum / self._transient_count
+            spectrum = self._spectrum_sum / self._spectrum_count
+        return PictsResult(transient, self._time, self.grid, gates=self._gates, en=self._en, spectrum=spectrum, mask=self.counts > 0)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def temperature_grid(
+    paths : list,
+    step : float = None,
+    data_group_name : str = 'Measured Data'
+    ) -> np.ndarray:
+    '''
+    Returns a grid that covers the temperatures of all the tdms files. Only the metadata of the files are read.
+    By default the step is the median distance of two consecutive temperatures of the ramps.
+    '''
+    ramps = [np.sort(utilities.tdms_temperatures(path, data_group_name)) for path in paths]
+    if step is None:
+        step = float(np.median(np.concatenate([np.diff(ramp) for ramp in ramps])))
+    low, high = min(ramp[0] for ramp in ramps), max(ramp[-1] for ramp in ramps)
+    return np.linspace(low, high, int(round((high - low) / step)) + 1)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def average_ramps(
+    paths : list,
+    configuration_path : str,
+    grid : np.ndarray = None,
+    step : float = None
+    ) -> Tuple[PictsResult, np.ndarray]:
+    '''
+    Computes each ramp and averages them on a common temperature grid. Only one ramp at a time is in memory.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - paths:
+            the tdms files of the ramps of a sample
+         - configuration_path:
+            path to the json file, the same for all the ramps
+         - grid:
+            the common temperatures. If None, a grid that covers all the ramps (see temperature_grid)
+         - step:
+            the step of the default grid
+
+        ......................................................
+         Return:
+         - a PictsResult with the averaged transients and spectrum on the grid
+         - the number of ramps that contributed to each temperature of the grid
+        ......................................................
+        ......................................................
+    '''
+    from picts_gif import pipeline
+    grid = temperature_grid(paths, step) if grid is None else grid
+    accumulator = RampAccumulator(grid)
+    for path in paths:
+        accumulator.add(pipeline.compute_result(path, configuration_path))
+    return accumulator.result(), accumulator.counts
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def main(argv : list = None):
+    '''
+    The average subcommand. From here i manage input data from CLI.
+    '''
+    from picts_gif import export
+    parser = argparse.ArgumentParser(prog='picts_gif_start average', description='Average repeated ramps of a sample on a common temperature grid')
+    parser.add_argument("-p", "--path", type=str, nargs='+', required=True, help="The tdms files of the ramps. \n E.g.: --path ramp1.tdms ramp2.tdms")
+    parser.add_argument("-d", "--dict", type=str, required=True, help="The json file, the same for all the ramps")
+    parser.add_argument("-o", "--output-dir", type=str, required=True, help="The directory where the averaged results are written")
+    parser.add_argument("-f", "--format", type=str, default='csv', choices=[name for name in export.FORMATS if name != 'store'], help="The format of the files")
+    parser.add_argument("--step", type=float, default=None, help="The step of the temperature grid, in K. Default: the median step of the ramps")
+    args = parser.parse_args(argv)
+
+    result, counts = average_ramps(args.path, args.dict, step=args.step)
+
+    with open(args.dict, "r") as pfile:
+        configuration = json.load(pfile)
+    metadata = {
+        'source' : [str(path) for path in args.path],
+        'configuration' : configuration,
+        'counts' : {str(temperature) : int(count) for temperature, count in zip(result.temperature, counts)},
+        'version' : picts_gif.__version__
+        }
+    written = export.export_results(
+        Path(args.output_dir), result.to_dataframe('transient'), result.to_dataframe('spectrum'), result.gates, args.format, metadata, en=result.en
+        )
+    for path in written:
+        print(f"Saved {path}")
@@ -0,0 +1,296 @@
+import argparse
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+#synthetic.py creates PICTS data with a known ground truth, for benchmarks and scale tests.
+#The current transients are simulated for a thermal ramp: for each temperature the LED is on until t = 0,
+#then the current drops and decays with the thermal emission of one or more traps.
+#The emission rate of each trap follows [see 'The Electrical Characterization of Semiconductors:
+#Majority Carriers and Electron States', P. Blood, J. W. Orton, Academic Pr, 1992, cap. 7]
+#
+#   e(T) = gamma T^2 sigma exp(-Ea / (k_B T))
+#
+#The data can be written as a TDMS file, with the same structure of the files of our acquisition system:
+#channels called 'wf_<temperature>' in the 'Measured Data' group, with the 'wf_trigger_offset' property,
+#inverted and multiplied by the gain of the current amplifier. So the file can be read with read_transients_from_tdms.
+#
+#   picts_gif_start synthetic --output-dir ./synthetic --name sample --temperatures 2000 --samples 7700
+
+BOLTZMANN_EV = 8.617333262e-5      #Boltzmann constant in eV/K
+GAMMA = 3.25e21                    #cm^-2 s^-1 K^-2, gamma constant of the emission rate for electrons in Si
+
+#a single trap, with a peak in the range of the rate windows of tests/test_data/dictionary.json
+DEFAULT_TRAPS = [{'activation_energy' : 0.3, 'cross_section' : 1e-15, 'amplitude' : 0.6}]
+
+
+def emission_rate(
+    temperature : np.ndarray,
+    activation_energy : float,
+    cross_section : float,
+    gamma : float = GAMMA
+    ) -> np.ndarray:
+    '''
+    Returns the thermal emission rate of a trap.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - temperature:
+            temperatures in K
+         - activation_energy:
+            activation energy of the trap in eV
+         - cross_section:
+            apparent capture cross section of the trap in cm^2
+         - gamma:
+            the gamma constant, in cm^-2 s^-1 K^-2
+
+        ......................................................
+         Return:
+         - the emission rates in Hz
+        ......................................................
+        ......................................................
+    '''
+    temperature = np.asarray(temperature, dtype=float)
+    return gamma * temperature**2 * cross_section * np.exp(-activation_energy / (BOLTZMANN_EV * temperature))
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def true_emission_rates(
+    temperatures : np.ndarray,
+    traps : list = None,
+    gamma : float = GAMMA
+    ) -> pd.DataFrame:
+    '''
+    Returns the ground truth of a synthetic dataset: the emission rate of each trap at each temperature.
+    The dataframe has temperature as index and a column for each trap.
+    '''
+    traps = DEFAULT_TRAPS if traps is None else traps
+    rates = pd.DataFrame(
+        {i : emission_rate(temperatures, trap['activation_energy'], trap['cross_section'], gamma) for i, trap in enumerate(traps)},
+        index=pd.Index(temperatures, name='Temperature (K)')
+        )
+    rates.columns.name = 'Trap'
+    return rates
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def generate_transients(
+    n_temperatures : int = 217,
+    n_samples : int = 7700,
+    t_min : float = 100.,
+    t_max : float = 300.,
+    time_step : float = 1e-5,
+    light_time : float = 0.005,
+    traps : list = None,
+    light_current : float = 1e-9,
+    dark_current : float = 1e-11,
+    noise : float = 0.005,
+    gamma : float = GAMMA,
+    seed : int = 0
+    ) -> pd.DataFrame:
+    '''
+    Creates the current transients of a thermal ramp.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - n_temperatures:
+            number of temperatures of the ramp (columns)
+         - n_samples:
+            number of time samples of each transient (rows)
+         - t_min, t_max:
+            first and last temperature of the ramp, in K
+         - time_step:
+            time between two samples, in s
+         - light_time:
+            how long the LED is on before t = 0, in s
+         - traps:
+            list of dictionaries with 'activation_energy' (eV), 'cross_section' (cm^2) and 'amplitude'.
+            The amplitude is the fraction of the light current that decays with the emission rate of the trap:
+            the sum of the amplitudes must be at most 1, the rest of the current drops at t = 0
+         - light_current, dark_current:
+            current with LED on and dark current, in A
+         - noise:
+            standard deviation of the gaussian noise, as a fraction of (light_current - dark_current)
+         - gamma:
+            the gamma constant of the emission rate, in cm^-2 s^-1 K^-2
+         - seed:
+            seed of the random generator
+
+        ......................................................
+         Return:
+         - a dataframe with time as index and temperature as columns, as returned by read_transients_from_tdms
+        ......................................................
+         Raises
+         - ValueError
+            If the sum of the amplitudes of the traps is bigger than 1.
+        ......................................................
+        ......................................................
+    '''
+    traps = DEFAULT_TRAPS if traps is None else traps
+    if sum(trap['amplitude'] for trap in traps) > 1: raise ValueError('The sum of the amplitudes must be at most 1')
+
+    rng = np.random.default_rng(seed)
+    temperatures = np.round(np.linspace(t_min, t_max, n_temperatures), 3)
+    time = -light_time + time_step * np.arange(n_samples)
+    after_drop = np.clip(time, 0, None)[:, None]           #the decay starts at t = 0
+
+    #fraction of the light current still flowing at each time and temperature
+    fraction = np.zeros((n_samples, n_temperatures))
+    for trap in traps:
+        rates = emission_rate(temperatures, trap['activation_energy'], trap['cross_section'], gamma)
+        fraction += trap['amplitude'] * np.exp(-after_drop * rates[None, :])
+    fraction[time < 0] = 1.
+
+    current = dark_current + (light_current - dark_current) * fraction
+    current += noise * (light_current - dark_current) * rng.standard_normal(current.shape)
+
+    transients = pd.DataFrame(current, index=pd.Index(time, name='Time (s)'), columns=pd.Index(temperatures, name='Temperature (K)'))
+    return transients
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def write_tdms(
+    transients : pd.DataFrame,
+    path : str,
+    gain : float = 1e8,
+    trigger_offset : float = 0.01,
+    data_group_name : str = 'Measured Data'
+    ) -> None:
+    '''
+    Writes the transients in a TDMS file, as our acquisition system does.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - transients:
+            dataframe with time as index and temperature as columns, e.g. from generate_transients
+         - path:
+            path of the TDMS file
+         - gain:
+            gain of the current amplifier: the stored values are the currents multiplied by the gain
+         - trigger_offset:
+            the time of the LED trigger, stored in 'wf_trigger_offset'. The time axis is stored shifted by this value
+         - data_group_name:
+            the group of the channels
+
+        ......................................................
+        ......................................................
+    '''
+    from nptdms import TdmsWriter, ChannelObject
+
+    time = transients.index.to_numpy()
+    properties = {
+        'wf_increment' : float(time[1] - time[0]),
+        'wf_start_offset' : float(time[0] + trigger_offset),
+        'wf_trigger_offset' : float(trigger_offset),
+        'wf_samples' : len(time),
+        }
+    #The acquisition software stores the transients inverted (see read_transients_from_tdms)
+    values = -transients.to_numpy() * gain
+    channels = [
+        ChannelObject(data_group_name, f'wf_{temperature}', np.ascontiguousarray(values[:, i]), properties=properties)
+        for i, temperature in enumerate(transients.columns)
+        ]
+    with TdmsWriter(path) as tdms_writer:
+        tdms_writer.write_segment(channels)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def configuration(
+    transients : pd.DataFrame,
+    gain : float = 1e8,
+    **overrides
+    ) -> dict:
+    '''
+    Returns a configuration dictionary (the content of the json file) suitable for a synthetic dataset.
+    The light current is averaged over the LED on period, the dark current over the last 5% of the transient.
+    The other values can be changed with keyword arguments, e.g. configuration(transients, n_windows=10).
+    '''
+    time = transients.index.to_numpy()
+    configuration = {
+        "index_name" : "Time (s)",
+        "column_name" : "Temperature (K)",
+        "gain" : gain,
+        "i_light_left" : float(time[0]),
+        "i_light_right" : float(time[time < 0][-1]) if (time < 0).any() else float(time[0]),
+        "i_dark_left" : float(time[int(len(time) * 0.95)]),
+        "i_dark_right" : float(time[-1]),
+        "set_zero" : "auto",
+        "t1_min" : 1e-3,
+        "t1_shift" : 0.0003,
+        "beta" : 5,
+        "n_windows" : 6,
+        "t_avg" : 50,
+        "trim_left" : None,
+        "trim_right" : None
+        }
+    configuration.update(overrides)
+    return configuration
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def generate_dataset(
+    output_dir : str,
+    name : str = 'synthetic',
+    gain : float = 1e8,
+    configuration_overrides : dict = None,
+    **generator_options
+    ):
+    '''
+    Generates a dataset and writes it as <name>.tdms and <name>.json in output_dir.
+    The generator options are the parameters of generate_transients.
+    Returns the paths of the TDMS and of the json file, and the ground truth emission rates.
+    '''
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    transients = generate_transients(**generator_options)
+
+    tdms_path = output_dir / f'{name}.tdms'
+    json_path = output_dir / f'{name}.json'
+    write_tdms(transients, tdms_path, gain=gain)
+    with open(json_path, 'w') as pfile:
+        json.dump(configuration(transients, gain, **(configuration_overrides or {})), pfile, indent=4)
+
+    rates = true_emission_rates(transients.columns.to_numpy(), generator_options.get('traps'), generator_options.get('gamma', GAMMA))
+    return tdms_path, json_path, rates
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def main(argv : list = None):
+    '''
+    The synthetic subcommand. From here i manage input data from CLI.
+    '''
+    parser = argparse.ArgumentParser(prog='picts_gif_start synthetic', description='Write a synthetic PICTS dataset (TDMS and json)')
+    parser.add_argument("-o", "--output-dir", type=str, required=True, help="The directory where the files are written")
+    parser.add_argument("-n", "--name", type=str, default='synthetic', help="The name of the files, without extension")
+    parser.add_argument("--temperatures", type=int, default=217, help="Number of temperatures of the ramp")
+    parser.add_argument("--samples", type=int, default=7700, help="Number of time samples of each transient")
+    parser.add_argument("--noise", type=float, default=0.005, help="Noise, as a fraction of the light current")
+    parser.add_argument(
+        "--trap",
+        type=float,
+        nargs=3,
+        action='append',
+        metavar=('EA', 'SIGMA', 'AMPLITUDE'),
+        help="A trap: activation energy (eV), cross section (cm^2) and amplitude. It can be repeated. E.g.: --trap 0.3 1e-15 0.6"
+        )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator")
+    args = parser.parse_args(argv)
+
+    traps = None
+    if args.trap:
+        traps = [{'activation_energy' : ea, 'cross_section' : sigma, 'amplitude' : amplitude} for ea, sigma, amplitude in args.trap]
+
+    tdms_path, json_path, rates = generate_dataset(
+        args.output_dir, args.name, n_temperatures=args.temperatures, n_samples=args.samples, noise=args.noise, traps=traps, seed=args.seed
+        )
+    print(f"Saved {tdms_path} and {json_path}")
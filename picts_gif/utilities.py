@@ -1,12 +1,19 @@
-from nptdms import TdmsFile
+import warnings
 import numpy as np
-from scipy.optimize import root
 import pandas as pd
 from typing import Tuple
+from picts_gif import profiling
+
+#nptdms and scipy are slow to import, and many runs only need some of the methods below.
+#For this reason they are imported inside the methods that use them (convert_tdms_file_to_dataframe and calculate_en)
+
+_rate_window_constants = {}        #beta -> solution x = en t1 of the emission rate equation (see rate_window_constant)
+
 
 def convert_tdms_file_to_dataframe(
     path : str, 
-    data_group_name : str
+    data_group_name : str,
+    positions : list = None
     ) -> pd.DataFrame :
     '''
     This method convert a tdms file in a dataframe. 
@@ -18,6 +25,8 @@ def convert_tdms_file_to_dataframe(
             string with file path of TDMS file
          - data_group_name: str
             the string key in wich data are stored in TDMS file. 
+         - positions: list
+            the positions of the channels (temperatures) to read, see select_temperatures. If None, all the channels are read
         
         ......................................................
          Return:
@@ -31,28 +40,114 @@ def convert_tdms_file_to_dataframe(
          ......................................................
     '''
    
-    tdms_file = TdmsFile.read(path)
+    from nptdms import TdmsFile
     
-    # Within the tdms_file object, the acquired data is found in 'Measured Data'.
-    # This option is not universal, but specific to our data acquisition system.
-    data = tdms_file[data_group_name].as_dataframe()
+    if positions is None:
+        with profiling.stage('tdms_read', path=str(path)):
+            tdms_file = TdmsFile.read(path)
+        
+        # Within the tdms_file object, the acquired data is found in 'Measured Data'.
+        # This option is not universal, but specific to our data acquisition system.
+        with profiling.stage('tdms_to_dataframe') as info:
+            data = tdms_file[data_group_name].as_dataframe()
+            info.update(profiling.array_info(data))
+        channels = tdms_file[data_group_name].channels()
+        time_track = channels[0].time_track()
+    else:
+        #Only some temperatures are needed: I open the file reading only its metadata, 
+        #then I read the data of the selected channels. The other channels are never decoded
+        with profiling.stage('tdms_read', path=str(path), n_channels=len(positions)):
+            with TdmsFile.open(path) as tdms_file:
+                channels = tdms_file[data_group_name].channels()
+                data = pd.DataFrame({channels[i].name : channels[i][:] for i in positions})
+                time_track = channels[0].time_track()
+        with profiling.stage('tdms_to_dataframe') as info:
+            info.update(profiling.array_info(data))
     
     #info about the starting index due to the trigger
     #The tdms file contains current transients as a function of time and temperature. 
     #Basically there is a thermal ramp that goes from T_min to T_max, and each T_x acquires a current transient as a function of time.
-    data.index = tdms_file[data_group_name].channels()[0].time_track()   #this syntax is due to the structure of the tdms files. It's a bit tricky. 
-                                                                         #The acquisition time is independent of the temperature. It will be the index of my dataframe.
+    data.index = time_track   #this syntax is due to the structure of the tdms files. It's a bit tricky. 
+                              #The acquisition time is independent of the temperature. It will be the index of my dataframe.
                                                                          
-    trigger = tdms_file[data_group_name].channels()[0].properties['wf_trigger_offset']  # LabVIEW program saves info about LED trigger in 'wf_trigger_offset'. 
-                                                                                        #I need this because, to simplify the data analysis, 
-                                                                                        # I need to fix a zero in my time frame. 
-                                                                                        # The best thing to do is to fix zero exactly when the LED goes out.
+    trigger = channels[0].properties['wf_trigger_offset']  # LabVIEW program saves info about LED trigger in 'wf_trigger_offset'. 
+                                                           #I need this because, to simplify the data analysis, 
+                                                           # I need to fix a zero in my time frame. 
+                                                           # The best thing to do is to fix zero exactly when the LED goes out.
     data.index -= trigger
     return data
 
 ###############################################################################################################################################################
 ###############################################################################################################################################################
 
+def tdms_temperatures(
+    path : str, 
+    data_group_name : str
+    ) -> np.ndarray:
+    '''
+    Returns the temperatures of the channels of a tdms file, in the order of the file. Only the metadata of the file are read.
+    '''
+    from nptdms import TdmsFile
+    
+    with TdmsFile.open(path) as tdms_file:
+        return np.array([float(channel.name.replace('wf_','')) for channel in tdms_file[data_group_name].channels()])
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def select_temperatures(
+    temperatures : np.ndarray, 
+    t_min : float = None, 
+    t_max : float = None, 
+    stride : int = 1, 
+    values : list = None
+    ) -> np.ndarray:
+    '''
+    Returns the positions of the selected temperatures.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - temperatures:
+            the temperatures of the ramp, in the order of acquisition
+         - t_min, t_max:
+            the temperatures outside [t_min, t_max] are dropped. None means no limit
+         - stride:
+            one temperature every stride is kept, after the other selections
+         - values:
+            an explicit list of temperatures. For each value the closest temperature of the ramp is taken
+        
+        ......................................................
+         Return:
+         - numpy array with the positions of the selected temperatures, in increasing order
+        ......................................................
+         Raises
+         - ValueError
+            If stride is smaller than 1 or if no temperature is selected.
+        ......................................................
+        ......................................................
+    '''
+    if stride < 1: raise ValueError('stride must be at least 1')
+    temperatures = np.asarray(temperatures, dtype=float)
+    
+    if values is not None:
+        positions = np.unique([np.abs(temperatures - value).argmin() for value in values])
+    else:
+        positions = np.arange(len(temperatures))
+    
+    keep = np.ones(len(positions), dtype=bool)
+    if t_min is not None:
+        keep &= temperatures[positions] >= t_min
+    if t_max is not None:
+        keep &= temperatures[positions] <= t_max
+    positions = positions[keep][::stride]
+    
+    if len(positions) == 0: raise ValueError('No temperature selected')
+    return positions
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
 def set_column_and_index_name(
     data : pd.DataFrame
     ) -> pd.DataFrame:
@@ -238,6 +333,70 @@ def create_t1_and_t2_values (
 ###############################################################################################################################################################
 ###############################################################################################################################################################
 
+def rate_window_constant(beta : float) -> float:
+    '''
+    Returns x = en t1, the solution of en_2gates_high_injection when t2 = beta t1.
+    The equation depends only on x and beta, so for a given beta it is solved once and en = x / t1 for every rate window.
+    '''
+    beta = float(beta)
+    if beta not in _rate_window_constants:
+        #with t1 = 1 the solution of calculate_en is x itself
+        _rate_window_constants[beta] = calculate_en(np.array([1.]), np.array([beta]))[0]
+    return _rate_window_constants[beta]
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def create_log_spaced_t1_and_t2_values(
+    en_min : float, 
+    en_max : float, 
+    n_windows : int, 
+    beta : float, 
+    time : np.ndarray = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Creates the set of t1 and t2 values whose emission rates are log spaced between en_max and en_min.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - en_min, en_max: 
+            the range of the emission rates, in Hz
+         - n_windows:
+            number of rate windows
+         - beta: the proportionality constant between t1 and t2
+         - time:
+            the time axis of the transients. If given, each t1 is moved to the nearest time of the axis (after t = 0), the windows that end up
+            on the same time are merged and the windows whose t2 is after the end of the transient are dropped
+        
+        ......................................................
+         return:
+         t1:
+            - numpy array with all t1 values, increasing (the emission rates decrease).
+         t2:
+            - numpy array with all t2 values.
+        ......................................................
+        ......................................................
+    '''
+    #Linear t1 values put most of the windows at the high rates, where en changes fast with t1, and leave gaps at the low rates.
+    #Here the rates are chosen first, uniform on a log scale, and t1 = x / en comes from the single solution x of the equation
+    en = np.geomspace(en_max, en_min, n_windows)
+    t1 = rate_window_constant(beta) / en
+    
+    if time is not None:
+        #the gates are taken on the samples of the transient: t1 is moved on them, so the emission rate is the one of the gate really used
+        samples = time[time > 0]
+        right = np.clip(np.searchsorted(samples, t1), 1, len(samples) - 1)
+        nearest = np.where(t1 - samples[right - 1] <= samples[right] - t1, right - 1, right)
+        t1 = samples[np.unique(nearest)]
+        #only after the snap: moving t1 up by half a sample can push t2 after the end, where backfill_positions has no row
+        t1 = t1[beta * t1 <= time[-1]]
+    
+    return t1, beta * t1
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
 def create_index_for_t1_and_t2(
     transient_norm : pd.DataFrame, 
     t1 : np.ndarray, 
@@ -268,9 +427,518 @@ def create_index_for_t1_and_t2(
     #This method allows us to enumerate the values ​​of the indexes (which are floats with many digits after the comma).
     #In this way, the first index corresponds to 1, the second to 2, etc., etc.
     
-    t1_index = np.array([transient_norm.index.get_indexer([t], method = 'backfill')[0] for t in t1])    
-    t2_index = np.array([transient_norm.index.get_indexer([t], method = 'backfill')[0] for t in t2])    
-    return t1_index, t2_index
+    time = transient_norm.index.to_numpy(dtype=float)
+    return backfill_positions(time, t1), backfill_positions(time, t2)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def backfill_positions(
+    time : np.ndarray, 
+    t : np.ndarray
+    ) -> np.ndarray:
+    '''
+    Returns, for each value of t, the position of the first time >= t, or -1 if there is none.
+    It is what index.get_indexer(t, method='backfill') does, with a single binary search on the increasing time axis.
+    '''
+    positions = np.searchsorted(time, t, side='left')
+    positions[positions == len(time)] = -1
+    return positions
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def nan_mean(values : np.ndarray) -> np.ndarray:
+    '''
+    Returns the mean of each column of a 2D array, skipping NaN as pandas mean does. The mean of a column without values is NaN.
+    '''
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=0)
+    sums = np.where(valid, values, 0.).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def range_mean(
+    values : np.ndarray, 
+    time : np.ndarray, 
+    left : float, 
+    right : float
+    ) -> np.ndarray:
+    '''
+    Returns the mean of each column over the rows with left <= time <= right, as transient.loc[left:right].mean() does.
+    The rows are found with a binary search on the increasing time axis, and the mean is computed on a view of the array.
+    '''
+    start, stop = np.searchsorted(time, left, side='left'), np.searchsorted(time, right, side='right')
+    return nan_mean(values[start:stop])
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def gate_bounds(
+    n_rows : int, 
+    positions : np.ndarray, 
+    t_avg : int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the first row and the row after the last one of each gate, values[position - t_avg : position + t_avg].
+    The bounds follow the rules of python slices (as iloc does), also for negative positions: a negative bound counts from the end, 
+    then the bounds are clipped to the array. An empty gate has stop = start.
+    '''
+    bounds = np.asarray(positions, dtype=int)[None, :] + np.array([[-t_avg], [t_avg]])
+    start, stop = np.clip(np.where(bounds < 0, bounds + n_rows, bounds), 0, n_rows)
+    return start, np.maximum(stop, start)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _gate_view(
+    values : np.ndarray, 
+    positions : np.ndarray, 
+    t_avg : int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    #A sliding window view of the time axis has a window of 2 t_avg rows starting at each row, without copying anything.
+    #A gate that ends past the last row takes the last window of the view instead, and inside tells which of its rows are in the gate:
+    #so the transient is never padded, and only the rows of the gates are copied when the view is indexed with first
+    n_rows, length = values.shape[0], 2 * t_avg
+    start, stop = gate_bounds(n_rows, positions, t_avg)
+    if n_rows < length:
+        #a gate longer than the whole transient: only here the few rows of the transient are padded with NaN
+        values = np.concatenate([values, np.full((length - n_rows, values.shape[1]), np.nan)])
+    view = np.lib.stride_tricks.sliding_window_view(values, length, axis=0)
+    first = np.minimum(start, view.shape[0] - 1)
+    offset = np.arange(length) + (first - start)[:, None]
+    inside = (offset >= 0) & (offset < (stop - start)[:, None])
+    return view, first, inside
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def gate_means(
+    values : np.ndarray, 
+    positions : np.ndarray, 
+    t_avg : int
+    ) -> np.ndarray:
+    '''
+    Returns, for each position, the mean of each column over the rows values[position - t_avg : position + t_avg].
+    The rows follow the rules of python slices (as iloc does), also for negative positions, and NaN are skipped.
+    The result has a row for each position and a column for each column of values.
+    '''
+    #All the gates at once from the sliding window view, with the rows of each gate on the middle axis: each row of the transient is copied whole.
+    #The rows outside the gates are set to zero and the gates are summed. Skipping NaN costs more than the sum, 
+    #so it is done again only for the columns whose sum is NaN (e.g. the temperatures masked by quality_control)
+    view, first, inside = _gate_view(values, positions, t_avg)
+    windows = view.transpose(0, 2, 1)[first]
+    windows[~inside] = 0.
+    sums = windows.sum(axis=1)
+    counts = np.repeat(np.count_nonzero(inside, axis=1)[:, None], values.shape[1], axis=1)
+    columns = np.flatnonzero(np.isnan(sums).any(axis=0))
+    if len(columns):
+        valid = ~np.isnan(windows[:, :, columns])
+        sums[:, columns] = np.where(valid, windows[:, :, columns], 0.).sum(axis=1)
+        counts[:, columns] = np.count_nonzero(valid & inside[:, :, None], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+GATE_STATISTICS = ('mean', 'median', 'trimmed_mean', 'hampel')
+
+
+def gate_windows(
+    values : np.ndarray, 
+    positions : np.ndarray, 
+    t_avg : int
+    ) -> np.ndarray:
+    '''
+    Returns the rows of each gate, values[position - t_avg : position + t_avg] as gate_means takes them, 
+    as an array with a row for each position, a column for each column of values and the 2 t_avg rows of the gate on the last axis.
+    The rows that are not in the gate (at the borders of the transient) are NaN.
+    '''
+    #a single fancy index of the sliding window view takes all the gates: only the gates are copied, never the whole transient
+    view, first, inside = _gate_view(values, positions, t_avg)
+    windows = view[first]
+    np.copyto(windows, np.nan, where=~inside[:, None, :])
+    return windows
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def gate_statistics(
+    values : np.ndarray, 
+    positions : np.ndarray, 
+    t_avg : int, 
+    statistic : str = 'mean', 
+    trim : float = 0.1, 
+    threshold : float = 3.
+    ) -> np.ndarray:
+    '''
+    Returns, for each position, a statistic of each column over the rows of the gate, values[position - t_avg : position + t_avg].
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - values:
+            2D numpy array, a row for each time and a column for each temperature. NaN values are skipped
+         - positions:
+            the rows of the gates (see backfill_positions)
+         - t_avg:
+            half the number of rows of each gate
+         - statistic:
+            'mean' (as gate_means), 'median', 'trimmed_mean' (the mean without the fraction trim of the smallest and of the largest values)
+            or 'hampel' (the mean of the values within threshold robust standard deviations, from the median absolute deviation, of the median).
+            With the last three a single spike in a gate does not change the spectrum
+         - trim, threshold:
+            the parameters of 'trimmed_mean' and 'hampel'
+        
+        ......................................................
+         Return:
+         - a numpy array with a row for each position and a column for each column of values
+        ......................................................
+         Raises
+         - ValueError
+            If the statistic is unknown.
+        ......................................................
+        ......................................................
+    '''
+    if statistic not in GATE_STATISTICS: raise ValueError(f'The gate statistic must be one of {GATE_STATISTICS}')
+    if statistic == 'mean':
+        return gate_means(values, positions, t_avg)
+    
+    #All the gates of all the temperatures at once, reduced along the last axis. Each gate is sorted once (np.sort puts the NaN at the end),
+    #then the median and the trimmed sums are read at the right positions of the sorted values: no nanmedian, no python loop
+    ordered = np.sort(gate_windows(values, positions, t_avg), axis=-1)
+    n = (~np.isnan(ordered)).sum(axis=-1)
+    median = _sorted_median(ordered, n)
+    if statistic == 'median':
+        return median
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if statistic == 'trimmed_mean':
+            #the values kept are the ones between k and n - k
+            k = np.floor(trim * n).astype(int)
+            sums = np.concatenate([np.zeros(ordered.shape[:-1] + (1,)), np.cumsum(np.nan_to_num(ordered), axis=-1)], axis=-1)
+            total = np.take_along_axis(sums, (n - k)[..., None], axis=-1)[..., 0] - np.take_along_axis(sums, k[..., None], axis=-1)[..., 0]
+            return np.where(n - 2 * k > 0, total / (n - 2 * k), np.nan)
+        
+        #hampel: the values farther than threshold robust standard deviations from the median are dropped, the others are averaged
+        deviation = np.abs(ordered - median[..., None])
+        scale = 1.4826 * _sorted_median(np.sort(deviation, axis=-1), n)
+        kept = deviation <= threshold * scale[..., None]
+        return np.where(kept, ordered, 0.).sum(axis=-1) / kept.sum(axis=-1)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _sorted_median(ordered, n):
+    #median of the first n values of each sorted row, NaN if n = 0
+    low = np.take_along_axis(ordered, np.maximum((n - 1) // 2, 0)[..., None], axis=-1)[..., 0]
+    high = np.take_along_axis(ordered, (n // 2)[..., None], axis=-1)[..., 0]
+    return np.where(n > 0, (low + high) / 2, np.nan)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def spectrum_uncertainty(
+    values : np.ndarray, 
+    t1_positions : np.ndarray, 
+    t2_positions : np.ndarray, 
+    t_avg : int, 
+    n_bootstrap : int = 200, 
+    confidence : float = 0.95, 
+    seed : int = None, 
+    chunk_size : int = 256
+    ) -> dict:
+    '''
+    Estimates the uncertainty of each point of the spectrum, the difference of the means of the gates at t1 and at t2.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - values:
+            2D numpy array of the normalized transients, a row for each time and a column for each temperature
+         - t1_positions, t2_positions:
+            the rows of the gates of each rate window (see backfill_positions)
+         - t_avg:
+            half the number of rows of each gate
+         - n_bootstrap:
+            the number of bootstrap replicates
+         - confidence:
+            the probability inside the bootstrap band
+         - seed:
+            the seed of the random generator, for reproducible bands
+         - chunk_size:
+            the number of temperatures resampled together, to bound the memory of the replicates
+        
+        ......................................................
+         Return:
+         - a dictionary of numpy arrays with a row for each temperature and a column for each rate window: 
+            'std' (the standard deviation of the point, from the standard errors of the two gate means) 
+            and 'lower', 'upper' (the bootstrap confidence band)
+        ......................................................
+        ......................................................
+    '''
+    windows = [gate_windows(values, positions, t_avg) for positions in (t1_positions, t2_positions)]
+    valid = [~np.isnan(window) for window in windows]
+    samples = [np.nan_to_num(window) for window in windows]
+    
+    #standard error of each gate mean, from the samples of its window
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)              #the gates with less than two samples are NaN
+        variance = [np.nanvar(window, axis=-1, ddof=1) / mask.sum(axis=-1) for window, mask in zip(windows, valid)]
+    std = np.sqrt(variance[0] + variance[1])
+    
+    #Bootstrap: a replicate of a gate takes 2 t_avg samples of the gate with replacement. A single random index tensor gives all the replicates,
+    #one for the t1 gates and one for the t2 gates, and it becomes the matrix of how many times each sample is taken in each replicate.
+    #Then the mean of every replicate of every gate and temperature is a matrix product, with no loop over the replicates
+    length = windows[0].shape[-1]
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, length, size=(2, n_bootstrap, length))
+    offsets = length * np.arange(2 * n_bootstrap).reshape(2, n_bootstrap, 1)
+    counts = np.bincount((index + offsets).ravel(), minlength=2 * n_bootstrap * length).reshape(2, n_bootstrap, length).astype(float)
+    
+    lower, upper = np.empty_like(std), np.empty_like(std)
+    quantiles = [(1 - confidence) / 2, (1 + confidence) / 2]
+    for start in range(0, std.shape[1], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            #the NaN samples have weight zero: each replicate mean is divided by the number of valid samples it took
+            means = [(sample[:, chunk] @ count.T) / (mask[:, chunk].astype(float) @ count.T) for sample, mask, count in zip(samples, valid, counts)]
+        replicates = means[0] - means[1]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lower[:, chunk], upper[:, chunk] = np.nanquantile(replicates, quantiles, axis=-1)
+    
+    return {'std' : std.T, 'lower' : lower.T, 'upper' : upper.T}
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def cumulative_sums(values : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the cumulative sums along time of the values, skipping NaN, and of the number of valid values, each with a row of zeros on top: 
+    the sum of the rows values[start:stop] of a column is sums[stop] - sums[start]. See window_means.
+    '''
+    valid = ~np.isnan(values)
+    sums = np.zeros((values.shape[0] + 1, values.shape[1]))
+    np.cumsum(np.where(valid, values, 0.), axis=0, out=sums[1:])
+    counts = np.zeros((values.shape[0] + 1, values.shape[1]))
+    np.cumsum(valid, axis=0, out=counts[1:])
+    return sums, counts
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def window_means(
+    sums : np.ndarray, 
+    counts : np.ndarray, 
+    start : np.ndarray, 
+    stop : np.ndarray
+    ) -> np.ndarray:
+    '''
+    Returns the mean of each column j over its own rows values[start[j]:stop[j]], skipping NaN, from the cumulative sums of values (see cumulative_sums).
+    Each mean needs two rows of the cumulative sums, whatever the window is. start and stop can also have a row for each window 
+    (a 2D array with a column for each column of values, or with a single column for the same rows in all the columns): then a row of means is returned for each window.
+    '''
+    columns = np.arange(sums.shape[1])
+    total, n = sums[stop, columns] - sums[start, columns], counts[stop, columns] - counts[start, columns]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, total / n, np.nan)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def column_window_means(
+    values : np.ndarray, 
+    start : np.ndarray, 
+    stop : np.ndarray
+    ) -> np.ndarray:
+    '''
+    Returns the mean of each column j over its own rows values[start[j]:stop[j]], skipping NaN.
+    The cumulative sums along time are computed once, then each mean needs two rows of them, whatever the window is (see window_means).
+    start and stop can also have a row for each window (a 2D array with a column for each column of values): then a row of means is returned for each window.
+    '''
+    return window_means(*cumulative_sums(values), start, stop)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def _last_true(mask : np.ndarray) -> np.ndarray:
+    #position of the last True row of each column, -1 if there is none
+    return np.where(mask.any(axis=0), mask.shape[0] - 1 - np.argmax(mask[::-1], axis=0), -1)
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def detect_normalization_windows(
+    values : np.ndarray, 
+    min_rows : int = None
+    ) -> dict:
+    '''
+    Finds, for each column, the rows of the light plateau and of the dark tail of the transient. All the columns are processed together.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - values:
+            2D numpy array of the transients, a row for each time and a column for each temperature
+         - min_rows:
+            the minimum number of rows of a window. By default 0.5% of the rows, at least 5
+        
+        ......................................................
+         Return:
+         - a dictionary of numpy arrays, with a value for each column:
+            'light_start', 'light_stop', 'dark_start', 'dark_stop' (rows of the windows, stop excluded), 'drop' (first row after
+            the switch off of the light), 'noise' (standard deviation of the noise) and 'detected' (False if a window could not be found)
+        ......................................................
+        ......................................................
+    '''
+    n_rows, n_columns = values.shape
+    rows = np.arange(n_rows)[:, None]
+    min_rows = max(5, n_rows // 200) if min_rows is None else min_rows
+    margin = max(2, n_rows // 100)             #rows skipped around the switch off of the light
+
+    #The switch off of the light is the minimum of the derivative, as in check_and_fix_zero_x_axis_if_trigger_value_is_corrupted
+    derivative = np.diff(values, axis=0)
+    drop = np.argmin(np.where(np.isnan(derivative), np.inf, derivative), axis=0) + 1
+
+    #noise of each column, from the median absolute deviation of the derivative (robust to the drop and to the decay)
+    deviation = np.abs(derivative - np.nanmedian(derivative, axis=0))
+    noise = 1.4826 * np.nanmedian(deviation, axis=0) / np.sqrt(2)
+
+    #references: the values just before the switch off, and the last 5% of the transient
+    light_stop = np.maximum(drop - margin, 0)
+    before = np.clip(light_stop[None, :] - 1 - np.arange(max(min_rows, 5))[:, None], 0, n_rows - 1)
+    light = np.nanmedian(np.take_along_axis(values, before, axis=0), axis=0)
+    dark = np.nanmedian(values[-max(n_rows // 20, 1):], axis=0)
+    threshold = 3 * noise + 0.02 * np.abs(light - dark)
+
+    #A window is the longest run of rows next to its reference that stay within the threshold from it. NaN do not break it
+    with np.errstate(invalid='ignore'):
+        light_bad = (np.abs(values - light) > threshold) & (rows < light_stop)
+        dark_bad = (np.abs(values - dark) > threshold) & (rows >= drop)
+    light_start = _last_true(light_bad) + 1
+    dark_start = np.maximum(_last_true(dark_bad) + 1, drop + margin)
+    dark_stop = np.full(n_columns, n_rows)
+
+    detected = (light_stop - light_start >= min_rows) & (dark_stop - dark_start >= min_rows) & np.isfinite(noise)
+    return {
+        'light_start' : light_start, 'light_stop' : light_stop,
+        'dark_start' : np.minimum(dark_start, n_rows), 'dark_stop' : dark_stop,
+        'drop' : drop, 'noise' : noise, 'detected' : detected
+        }
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+BASELINE_SIGNIFICANCE = 10.8      #F statistic of the non constant terms of the baseline below which they are dropped (p ~ 0.001 for one term)
+
+def baseline_design(
+    time : np.ndarray, 
+    model : str = 'polynomial', 
+    order : int = 1, 
+    time_constant : float = None
+    ) -> np.ndarray:
+    '''
+    Returns the design matrix of a baseline model, a row for each time and a column for each parameter:
+    the powers up to order of the time scaled to [-1, 1] ('polynomial'), or a constant and exp(-t / time_constant) ('exponential').
+    By default the time constant is a third of the time after the switch off of the light.
+    '''
+    time = np.asarray(time, dtype=float)
+    if model == 'polynomial':
+        #the scaled time keeps the normal equations well conditioned also for the higher orders
+        scaled = 2 * (time - time[0]) / (time[-1] - time[0]) - 1
+        return np.vander(scaled, order + 1, increasing=True)
+    if model == 'exponential':
+        time_constant = (time[-1] - max(time[0], 0.)) / 3 if time_constant is None else time_constant
+        return np.column_stack([np.ones_like(time), np.exp(-time / time_constant)])
+    raise ValueError(f'Unknown baseline model: {model}')
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def fit_baseline(
+    values : np.ndarray, 
+    time : np.ndarray, 
+    start : np.ndarray, 
+    stop : np.ndarray, 
+    model : str = 'polynomial', 
+    order : int = 1, 
+    time_constant : float = None, 
+    significance : float = BASELINE_SIGNIFICANCE, 
+    max_correction : np.ndarray = None
+    ) -> np.ndarray:
+    '''
+    Fits a baseline to the rows start[j]:stop[j] (the dark region) of each column j, all the columns in one solve.
+    The dark region is short, so outside of it the baseline is an extrapolation that amplifies the noise and anything that is not drift
+    (e.g. a decay that did not end): the non constant terms are kept only if the region supports them, and the correction can be capped.
+        .....................................................
+        ......................................................
+
+         Input parameters:
+         - values:
+            2D numpy array of the transients, a row for each time and a column for each temperature. NaN values are ignored
+         - time:
+            the increasing time axis
+         - start, stop:
+            the rows of the region fitted in each column, stop excluded
+         - model, order, time_constant:
+            the baseline model, see baseline_design
+         - significance:
+            the non constant terms of a column are dropped (the baseline is the mean of the region) if their F statistic, 
+            the reduction of the residuals for each term over the residual variance, is below it. If None, they are always kept
+         - max_correction:
+            the largest distance of the baseline of each column from its mean in the region, e.g. a fraction of i_light - i_dark. 
+            If None, the baseline is not capped
+        
+        ......................................................
+         Return:
+         - the baseline of each column on the whole time axis, an array with the shape of values.
+           A column with fewer rows than parameters in its region has a zero baseline
+        ......................................................
+        ......................................................
+    '''
+    design = baseline_design(time, model, order, time_constant)
+    n_rows, n_parameters = design.shape
+    rows = np.arange(n_rows)[:, None]
+    weights = ((rows >= start) & (rows < stop) & ~np.isnan(values)).astype(float)
+    n_points = weights.sum(axis=0)
+    fitted = n_points >= n_parameters
+    
+    #The values are centered on the mean of the region: the model has a constant, so the fit of the centered values is the baseline minus the mean,
+    #and the residuals are not computed as a small difference of large numbers
+    level = np.where(fitted, (np.where(weights > 0, values, 0.) * weights).sum(axis=0) / np.maximum(n_points, 1), 0.)
+    centered = np.where(weights > 0, values - level, 0.)
+    
+    #The design matrix is the same for all the columns, only the rows used change: the normal equations of all the columns
+    #come from two matrix products, (X_a X_b)^T W for X^T W X and X^T (W y) for X^T W y, then a batched solve of the small systems
+    products = (design[:, :, None] * design[:, None, :]).reshape(n_rows, n_parameters**2)
+    normal_matrix = (products.T @ weights).T.reshape(-1, n_parameters, n_parameters)
+    normal_vector = (design.T @ centered).T
+    normal_matrix[~fitted] = np.eye(n_parameters)
+    coefficients = np.linalg.solve(normal_matrix, normal_vector[:, :, None])[:, :, 0]
+    coefficients[~fitted] = 0.
+    
+    #F test of the non constant terms: the residuals of the constant are sum(w y^2) of the centered values, 
+    #the ones of the full model are smaller by coefficients . normal_vector
+    if significance is not None and n_parameters > 1:
+        constant_residuals = (centered**2).sum(axis=0)
+        reduction = np.einsum('jk,jk->j', coefficients, normal_vector)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            #an exact fit has zero residuals, also when the rounding makes them negative
+            statistic = (reduction / (n_parameters - 1)) / (np.maximum(constant_residuals - reduction, 0.) / (n_points - n_parameters))
+        coefficients[~(statistic >= significance)] = 0.            #also the columns without residual degrees of freedom
+    
+    baseline = design @ coefficients.T
+    if max_correction is not None:
+        cap = np.maximum(max_correction, 0.)
+        np.clip(baseline, -cap, cap, out=baseline)
+    baseline += level
+    baseline[:, ~fitted] = 0.
+    return baseline
 
 ###############################################################################################################################################################
 ###############################################################################################################################################################
@@ -343,6 +1011,7 @@ def calculate_en (
     #It numerically solves the related trascendental equation returned from 
     #en_2gates_high_injection. This equation have two solution: one is zero, the other is the real value of en.
     #Zero solution is the bad one.
+    from scipy.optimize import root
   
     en = np.array([])
     for t1, t2 in zip(t1,t2):
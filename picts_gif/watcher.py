@@ -0,0 +1,248 @@
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from picts_gif import batch
+
+#watcher.py is a long running daemon for the acquisition PCs, that drop the finished TDMS files on a shared disk.
+#It is called from the CLI as:
+#   picts_gif_start watch --input-dir /shared/campaign --output-dir /shared/gifs --plot spectrum
+#Every --poll-interval seconds it lists the TDMS files of the directory. A file is processed when:
+# - its size and modification time did not change since the previous poll (the acquisition finished writing it)
+# - its json is there (same name, or the one given with --dict)
+# - its gif is missing or stale, according to the build manifest of batch.py
+#The files are processed by a pool of worker processes, created once when the daemon starts.
+#Each worker imports pandas, nptdms, scipy and matplotlib (with the Agg backend) only once, in its initializer,
+#so every file costs the compute and render time, instead of a full start of the CLI.
+#Every event (queued, done, failed, up to date) is appended to a status log, one json object per line.
+
+STATUS_LOG_NAME = 'picts_gif_status.jsonl'
+
+
+def warm_up_worker() -> None:
+    '''
+    Initializer of the worker processes: it imports the heavy libraries once, so that the jobs find them already loaded.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot
+    import nptdms
+    from picts_gif import pipeline, utilities
+    from picts_gif import picts_spectrum_plot, picts_transient_plot, picts_composite_plot
+    import numpy as np
+    utilities.calculate_en(np.array([1e-3]), np.array([5e-3]))     #imports scipy.optimize
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def run_job(
+    tdms_path : str,
+    configuration_path : str,
+    output_file_path : str,
+    options : dict
+    ) -> float:
+    '''
+    The job of a worker: it processes a sample as batch does, and returns the time it took in seconds.
+    '''
+    start = time.perf_counter()
+    batch.process_sample(tdms_path, configuration_path, output_file_path, **options)
+    return time.perf_counter() - start
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+class FolderWatcher:
+    """
+  FolderWatcher watches a directory and creates the gif of each new TDMS file, with a pool of worker processes.
+
+  .............................
+  Attributes:
+
+  input_dir          : Path
+                      The directory where the TDMS files and their json files land
+
+  output_dir         : Path
+                      The directory where gifs, manifest and status log are written
+
+  configuration_path : str
+                      The json used for the TDMS files without their own json. If None, they wait for their json
+
+  options            : dict
+                      The options of the animation (plot, interval, global_palette), as in batch.py
+
+  status_log         : Path
+                      The file where the events are appended, one json object per line
+ ................................
+  Methods:
+
+  poll(self):
+    collects the finished jobs, and queues the TDMS files that are ready.
+
+  collect(self, wait):
+    records the finished jobs in the manifest and in the status log.
+
+  run(self, poll_interval, max_polls):
+    polls the directory until it is interrupted (or for max_polls times).
+
+  close(self):
+    waits for the running jobs and stops the workers.
+  """
+
+    def __init__(
+        self,
+        input_dir : str,
+        output_dir : str,
+        configuration_path : str = None,
+        plot : str = 'all',
+        interval : float = 1.,
+        global_palette : bool = False,
+        workers : int = 1,
+        status_log : str = None
+        ):
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.configuration_path = configuration_path
+        self.options = {'plot' : plot, 'interval' : interval, 'global_palette' : global_palette}
+        self.status_log = Path(status_log) if status_log is not None else self.output_dir / STATUS_LOG_NAME
+        self.manifest = batch.load_manifest(self.output_dir)
+
+        self._last_seen = {}       #TDMS path -> state (sizes and modification times) at the previous poll
+        self._handled = {}         #TDMS path -> state when it was last queued or found up to date
+        self._jobs = {}            #future -> (TDMS path, output path, fingerprint)
+
+        #The workers are created once: their imports stay warm for all the jobs
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=warm_up_worker)
+
+    def log(self, event : str, **info) -> None:
+        '''
+        Appends an event to the status log.
+        '''
+        entry = {'time' : datetime.now().isoformat(timespec='seconds'), 'event' : event, **{k : str(v) if isinstance(v, Path) else v for k, v in info.items()}}
+        with open(self.status_log, 'a') as pfile:
+            pfile.write(json.dumps(entry) + '\n')
+        print(f"{entry['time']} {event} {info.get('tdms', '')}")
+
+    def _configuration_for(self, tdms_path : Path):
+        json_path = tdms_path.with_suffix('.json')
+        if json_path.exists():
+            return json_path
+        if self.configuration_path is not None:
+            return Path(self.configuration_path)
+        return None
+
+    @staticmethod
+    def _state(*paths) -> tuple:
+        state = []
+        for path in paths:
+            stat = path.stat()
+            state += [stat.st_size, stat.st_mtime_ns]
+        return tuple(state)
+
+    def poll(self) -> list:
+        '''
+        Collects the finished jobs and queues the TDMS files that are ready. Returns the list of the queued files.
+        '''
+        self.collect()
+        running = {tdms_path for tdms_path, _, _ in self._jobs.values()}
+        queued = []
+
+        for tdms_path in sorted(self.input_dir.glob('*.tdms')):
+            json_path = self._configuration_for(tdms_path)
+            if json_path is None:
+                continue            #I wait for its json
+            try:
+                state = self._state(tdms_path, json_path)
+            except FileNotFoundError:
+                continue            #removed while I was looking at it
+
+            #A file is ready when it did not change since the previous poll: the acquisition finished writing it
+            previous = self._last_seen.get(tdms_path)
+            self._last_seen[tdms_path] = state
+            if previous != state or self._handled.get(tdms_path) == state or tdms_path in running:
+                continue
+            self._handled[tdms_path] = state
+
+            output_file_path = self.output_dir / f'{tdms_path.stem}.gif'
+            current = batch.fingerprint(tdms_path, json_path, **self.options)
+            if output_file_path.exists() and self.manifest.get(output_file_path.name) == current:
+                self.log('up_to_date', tdms=tdms_path, output=output_file_path)
+                continue
+
+            future = self.pool.submit(run_job, tdms_path, json_path, output_file_path, self.options)
+            self._jobs[future] = (tdms_path, output_file_path, current)
+            self.log('queued', tdms=tdms_path, output=output_file_path)
+            queued.append(tdms_path)
+
+        return queued
+
+    def collect(self, wait : bool = False) -> None:
+        '''
+        Records the finished jobs in the manifest and in the status log. If wait is True, it waits for all the running jobs.
+        '''
+        for future in list(self._jobs):
+            if not (wait or future.done()):
+                continue
+            tdms_path, output_file_path, current = self._jobs.pop(future)
+            try:
+                seconds = future.result()
+            except Exception as error:
+                self.manifest.pop(output_file_path.name, None)
+                self.log('failed', tdms=tdms_path, output=output_file_path, error=str(error))
+            else:
+                self.manifest[output_file_path.name] = current
+                self.log('done', tdms=tdms_path, output=output_file_path, seconds=round(seconds, 3))
+            batch.save_manifest(self.output_dir, self.manifest)
+
+    def run(
+        self,
+        poll_interval : float = 2.,
+        max_polls : int = None
+        ) -> None:
+        '''
+        Polls the directory every poll_interval seconds, until Ctrl+C (or for max_polls times, then it waits for the running jobs).
+        '''
+        self.log('started', input_dir=self.input_dir, output_dir=self.output_dir)
+        polls = 0
+        try:
+            while max_polls is None or polls < max_polls:
+                self.poll()
+                polls += 1
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        '''
+        Waits for the running jobs, records them and stops the workers.
+        '''
+        self.collect(wait=True)
+        self.pool.shutdown()
+        self.log('stopped')
+
+###############################################################################################################################################################
+###############################################################################################################################################################
+
+def main(argv : list = None):
+    '''
+    The watch subcommand. From here i manage input data from CLI.
+    '''
+    parser = argparse.ArgumentParser(prog='picts_gif_start watch', description='Watch a directory and create the gif of each new TDMS file')
+    parser.add_argument("-I", "--input-dir", type=str, required=True, help="The directory where the TDMS files land. \n E.g.: --input-dir /shared/campaign")
+    parser.add_argument("-o", "--output-dir", type=str, required=True, help="The directory where the gifs are written. \n E.g.: --output-dir /shared/gifs")
+    parser.add_argument("-d", "--dict", type=str, default=None, help="The json used for the TDMS files without a json with the same name")
+    parser.add_argument("-pl", "--plot", type=str, default='all', choices=['transient', 'spectrum', 'all'], help="Specify what to animate")
+    parser.add_argument("-i", "--interval", type=float, default=1., help="The time between one frame and another, in ms")
+    parser.add_argument('--global-palette', action='store_true', help="Save the gifs with a single palette for all the frames")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes")
+    parser.add_argument('--poll-interval', type=float, default=2., help="Seconds between two looks at the directory")
+    parser.add_argument('--status-log', type=str, default=None, help=f"The status log, one json object per line. Default: {STATUS_LOG_NAME} in the output directory")
+    args = parser.parse_args(argv)
+
+    watcher = FolderWatcher(args.input_dir, args.output_dir, args.dict, args.plot, args.interval, args.global_palette, args.workers, args.status_log)
+    print("Watching, press Ctrl+C to stop")
+    watcher.run(args.poll_interval)
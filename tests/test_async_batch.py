@@ -0,0 +1,74 @@
+import pytest
+import asyncio
+import json
+from picts_gif import batch
+from picts_gif import synthetic
+from picts_gif.async_batch import run_batch_async
+
+
+##################################################
+##################################################
+
+#return a campaign directory with three samples
+@pytest.fixture
+def campaign(tmp_path):
+    input_dir = tmp_path / 'campaign'
+    for seed in range(3):
+        synthetic.generate_dataset(input_dir, name=f'sample_{seed}', n_temperatures=4, n_samples=3000, seed=seed)
+    return input_dir
+
+##################################################
+##################################################
+
+class TestRunBatchAsync:
+
+    def test_builds_all_then_skips(self, campaign, tmp_path):
+        '''
+        GIVEN: a campaign with three samples
+        WHEN: run_batch_async is called twice
+        THEN: the first run builds all the gifs and records them in the manifest, the second one skips them
+        '''
+        output_dir = tmp_path / 'gifs'
+        first = asyncio.run(run_batch_async(campaign, output_dir, plot='transient', workers=2, prefetch=1))
+        second = asyncio.run(run_batch_async(campaign, output_dir, plot='transient', workers=2, prefetch=1))
+        assert sorted(path.name for path in first['built']) == ['sample_0.gif', 'sample_1.gif', 'sample_2.gif']
+        assert all(path.exists() for path in first['built'])
+        assert set(batch.load_manifest(output_dir)) == {'sample_0.gif', 'sample_1.gif', 'sample_2.gif'}
+        assert second['built'] == [] and len(second['skipped']) == 3
+
+    def test_same_manifest_of_sequential_batch(self, campaign, tmp_path):
+        '''
+        GIVEN: a campaign built by the sequential batch
+        WHEN: run_batch_async is called on the same output directory
+        THEN: nothing is rebuilt
+        '''
+        output_dir = tmp_path / 'gifs'
+        batch.run_batch(campaign, output_dir, plot='transient')
+        outcome = asyncio.run(run_batch_async(campaign, output_dir, plot='transient', workers=1))
+        assert outcome['built'] == [] and len(outcome['skipped']) == 3
+
+    def test_failure_does_not_stop_the_others(self, campaign, tmp_path):
+        '''
+        GIVEN: a campaign where a sample has a wrong json
+        WHEN: run_batch_async is called
+        THEN: that sample fails and is not in the manifest, the others are built
+        '''
+        with open(campaign / 'sample_1.json') as pfile:
+            configuration = json.load(pfile)
+        configuration['i_light_left'], configuration['i_dark_left'] = configuration['i_dark_left'], configuration['i_light_left']
+        configuration['i_light_right'], configuration['i_dark_right'] = configuration['i_dark_right'], configuration['i_light_right']
+        with open(campaign / 'sample_1.json', 'w') as pfile:
+            json.dump(configuration, pfile)
+        output_dir = tmp_path / 'gifs'
+        outcome = asyncio.run(run_batch_async(campaign, output_dir, plot='transient', workers=2))
+        assert [path.name for path in outcome['failed']] == ['sample_1.gif']
+        assert set(batch.load_manifest(output_dir)) == {'sample_0.gif', 'sample_2.gif'}
+
+    def test_wrong_workers(self, campaign, tmp_path):
+        '''
+        GIVEN: zero workers
+        WHEN: run_batch_async is called
+        THEN: ValueError is raised
+        '''
+        with pytest.raises(ValueError):
+            asyncio.run(run_batch_async(campaign, tmp_path / 'gifs', workers=0))
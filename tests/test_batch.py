@@ -0,0 +1,74 @@
+import pytest
+import json
+from picts_gif import batch
+from picts_gif import synthetic
+
+
+##################################################
+##################################################
+
+#return a campaign directory with two samples
+@pytest.fixture
+def campaign(tmp_path):
+    input_dir = tmp_path / 'campaign'
+    for seed in range(2):
+        synthetic.generate_dataset(input_dir, name=f'sample_{seed}', n_temperatures=4, n_samples=3000, seed=seed)
+    return input_dir
+
+##################################################
+##################################################
+
+class TestBatch:
+
+    def test_second_run_skips_everything(self, campaign, tmp_path):
+        '''
+        GIVEN: a campaign already built
+        WHEN: run_batch is called again without changes
+        THEN: no gif is rebuilt, and the manifest has an entry for each gif
+        '''
+        output_dir = tmp_path / 'gifs'
+        first = batch.run_batch(campaign, output_dir, plot='transient')
+        second = batch.run_batch(campaign, output_dir, plot='transient')
+        assert len(first['built']) == 2
+        assert second['built'] == [] and len(second['skipped']) == 2
+        assert set(batch.load_manifest(output_dir)) == {'sample_0.gif', 'sample_1.gif'}
+
+    def test_only_edited_sample_is_rebuilt(self, campaign, tmp_path):
+        '''
+        GIVEN: a campaign already built
+        WHEN: the json of one sample is edited
+        THEN: only the gif of that sample is rebuilt
+        '''
+        output_dir = tmp_path / 'gifs'
+        batch.run_batch(campaign, output_dir, plot='transient')
+        json_path = campaign / 'sample_1.json'
+        with open(json_path) as pfile:
+            configuration = json.load(pfile)
+        configuration['n_windows'] = 4
+        with open(json_path, 'w') as pfile:
+            json.dump(configuration, pfile)
+        outcome = batch.run_batch(campaign, output_dir, plot='transient')
+        assert [path.name for path in outcome['built']] == ['sample_1.gif']
+
+    def test_options_and_force(self, campaign, tmp_path):
+        '''
+        GIVEN: a campaign already built
+        WHEN: run_batch is called with different options, or with force
+        THEN: all the gifs are rebuilt
+        '''
+        output_dir = tmp_path / 'gifs'
+        batch.run_batch(campaign, output_dir, plot='transient')
+        assert len(batch.run_batch(campaign, output_dir, plot='transient', global_palette=True)['built']) == 2
+        assert len(batch.run_batch(campaign, output_dir, plot='transient', global_palette=True, force=True)['built']) == 2
+
+    def test_configuration_hash_ignores_formatting(self, tmp_path):
+        '''
+        GIVEN: two json files with the same content but different formatting and keys order
+        WHEN: configuration_sha256 is called
+        THEN: the hashes are the same
+        '''
+        first, second = tmp_path / 'first.json', tmp_path / 'second.json'
+        first.write_text('{"beta": 5, "gain": 1e8}')
+        second.write_text('{\n  "gain": 1e8,\n  "beta": 5\n}')
+        assert batch.configuration_sha256(first, plot='all') == batch.configuration_sha256(second, plot='all')
+        assert batch.configuration_sha256(first, plot='all') != batch.configuration_sha256(first, plot='spectrum')
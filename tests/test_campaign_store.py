@@ -0,0 +1,92 @@
+import pytest
+from picts_gif.campaign_store import CampaignStore
+from picts_gif.picts_result import PictsResult
+from picts_gif import export
+import numpy as np
+import pandas as pd
+
+
+##################################################
+##################################################
+
+@pytest.fixture
+def result():
+    rng = np.random.default_rng(0)
+    temperature = np.linspace(100., 300., 50)
+    return PictsResult(
+        rng.normal(size=(200, 50)), np.linspace(-0.01, 0.05, 200), temperature,
+        gates=np.array([[1e-3, 5e-3], [2e-3, 1e-2], [3e-3, 1.5e-2]]), en=np.array([400., 200., 133.3]), spectrum=rng.normal(size=(50, 3))
+        )
+
+##################################################
+##################################################
+
+class TestCampaignStore:
+
+    def test_round_trip(self, tmp_path, result):
+        '''
+        GIVEN: a sample written in a store
+        WHEN: the store is opened again and the sample is read
+        THEN: transients, spectrum and configuration are the ones written
+        '''
+        CampaignStore(tmp_path, chunk_size=16).add_sample('A', result, {'beta' : 5})
+        store = CampaignStore(tmp_path)
+        read = store.read_result('A')
+        assert store.samples() == ['A']
+        assert store.configuration('A') == {'beta' : 5}
+        pd.testing.assert_frame_equal(read.to_dataframe('transient'), result.to_dataframe('transient'))
+        pd.testing.assert_frame_equal(store.read_spectrum('A'), result.to_dataframe('spectrum'))
+
+##################################################
+    def test_partial_read_opens_only_the_needed_chunks(self, tmp_path, result):
+        '''
+        GIVEN: a sample in chunks of 10 temperatures, whose first and last chunks are removed from the disk
+        WHEN: a temperature range inside the other chunks and some rate windows are read
+        THEN: the read works, and returns only the requested temperatures and rate windows
+        '''
+        store = CampaignStore(tmp_path, chunk_size=10)
+        store.add_sample('A', result)
+        for chunk in ('chunk_000', 'chunk_004'):
+            for array in ('temperature', 'transient', 'spectrum'):
+                (tmp_path / 'A' / f'{chunk}_{array}.npy').unlink()
+
+        t_min, t_max = result.temperature[12], result.temperature[33]
+        spectrum = store.read_spectrum('A', t_min, t_max, rate_windows=[0, 2])
+        transient = store.read_transient('A', t_min, t_max)
+        assert np.array_equal(spectrum.to_numpy(), result.spectrum[12:34][:, [0, 2]])
+        assert np.array_equal(transient.to_numpy(), result.transient[:, 12:34])
+
+##################################################
+    def test_append_temperatures(self, tmp_path, result):
+        '''
+        GIVEN: a sample with the first temperatures of a ramp
+        WHEN: the other temperatures are appended, and then appended again
+        THEN: the sample has the whole ramp, the stored chunks are not rewritten, and the second append raises ValueError
+        '''
+        first = PictsResult(result.transient[:, :30], result.time, result.temperature[:30], result.gates, result.en, result.spectrum[:30])
+        second = PictsResult(result.transient[:, 30:], result.time, result.temperature[30:], result.gates, result.en, result.spectrum[30:])
+        store = CampaignStore(tmp_path, chunk_size=16)
+        store.add_sample('A', first)
+        first_chunk_time = (tmp_path / 'A' / 'chunk_000_transient.npy').stat().st_mtime_ns
+
+        store.append_temperatures('A', second)
+        assert np.array_equal(store.read_result('A').spectrum, result.spectrum)
+        assert (tmp_path / 'A' / 'chunk_000_transient.npy').stat().st_mtime_ns == first_chunk_time
+        with pytest.raises(ValueError):
+            store.append_temperatures('A', second)
+
+##################################################
+    def test_export_to_store(self, tmp_path, result):
+        '''
+        GIVEN: the dataframes of two runs
+        WHEN: they are exported with the store format
+        THEN: the store has a sample for each run
+        '''
+        for sample in ('A', 'B'):
+            export.export_results(
+                tmp_path / 'store', result.to_dataframe('transient'), result.to_dataframe('spectrum'), result.gates,
+                'store', {'configuration' : {'beta' : 5}}, sample
+                )
+        store = CampaignStore(tmp_path / 'store')
+        assert store.samples() == ['A', 'B']
+        assert np.array_equal(store.read_result('B').transient, result.transient)
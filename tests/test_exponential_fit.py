@@ -0,0 +1,97 @@
+import pytest
+import warnings
+from picts_gif import exponential_fit
+from picts_gif import input_handler
+from picts_gif import synthetic
+import numpy as np
+
+
+##################################################
+##################################################
+
+@pytest.fixture
+def time():
+    return np.linspace(0., 0.02, 2000)
+
+##################################################
+##################################################
+
+class TestFitExponentials:
+
+    def test_single_exponential_rates(self, time):
+        '''
+        GIVEN: noisy single exponential decays with rates over two decades
+        WHEN: fit_exponentials is called with one exponential
+        THEN: the rates, amplitudes and offsets are found, and all the fits converged
+        '''
+        rng = np.random.default_rng(0)
+        rates = np.geomspace(200., 20000., 30)
+        values = 0.7 * np.exp(-np.outer(time, rates)) + 0.05 + rng.normal(0., 0.003, (len(time), len(rates)))
+        fit = exponential_fit.fit_exponentials(time, values, 1)
+        assert np.allclose(fit['rates'][:,0], rates, rtol=0.03)
+        assert np.allclose(fit['amplitudes'][:,0], 0.7, atol=0.02)
+        assert np.allclose(fit['offset'], 0.05, atol=0.01)
+        assert fit['converged'].all()
+        assert np.allclose(fit['residuals'], 0.003, rtol=0.1)
+
+##################################################
+    def test_two_exponentials_fastest_first(self, time):
+        '''
+        GIVEN: sums of two exponentials with rates a decade apart
+        WHEN: fit_exponentials is called with two exponentials
+        THEN: both rates are found, the fastest in the first column
+        '''
+        rates = np.geomspace(1000., 5000., 10)
+        values = 0.4 * np.exp(-np.outer(time, rates / 10)) + 0.5 * np.exp(-np.outer(time, rates))
+        fit = exponential_fit.fit_exponentials(time, values, 2)
+        assert np.allclose(fit['rates'][:,0], rates, rtol=1e-3)
+        assert np.allclose(fit['rates'][:,1], rates / 10, rtol=1e-3)
+        assert np.allclose(fit['amplitudes'], [0.5, 0.4], atol=1e-3)
+
+##################################################
+    def test_nan_are_ignored(self, time):
+        '''
+        GIVEN: a decay with a block of NaN values
+        WHEN: fit_exponentials is called
+        THEN: the rate is the one of the decay without NaN
+        '''
+        values = 0.6 * np.exp(-np.outer(time, [800., 3000.]))
+        values[100:300, 0] = np.nan
+        fit = exponential_fit.fit_exponentials(time, values, 1)
+        assert np.allclose(fit['rates'][:,0], [800., 3000.], rtol=1e-4)
+        with pytest.raises(ValueError):
+            exponential_fit.fit_exponentials(time, values, 3)
+
+##################################################
+    def test_columns_without_enough_points_are_not_fitted(self, time):
+        '''
+        GIVEN: a decay, a column of NaN and a column with only two valid points
+        WHEN: fit_exponentials is called
+        THEN: there is no warning, the decay converged and the other two columns are NaN and not converged
+        '''
+        values = 0.6 * np.exp(-np.outer(time, [800., 3000., 3000.]))
+        values[:, 1] = np.nan
+        values[2:, 2] = np.nan
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            fit = exponential_fit.fit_exponentials(time, values, 1)
+        assert list(fit['converged']) == [True, False, False]
+        assert np.isclose(fit['rates'][0, 0], 800., rtol=1e-4)
+        for name in ('rates', 'amplitudes', 'offset', 'residuals'):
+            assert np.isnan(fit[name][1:]).all()
+
+##################################################
+    def test_fit_transients_finds_the_true_emission_rates(self, tmp_path):
+        '''
+        GIVEN: the normalized transients of a synthetic dataset with a single trap
+        WHEN: fit_transients is called
+        THEN: for each temperature the rate is the true one, where it can be measured in the time window
+        '''
+        tdms_path, json_path, rates = synthetic.generate_dataset(
+            tmp_path, n_temperatures=20, n_samples=2000, time_step=1e-5, noise=0.002, configuration_overrides={'set_zero' : 0}
+            )
+        transient_norm = input_handler.normalized_transient(input_handler.read_transients_from_tdms(tdms_path, json_path), json_path)
+        table = exponential_fit.fit_transients(transient_norm, 1)
+        measurable = (rates[0] > 30.) & (rates[0] < 5e4)
+        assert list(table.index) == list(transient_norm.columns)
+        assert np.allclose(table['Emission rate 1 (Hz)'][measurable.to_numpy()], rates[0][measurable], rtol=0.03)
@@ -0,0 +1,135 @@
+import pytest
+import subprocess
+import sys
+from os.path import dirname, join
+from picts_gif import export
+from picts_gif import utilities
+import numpy as np
+import pandas as pd
+
+
+##################################################
+##################################################
+
+#return normalized transients, spectrum and gates
+@pytest.fixture
+def results():
+    time = np.linspace(-0.01, 0.05, 100)
+    transient = pd.DataFrame(np.exp(-np.outer(time, np.arange(1, 8))), index=time, columns=np.arange(100., 107.))
+    picts = pd.read_pickle(join(dirname(__file__), 'test_data/test.pkl'), 'bz2')
+    t1, t2 = utilities.create_t1_and_t2_values(1e-3, 3e-4, picts.shape[1], 5)
+    return transient, picts, np.array([t1, t2]).T
+
+##################################################
+##################################################
+
+class TestExport:
+
+##################################################
+    def test_gates_table_has_a_row_for_each_rate_window(self, results):
+        """ 
+        This test tests that the gates table has t1, t2 and the emission rate of each rate window
+    
+        GIVEN: 
+            the gates array
+        WHEN: 
+            I call gates_table
+        THEN: 
+            the table has a row for each gate, and the emission rates are positive
+        """
+        transient, picts, gates = results
+        table = export.gates_table(gates)
+        
+        assert len(table) == len(gates)
+        assert (table['Rate Window (Hz)'] > 0).all()
+        assert np.allclose(table['Rate Window (Hz)'], utilities.calculate_en(gates[:,0], gates[:,1]))
+
+##################################################
+    def test_gates_table_uses_the_given_emission_rates(self, results, monkeypatch):
+        """ 
+        This test tests that the gates table takes the emission rates of the result, without solving the equation of en again
+    
+        GIVEN: 
+            the gates array and the emission rates of the result
+        WHEN: 
+            I call gates_table with them
+        THEN: 
+            the emission rates of the table are the given ones, and calculate_en is never called
+        """
+        transient, picts, gates = results
+        en = utilities.rate_window_constant(5) / gates[:,0]
+        monkeypatch.setattr(utilities, 'calculate_en', None)          #a new solve would fail
+        
+        table = export.gates_table(gates, en)
+        
+        assert np.array_equal(table['Rate Window (Hz)'], en)
+
+##################################################
+    def test_csv_export_writes_a_file_for_each_table(self, results, tmp_path):
+        """ 
+        This test tests that the csv export writes transients, spectrum, gates and metadata
+    
+        GIVEN: 
+            the results of a run
+        WHEN: 
+            I call export_results with the csv format
+        THEN: 
+            four files are written, and the spectrum can be read back
+        """
+        transient, picts, gates = results
+        written = export.export_results(tmp_path, transient, picts, gates, 'csv', metadata={'version' : 'test'})
+        
+        assert len(written) == 4
+        spectrum = pd.read_csv(tmp_path / 'spectrum.csv', index_col=0)
+        assert np.allclose(spectrum.to_numpy(), picts.to_numpy())
+
+##################################################
+    def test_npz_export_writes_all_the_arrays(self, results, tmp_path):
+        """ 
+        This test tests that the npz export writes a single archive with all the arrays
+    
+        GIVEN: 
+            the results of a run
+        WHEN: 
+            I call export_results with the npz format
+        THEN: 
+            the archive contains the transients and the emission rates with the proper shapes
+        """
+        transient, picts, gates = results
+        export.export_results(tmp_path, transient, picts, gates, 'npz')
+        
+        archive = np.load(tmp_path / 'picts.npz')
+        assert archive['transients'].shape == transient.shape
+        assert archive['emission_rates'].shape == (len(gates),)
+
+##################################################
+    def test_raise_value_error_if_format_is_not_supported(self, results, tmp_path):
+        """ 
+        This test tests that an unknown format raises a ValueError
+    
+        GIVEN: 
+            a bad format
+        WHEN: 
+            I call export_results
+        THEN: 
+            a ValueError exception is thrown
+        """
+        transient, picts, gates = results
+        with pytest.raises(ValueError):
+            export.export_results(tmp_path, transient, picts, gates, 'xlsx')
+
+##################################################
+    def test_export_does_not_import_matplotlib(self):
+        """ 
+        This test tests that the CLI and the export subcommand do not import matplotlib
+    
+        GIVEN: 
+            a new python interpreter
+        WHEN: 
+            I import picts_gif.main and picts_gif.export
+        THEN: 
+            matplotlib is not imported
+        """
+        code = "import sys, picts_gif.main, picts_gif.export; print('matplotlib' in sys.modules)"
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=join(dirname(__file__), '..'))
+        assert output.stdout.strip() == 'False'
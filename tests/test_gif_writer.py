@@ -0,0 +1,135 @@
+import pytest
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation, PillowWriter
+from PIL import Image, ImageSequence
+from os.path import getsize
+from picts_gif.gif_writer import GlobalPaletteGifWriter, gif_writer
+
+
+##################################################
+##################################################
+
+#return a small animation: a line that grows for 7 frames and then stays still for 3 frames
+@pytest.fixture
+def animation():
+    fig, ax = plt.subplots(figsize=(2,2), dpi=40)
+    ax.set_xlim(0, 6)
+    ax.set_ylim(0, 6)
+    line, = ax.plot([], [], marker='o')
+    def update(frame):
+        n = min(frame, 6)
+        line.set_data(np.arange(n), np.arange(n))
+        return [line]
+    yield FuncAnimation(fig, update, frames=10)
+    plt.close(fig)
+
+##################################################
+##################################################
+
+class TestGifWriter:
+
+##################################################
+    def test_gif_writer_returns_the_proper_writer(self):
+        """ 
+        This test tests that gif_writer returns a GlobalPaletteGifWriter only if required
+    
+        GIVEN: 
+            the global_palette option
+        WHEN: 
+            I call gif_writer
+        THEN: 
+            a GlobalPaletteGifWriter is returned if global_palette is True, a PillowWriter otherwise
+        """
+        assert isinstance(gif_writer(global_palette=True), GlobalPaletteGifWriter)
+        assert not isinstance(gif_writer(global_palette=False), GlobalPaletteGifWriter)
+        assert isinstance(gif_writer(global_palette=False), PillowWriter)
+
+##################################################
+    def test_identical_consecutive_frames_are_merged(self, animation, tmp_path):
+        """ 
+        This test tests that identical consecutive frames are written only once
+    
+        GIVEN: 
+            an animation of 10 frames, where the last 3 frames are equal to the 7th
+        WHEN: 
+            I save it with GlobalPaletteGifWriter
+        THEN: 
+            the gif has 7 frames and the last one lasts longer than the others
+        """
+        output = tmp_path / 'out.gif'
+        animation.save(output, writer=GlobalPaletteGifWriter(fps=10))
+        
+        gif = Image.open(output)
+        durations = [frame.info['duration'] for frame in ImageSequence.Iterator(gif)]
+        assert len(durations) == 7
+        assert durations[-1] == 4 * durations[0]
+
+##################################################
+    def test_frames_are_the_same_of_pillow_writer(self, animation, tmp_path):
+        """ 
+        This test tests that the delta frames, once decoded, give back the animation
+    
+        GIVEN: 
+            the same animation saved with PillowWriter and GlobalPaletteGifWriter
+        WHEN: 
+            I decode the last frame of both gifs
+        THEN: 
+            the two frames are nearly identical
+        """
+        pillow_output = tmp_path / 'pillow.gif'
+        global_output = tmp_path / 'global.gif'
+        animation.save(pillow_output, writer=PillowWriter(fps=10))
+        animation.save(global_output, writer=GlobalPaletteGifWriter(fps=10))
+        
+        last_frames = []
+        for path in (pillow_output, global_output):
+            gif = Image.open(path)
+            gif.seek(gif.n_frames - 1)
+            last_frames.append(np.asarray(gif.convert('RGB'), dtype=float))
+        assert np.abs(last_frames[0] - last_frames[1]).mean() < 5
+
+##################################################
+    def test_global_palette_gif_is_smaller(self, animation, tmp_path):
+        """ 
+        This test tests that the gif written with delta frames is smaller than the PillowWriter one
+    
+        GIVEN: 
+            the same animation saved with PillowWriter and GlobalPaletteGifWriter
+        WHEN: 
+            I compare the size of the files
+        THEN: 
+            the GlobalPaletteGifWriter file is smaller
+        """
+        pillow_output = tmp_path / 'pillow.gif'
+        global_output = tmp_path / 'global.gif'
+        animation.save(pillow_output, writer=PillowWriter(fps=10))
+        animation.save(global_output, writer=GlobalPaletteGifWriter(fps=10))
+        
+        assert getsize(global_output) < getsize(pillow_output)
+
+##################################################
+    @pytest.mark.parametrize('global_palette', [True, False])
+    def test_no_frames_grabbed(self, tmp_path, global_palette):
+        """ 
+        This test tests that a clear error is raised, and no file is written, when an animation fails before its first frame
+    
+        GIVEN: 
+            an animation whose update raises an error
+        WHEN: 
+            I save it with the writer of gif_writer
+        THEN: 
+            the error of the update is raised, followed by a RuntimeError of the writer, and the gif is not written
+        """
+        fig, ax = plt.subplots(figsize=(2,2), dpi=40)
+        def update(frame):
+            raise AttributeError('broken plot')
+        animation = FuncAnimation(fig, update, init_func=lambda: [], frames=3)
+        output = tmp_path / 'out.gif'
+        
+        with pytest.raises(RuntimeError, match='no frames grabbed') as error:
+            animation.save(output, writer=gif_writer(fps=5, global_palette=global_palette))
+        plt.close(fig)
+        
+        assert isinstance(error.value.__context__, AttributeError)
+        assert not output.exists()
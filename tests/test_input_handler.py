@@ -2,6 +2,8 @@ import pytest
 from os.path import dirname, join
 from picts_gif import input_handler 
 import pandas as pd
+import numpy as np
+import json
 
 
 class TestInputHandler:
@@ -271,4 +273,194 @@ class TestInputHandler:
         
 
 
-   
\ No newline at end of file
+   
+
+##################################################
+##################################################
+
+class TestTemperatureSelection:
+
+    def test_only_the_selected_temperatures_are_read(self, tmp_path):
+        """ 
+        GIVEN: 
+            a synthetic TDMS file, with set_zero on the first channel
+        WHEN: 
+            I read it with a selection that does not contain the first channel
+        THEN: 
+            the dataframe has only the selected temperatures, with the same values of a full read
+        """
+        from picts_gif import synthetic
+        tdms_path, json_path, _ = synthetic.generate_dataset(
+            tmp_path, n_temperatures=20, n_samples=600, time_step=1e-4, noise=0., configuration_overrides={'set_zero' : 0}
+            )
+        full = input_handler.read_transients_from_tdms(tdms_path, json_path)
+        selected = input_handler.read_transients_from_tdms(tdms_path, json_path, selection={'t_min' : full.columns[5], 'stride' : 3})
+        
+        assert list(selected.columns) == list(full.columns[5::3])
+        pd.testing.assert_frame_equal(selected, full.iloc[:, 5::3])
+
+
+##################################################
+##################################################
+
+class TestAutoNormalization:
+
+    @pytest.fixture
+    def auto_dataset(self, tmp_path):
+        from picts_gif import synthetic
+        tdms_path, json_path, _ = synthetic.generate_dataset(
+            tmp_path, n_temperatures=20, n_samples=3000, time_step=1e-5, noise=0.005, configuration_overrides={'set_zero' : 0}
+            )
+        with open(json_path, 'r') as pfile:
+            configuration = json.load(pfile)
+        configuration.update(i_light_left='auto', i_light_right='auto', i_dark_left='auto', i_dark_right='auto')
+        auto_path = tmp_path / 'auto.json'
+        with open(auto_path, 'w') as pfile:
+            json.dump(configuration, pfile)
+        return input_handler.read_transients_from_tdms(tdms_path, json_path), json_path, auto_path
+
+    def test_auto_windows_give_the_same_normalization(self, auto_dataset):
+        """ 
+        GIVEN: 
+            transients whose light and dark ranges are known
+        WHEN: 
+            I normalize them with the ranges of the json, and with 'auto' ranges
+        THEN: 
+            the two normalized transients differ less than the noise
+        """
+        data, json_path, auto_path = auto_dataset
+        manual = input_handler.normalized_transient(data, json_path)
+        auto = input_handler.normalized_transient(data, auto_path)
+        assert np.nanmax(np.abs(auto.to_numpy() - manual.to_numpy())) < 0.05
+
+##################################################
+    def test_bad_columns_are_flagged_instead_of_raising(self, auto_dataset):
+        """ 
+        GIVEN: 
+            transients where one column is flat, so it has no light plateau above the dark current
+        WHEN: 
+            I normalize them with 'auto' ranges
+        THEN: 
+            a warning is given, the flat column is NaN, the others are normalized, and the windows table flags it
+        """
+        data, _, auto_path = auto_dataset
+        data.iloc[:, 4] = data.iloc[:, 4].mean()
+        with pytest.warns(UserWarning, match='can not be normalized'):
+            transient_norm = input_handler.normalized_transient(data, auto_path)
+        windows = input_handler.normalization_windows(data, auto_path)
+        
+        assert transient_norm.iloc[:, 4].isna().all()
+        assert transient_norm.drop(columns=transient_norm.columns[4]).notna().all().all()
+        assert list(windows.index[~windows['normalizable']]) == [data.columns[4]]
+        assert (windows['i_light_right'][windows['normalizable']] < 0).all()
+
+
+##################################################
+##################################################
+
+class TestBaselineCorrection:
+
+    def test_drift_of_the_dark_current_is_removed(self, tmp_path):
+        """ 
+        GIVEN: 
+            synthetic transients with a dark current drifting in time by a few percent of i_light - i_dark, more at the higher temperatures
+        WHEN: 
+            I normalize them with and without the polynomial baseline
+        THEN: 
+            with the baseline the complete decays are normalized as without drift, without it they are not
+        """
+        from picts_gif import synthetic
+        transients = synthetic.generate_transients(n_temperatures=20, n_samples=7700, noise=0.001)
+        configuration = synthetic.configuration(transients)
+        clean = input_handler.normalized_transient(transients, self.save(tmp_path / 'clean.json', configuration))
+        drifting = transients + np.outer(transients.index, np.linspace(0, 4e-10, 20))
+        before = drifting.copy()
+        
+        raw = input_handler.normalized_transient(drifting, tmp_path / 'clean.json')
+        corrected = input_handler.normalized_transient(drifting, self.save(tmp_path / 'baseline.json', dict(configuration, baseline='polynomial')))
+        
+        #at the lower temperatures the decay does not end in the transient, and its tail is taken for drift
+        assert np.abs(corrected - clean).iloc[:, 10:].max().max() < 0.01
+        assert np.abs(raw - clean).iloc[:, 10:].max().max() > 0.025
+        assert drifting.equals(before)                   #the input is not changed
+
+##################################################
+    def test_without_drift_the_correction_is_almost_a_no_op(self, tmp_path):
+        """ 
+        GIVEN: 
+            noisy synthetic transients without drift
+        WHEN: 
+            I normalize them with each baseline model, also with a second order polynomial
+        THEN: 
+            there is no error, the complete decays do not change and no transient moves more than the cap of the correction
+        """
+        from picts_gif import synthetic
+        transients = synthetic.generate_transients(n_temperatures=40, n_samples=3000)
+        configuration = synthetic.configuration(transients)
+        clean = input_handler.normalized_transient(transients, self.save(tmp_path / 'clean.json', configuration))
+        for baseline in ({'baseline' : 'polynomial'}, {'baseline' : 'polynomial', 'baseline_order' : 2}, {'baseline' : 'exponential'}):
+            corrected = input_handler.normalized_transient(transients, self.save(tmp_path / 'baseline.json', dict(configuration, **baseline)))
+            shift = np.abs(corrected - clean).max()
+            assert (shift.iloc[20:] < 1e-3).all()
+            assert shift.max() < 0.05 + 0.01
+
+    @staticmethod
+    def save(path, configuration):
+        with open(path, 'w') as pfile:
+            json.dump(configuration, pfile)
+        return path
+
+
+##################################################
+##################################################
+
+class TestRateWindowDesign:
+
+    def test_spectrum_with_log_spaced_windows(self, tmp_path):
+        """ 
+        GIVEN: 
+            synthetic transients and a json with en_min and en_max instead of t1_min and t1_shift
+        WHEN: 
+            I compute the result
+        THEN: 
+            the rate windows are log spaced in the range, their t1 are on the time axis, and the spectrum has a column for each
+        """
+        from picts_gif import synthetic
+        transients = synthetic.generate_transients(n_temperatures=10, n_samples=3000)
+        configuration = synthetic.configuration(transients, n_windows=8, en_min=250., en_max=5000.)
+        del configuration['t1_min'], configuration['t1_shift']
+        with open(tmp_path / 'dict.json', 'w') as pfile:
+            json.dump(configuration, pfile)
+        result = input_handler.compute_result(transients, tmp_path / 'dict.json')
+        
+        assert np.isin(result.gates[:, 0], transients.index).all()
+        assert np.allclose(np.log(result.en), np.log(np.geomspace(5000., 250., 8)), atol=0.1)
+        assert result.spectrum.shape == (10, 8)
+
+##################################################
+##################################################
+
+class TestSpectrumUncertainty:
+
+    def test_uncertainty_bands_of_the_spectrum(self, tmp_path):
+        """ 
+        GIVEN: 
+            noisy synthetic transients
+        WHEN: 
+            I compute the result and the dataframe spectrum with the uncertainty
+        THEN: 
+            the bands have the shape of the spectrum and contain it, and the two versions give the same bands
+        """
+        from picts_gif import synthetic
+        transients = synthetic.generate_transients(n_temperatures=10, n_samples=3000, noise=0.02)
+        configuration = synthetic.configuration(transients, n_windows=5, bootstrap_seed=0)
+        with open(tmp_path / 'dict.json', 'w') as pfile:
+            json.dump(configuration, pfile)
+        result = input_handler.compute_result(transients, tmp_path / 'dict.json', uncertainty=True)
+        picts, _, bands = input_handler.from_transient_to_PICTS_spectrum(result.to_dataframe('transient'), tmp_path / 'dict.json', uncertainty=True)
+        
+        lower, upper = result.to_dataframe('lower'), result.to_dataframe('upper')
+        assert lower.shape == upper.shape == result.to_dataframe('spectrum').shape == (10, 5)
+        assert ((lower.to_numpy() <= result.spectrum) & (result.spectrum <= upper.to_numpy())).all()
+        assert (result.uncertainty['std'] > 0).all()
+        assert np.allclose(bands['upper'].to_numpy(), upper.to_numpy()) and bands['std'].index.equals(picts.index)
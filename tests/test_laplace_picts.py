@@ -0,0 +1,96 @@
+import pytest
+from picts_gif import laplace_picts
+import numpy as np
+import pandas as pd
+
+
+##################################################
+##################################################
+
+@pytest.fixture
+def time():
+    return np.arange(0., 0.02, 1e-5)
+
+def local_maxima(distribution, fraction=0.3):
+    #the rates of the peaks higher than a fraction of the highest one
+    inner = distribution[1:-1]
+    peaks = (inner > distribution[:-2]) & (inner > distribution[2:]) & (inner > fraction * distribution.max())
+    return np.flatnonzero(peaks) + 1
+
+##################################################
+##################################################
+
+class TestLaplacePicts:
+
+    def test_single_rate_peak(self, time):
+        '''
+        GIVEN: exponential decays with different rates
+        WHEN: laplace_spectrum is called
+        THEN: each distribution has a single peak, at the rate of its decay
+        '''
+        rates = np.array([300., 1000., 4000.])
+        transient_norm = pd.DataFrame(0.6 * np.exp(-np.outer(time, rates)), index=time, columns=pd.Index([150., 200., 250.], name='Temperature (K)'))
+        spectrum = laplace_picts.laplace_spectrum(transient_norm)
+        grid = spectrum.columns.to_numpy()
+        for rate, (_, distribution) in zip(rates, spectrum.iterrows()):
+            peaks = local_maxima(distribution.to_numpy())
+            assert len(peaks) == 1
+            assert abs(np.log(grid[peaks[0]] / rate)) < np.log(grid[1] / grid[0]) * 1.5
+
+##################################################
+    def test_close_rates_are_resolved(self, time):
+        '''
+        GIVEN: a noisy sum of two exponentials with rates a factor 4 apart
+        WHEN: laplace_inversion is called
+        THEN: the distribution has two peaks, near the two rates
+        '''
+        rng = np.random.default_rng(0)
+        values = 0.3 * np.exp(-300. * time) + 0.3 * np.exp(-1200. * time) + rng.normal(0., 0.002, len(time))
+        grid = laplace_picts.rates_grid(time)
+        distribution = laplace_picts.laplace_inversion(time, values[:, None], grid)[0]
+        found = grid[local_maxima(distribution)]
+        assert len(found) == 2
+        assert np.allclose(np.log(found), np.log([300., 1200.]), atol=0.25)
+
+##################################################
+    def test_kernel_is_cached(self, time):
+        '''
+        GIVEN: a time axis and a rates grid
+        WHEN: get_kernel is called twice, and then with another grid
+        THEN: the same kernel is returned the second time, a new one for the other grid
+        '''
+        grid = laplace_picts.rates_grid(time, 50)
+        kernel = laplace_picts.get_kernel(time, grid)
+        assert laplace_picts.get_kernel(time.copy(), grid.copy()) is kernel
+        assert laplace_picts.get_kernel(time, grid[:-1]) is not kernel
+
+##################################################
+    def test_batch_and_nan_columns(self, time):
+        '''
+        GIVEN: three decays, one of them with NaN values
+        WHEN: laplace_inversion is called on all of them
+        THEN: each distribution is the one of the column solved alone, without its NaN rows
+        '''
+        values = 0.5 * np.exp(-np.outer(time, [400., 900., 2500.]))
+        values[50:80, 1] = np.nan
+        grid = laplace_picts.rates_grid(time, 60)
+        distribution = laplace_picts.laplace_inversion(time, values, grid)
+        valid = ~np.isnan(values[:, 1])
+        assert np.allclose(distribution[0], laplace_picts.laplace_inversion(time, values[:, :1], grid)[0])
+        assert np.allclose(distribution[1], laplace_picts.laplace_inversion(time[valid], values[valid, 1:2], grid)[0])
+
+##################################################
+    def test_masked_columns_give_nan(self, time):
+        '''
+        GIVEN: normalized transients with a column fully masked (NaN), as quality_control leaves it, and a column with a single valid value
+        WHEN: laplace_spectrum is called
+        THEN: the distributions of the two columns are NaN, the other one is the one of the column solved alone
+        '''
+        values = 0.5 * np.exp(-np.outer(time, [400., 900., 2500.]))
+        values[:, 1] = np.nan
+        values[1:, 2] = np.nan
+        transient_norm = pd.DataFrame(values, index=time, columns=pd.Index([150., 200., 250.], name='Temperature (K)'))
+        grid = laplace_picts.rates_grid(time, 60)
+        spectrum = laplace_picts.laplace_spectrum(transient_norm, grid)
+        assert spectrum.loc[[200., 250.]].isna().all(axis=None)
+        assert np.allclose(spectrum.loc[150.], laplace_picts.laplace_inversion(time, values[:, :1], grid)[0])
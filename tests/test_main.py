@@ -0,0 +1,76 @@
+import subprocess
+import sys
+from os.path import dirname, join
+
+
+##################################################
+##################################################
+
+#run a python code in a new interpreter and return what it prints
+def run_python(code):
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=join(dirname(__file__), '..'))
+    return output.stdout.strip()
+
+##################################################
+##################################################
+
+class TestMain:
+
+##################################################
+    def test_help_does_not_import_heavy_libraries(self):
+        """ 
+        This test tests that the CLI help answers without importing the libraries needed by the pipeline
+    
+        GIVEN: 
+            a new python interpreter
+        WHEN: 
+            I call main with --help
+        THEN: 
+            pandas, scipy, nptdms and matplotlib are not imported
+        """
+        code = (
+            "import sys\n"
+            "from picts_gif import main\n"
+            "try:\n"
+            "    main.main(['--help'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print([m for m in ('pandas', 'scipy', 'nptdms', 'matplotlib') if m in sys.modules])"
+            )
+        assert run_python(code).splitlines()[-1] == '[]'
+
+##################################################
+    def test_utilities_import_does_not_import_scipy_and_nptdms(self):
+        """ 
+        This test tests that scipy and nptdms are imported only when they are needed
+    
+        GIVEN: 
+            a new python interpreter
+        WHEN: 
+            I import picts_gif.utilities
+        THEN: 
+            scipy and nptdms are not imported
+        """
+        code = "import sys; from picts_gif import utilities; print([m for m in ('scipy', 'nptdms') if m in sys.modules])"
+        assert run_python(code) == '[]'
+
+##################################################
+    def test_render_selects_agg_backend_if_nothing_is_shown(self):
+        """ 
+        This test tests that the Agg backend is selected when the animation is not shown
+    
+        GIVEN: 
+            a new python interpreter and a PICTS spectrum
+        WHEN: 
+            I call pipeline.render with show = False
+        THEN: 
+            the matplotlib backend is Agg
+        """
+        code = (
+            "import pandas as pd, matplotlib\n"
+            "from picts_gif import pipeline\n"
+            "picts = pd.read_pickle('tests/test_data/test.pkl', 'bz2')\n"
+            "pipeline.render('spectrum', None, picts, None, 'tests/test_data/dictionary.json', show=False)\n"
+            "print(matplotlib.get_backend().lower())"
+            )
+        assert run_python(code).splitlines()[-1] == 'agg'
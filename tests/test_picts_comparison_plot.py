@@ -0,0 +1,84 @@
+import pytest
+import matplotlib.pyplot as plt
+from picts_gif.picts_comparison_plot import PictsComparisonPlot, align_to_grid
+from picts_gif.picts_composite_plot import PictsCompositePlot
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+
+##################################################
+##################################################
+
+#return two spectra measured on different temperatures
+@pytest.fixture
+def spectra():
+    first = pd.DataFrame({100. : np.linspace(0, 1, 11), 200. : np.linspace(1, 2, 11)}, index=np.linspace(100, 200, 11))
+    second = pd.DataFrame({150. : np.linspace(0, 2, 21), 300. : np.zeros(21)}, index=np.linspace(150, 250, 21))
+    return [first, second]
+
+##################################################
+##################################################
+
+class TestComparisonPlot:
+
+    def test_spectra_aligned_on_common_grid(self, spectra):
+        '''
+        GIVEN: two spectra on different temperatures
+        WHEN: align_to_grid is called
+        THEN: each spectrum is interpolated on the grid, with NaN outside its temperature range
+        '''
+        grid = np.array([90., 100., 155., 200., 250.])
+        aligned = align_to_grid(spectra, 0, grid)
+        assert np.allclose(aligned[0], [np.nan, 0., 0.55, 1., np.nan], equal_nan=True)
+        assert np.allclose(aligned[1], [np.nan, np.nan, 0.1, 1., 2.], equal_nan=True)
+
+    def test_frames_and_artists(self, spectra):
+        '''
+        GIVEN: two spectra
+        WHEN: a PictsComparisonPlot is created and updated
+        THEN: there is a frame for each point of the grid, and the same Line2D objects are returned at each frame
+        '''
+        fig, ax = plt.subplots()
+        plot = PictsComparisonPlot(fig, ax, spectra, labels=['a', 'b'])
+        assert plot.n_frames == 21 == len(list(plot.func_anim.new_saved_frame_seq()))
+        artists = plot.ani_init()
+        assert plot.ani_update(5) == artists
+        x, y = plot.lines[0].get_data()
+        assert len(x) == 6 and np.allclose(x, plot.grid[:6])
+        plt.close(fig)
+
+    def test_wrong_inputs(self, spectra):
+        '''
+        GIVEN: an empty list of spectra, or a wrong number of labels
+        WHEN: a PictsComparisonPlot is created
+        THEN: TypeError and ValueError are raised
+        '''
+        fig, ax = plt.subplots()
+        with pytest.raises(TypeError):
+            PictsComparisonPlot(fig, ax, [])
+        with pytest.raises(ValueError):
+            PictsComparisonPlot(fig, ax, spectra, labels=['a'])
+        plt.close(fig)
+
+    def test_saved_through_composite_plot(self, spectra, tmp_path):
+        '''
+        GIVEN: a PictsComparisonPlot created with animate = False
+        WHEN: it is given to PictsCompositePlot and the composite animation is saved
+        THEN: a gif with a frame for each point of the grid is written, and after a new start the curves are empty and the cursor is on the first temperature
+        '''
+        fig, ax = plt.subplots()
+        plot = PictsComparisonPlot(fig, ax, spectra, animate=False)
+        assert plot.func_anim is None
+        composite = PictsCompositePlot(fig, [plot])
+        output_file = tmp_path / 'compare.gif'
+        composite.save(output_file)
+        with Image.open(output_file) as gif:
+            assert gif.n_frames == composite.n_frames == plot.n_frames
+        x, y = plot.lines[0].get_data()
+        assert len(x) == plot.n_frames
+
+        composite.ani_init()
+        plt.close(fig)
+        assert all(len(line.get_xdata()) == 0 for line in plot.lines)
+        assert np.allclose(plot.cursor.get_xdata(), plot.grid[0])
@@ -0,0 +1,200 @@
+import pytest
+import matplotlib.pyplot as plt
+from os.path import dirname, join
+from picts_gif.picts_composite_plot import PictsCompositePlot
+from picts_gif.picts_spectrum_plot import PictsSpectrumPlot
+from picts_gif.picts_transient_plot import PictsTransientPlot
+from picts_gif.picts_comparison_plot import PictsComparisonPlot
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+
+##################################################
+##################################################
+
+#return a spectrum plot and a transient plot, sharing the same figure and without their own animation
+@pytest.fixture
+def plots():
+    fig, ax = plt.subplots(1,2)
+    dic_path = join(dirname(__file__), 'test_data/dictionary.json')
+    spectrum = pd.read_pickle(join(dirname(__file__), 'test_data/test.pkl'), 'bz2').iloc[:20, :3]
+    time = np.linspace(-0.01, 0.05, 100)
+    transient = pd.DataFrame(np.exp(-np.outer(time, np.arange(1, 8))), index=time, columns=np.arange(100., 107.))
+    gates = np.array([[1e-3, 5e-3]])
+    
+    yield fig, [
+        PictsSpectrumPlot(fig, ax[0], spectrum, animate=False), 
+        PictsTransientPlot(fig, ax[1], dic_path, transient, gates, animate=False)
+        ]
+    plt.close(fig)
+
+##################################################
+##################################################
+
+class TestCompositePlot:
+
+##################################################
+    def test_raise_type_error_if_plots_is_empty(self):
+        """ 
+        This test tests whether an TypeError is thrown if I initialize an object of the PictsCompositePlot class without plots
+    
+        GIVEN: 
+           an empty list of plots
+        WHEN: 
+            I initialize an object of the PictsCompositePlot class
+        THEN: 
+            a TypeError exception is thrown
+        """
+        fig, ax = plt.subplots()
+        with pytest.raises(TypeError):
+            PictsCompositePlot(fig, plots=[])
+
+##################################################
+    def test_raise_value_error_if_a_plot_has_its_own_animation(self):
+        """ 
+        This test tests whether an ValueError is thrown if a plot already has its own FuncAnimation
+    
+        GIVEN: 
+           a PictsSpectrumPlot created with animate = True
+        WHEN: 
+            I initialize an object of the PictsCompositePlot class with it
+        THEN: 
+            a ValueError exception is thrown
+        """
+        fig, ax = plt.subplots()
+        spectrum = pd.read_pickle(join(dirname(__file__), 'test_data/test.pkl'), 'bz2')
+        with pytest.raises(ValueError):
+            PictsCompositePlot(fig, plots=[PictsSpectrumPlot(fig, ax, spectrum)])
+
+##################################################
+    def test_raise_type_error_if_a_plot_can_not_be_reset(self, plots):
+        """ 
+        This test tests whether an TypeError is thrown if a plot does not have all the methods used by the composite
+    
+        GIVEN: 
+           a plot without the reset method
+        WHEN: 
+            I initialize an object of the PictsCompositePlot class with it
+        THEN: 
+            a TypeError exception is thrown
+        """
+        fig, plot_list = plots
+        class NoReset:
+            n_frames, lines, func_anim = 1, [], None
+            def ani_init(self): return []
+            def ani_update(self, frame): return []
+        with pytest.raises(TypeError):
+            PictsCompositePlot(fig, plots=[plot_list[0], NoReset()])
+
+##################################################
+    def test_n_frames_is_the_one_of_the_longest_plot(self, plots):
+        """ 
+        This test tests that the composite animation lasts as the longest plot
+    
+        GIVEN: 
+           a spectrum plot with 60 frames and a transient plot with 7 frames
+        WHEN: 
+            I initialize an object of the PictsCompositePlot class
+        THEN: 
+            the animation has 60 frames, and 60 frames are saved
+        """
+        fig, plot_list = plots
+        composite = PictsCompositePlot(fig, plots=plot_list)
+        
+        assert composite.n_frames == 60
+        assert len(list(composite.func_anim.new_saved_frame_seq())) == 60
+
+##################################################
+    def test_finished_plots_are_not_updated(self, plots):
+        """ 
+        This test tests that a plot that reached its last frame is not updated anymore
+    
+        GIVEN: 
+           a spectrum plot with 60 frames and a transient plot with 7 frames
+        WHEN: 
+            I call ani_update for a frame after the 7th
+        THEN: 
+            the spectrum plot goes on, the transient plot does not change and all the artists are returned
+        """
+        fig, plot_list = plots
+        spectrum, transient = plot_list
+        composite = PictsCompositePlot(fig, plots=plot_list)
+        composite.ani_init()
+        column_index = transient.column_index
+        
+        returned = composite.ani_update(frame=10)
+        
+        assert transient.column_index == column_index
+        assert spectrum.point_index == 1
+        assert len(returned) == len(spectrum.lines) + len(transient.lines)
+
+##################################################
+    def test_every_rate_window_is_shown_and_a_restart_resets_the_plots(self):
+        """ 
+        This test tests that the transient panel goes through all the rate windows, and that a new start begins from the first frame
+    
+        GIVEN: 
+           a spectrum plot with 3 curves of 7 points and a transient plot with 7 transients and 3 rate windows
+        WHEN: 
+            I run every frame of the composite animation, and then I call ani_init again
+        THEN: 
+            the animation lasts 21 frames, the transient plot ends on the last rate window after drawing its gates,
+            and after ani_init both plots are at their first frame, with only the gates of the first rate window
+        """
+        fig, ax = plt.subplots(1,2)
+        dic_path = join(dirname(__file__), 'test_data/dictionary.json')
+        spectrum = pd.read_pickle(join(dirname(__file__), 'test_data/test.pkl'), 'bz2').iloc[:7, :3]
+        time = np.linspace(-0.01, 0.05, 100)
+        transient = pd.DataFrame(np.exp(-np.outer(time, np.arange(1, 8))), index=time, columns=np.arange(100., 107.))
+        gates = np.array([[1e-3, 5e-3], [2e-3, 1e-2], [4e-3, 2e-2]])
+        spectrum_plot = PictsSpectrumPlot(fig, ax[0], spectrum, animate=False)
+        transient_plot = PictsTransientPlot(fig, ax[1], dic_path, transient, gates, animate=False)
+        composite = PictsCompositePlot(fig, plots=[spectrum_plot, transient_plot])
+        
+        composite.ani_init()
+        shown = set()
+        for frame in range(composite.n_frames):
+            composite.ani_update(frame)
+            shown.add(transient_plot.gate_index)
+        
+        assert composite.n_frames == 21 and not composite.func_anim._repeat
+        assert shown == {0, 1, 2} and len(transient_plot.gate_lines) == 6
+        assert spectrum_plot.column_index == 2
+        
+        composite.ani_init()
+        plt.close(fig)
+        assert transient_plot.gate_index == 0 and transient_plot.column_index == 0 and len(transient_plot.gate_lines) == 2
+        assert spectrum_plot.column_index == 0 and spectrum_plot.point_index == 0
+        assert all(len(line.get_xdata()) == 0 for line in spectrum_plot.lines)
+
+##################################################
+    def test_save_with_a_comparison_plot(self, tmp_path):
+        """ 
+        This test tests that a composite animation with a comparison plot is saved
+    
+        GIVEN: 
+           a spectrum plot with 2 curves of 5 points and a comparison plot of 2 spectra with 8 temperatures
+        WHEN: 
+            I save the composite animation as a gif
+        THEN: 
+            the gif has a frame for each frame of the spectrum plot, the longest one, and both plots are at their last frame
+        """
+        fig, ax = plt.subplots(1,2)
+        spectrum = pd.read_pickle(join(dirname(__file__), 'test_data/test.pkl'), 'bz2').iloc[:5, :2]
+        spectra = [
+            pd.DataFrame({100. : np.linspace(0, 1, 8)}, index=np.linspace(100, 200, 8)), 
+            pd.DataFrame({100. : np.linspace(1, 0, 8)}, index=np.linspace(150, 250, 8))
+            ]
+        spectrum_plot = PictsSpectrumPlot(fig, ax[0], spectrum, animate=False)
+        comparison_plot = PictsComparisonPlot(fig, ax[1], spectra, animate=False)
+        composite = PictsCompositePlot(fig, plots=[spectrum_plot, comparison_plot])
+        output_file = tmp_path / 'composite.gif'
+        
+        composite.save(output_file)
+        plt.close(fig)
+        
+        with Image.open(output_file) as gif:
+            assert gif.n_frames == composite.n_frames == 10
+        assert spectrum_plot.column_index == 1
+        assert len(comparison_plot.lines[0].get_xdata()) == comparison_plot.n_frames
@@ -0,0 +1,91 @@
+import pytest
+import json
+from picts_gif import input_handler
+from picts_gif import synthetic
+from picts_gif import utilities
+from picts_gif.picts_explorer import PictsExplorer
+import numpy as np
+import pandas as pd
+
+
+##################################################
+##################################################
+
+#return the normalized transients of a synthetic dataset and the path of its json
+@pytest.fixture
+def dataset(tmp_path):
+    transients = synthetic.generate_transients(n_temperatures=40, n_samples=4000, seed=3)
+    transients.iloc[100:110, 2] = np.nan
+    configuration_path = tmp_path / 'synthetic.json'
+    with open(configuration_path, 'w') as pfile:
+        json.dump(synthetic.configuration(transients), pfile)
+    return input_handler.normalized_transient(transients, configuration_path), configuration_path
+
+##################################################
+##################################################
+
+class TestPictsExplorer:
+
+    def test_spectrum_as_from_transient_to_PICTS_spectrum(self, dataset):
+        '''
+        GIVEN: normalized transients and their json
+        WHEN: spectrum is called with the parameters of the json
+        THEN: picts and gates are the same of from_transient_to_PICTS_spectrum
+        '''
+        transient_norm, configuration_path = dataset
+        with open(configuration_path) as pfile:
+            configuration = json.load(pfile)
+        expected_picts, expected_gates = input_handler.from_transient_to_PICTS_spectrum(transient_norm, configuration_path)
+        picts, gates = PictsExplorer(transient_norm, configuration_path).spectrum(
+            configuration['t1_min'], configuration['t1_shift'], configuration['beta'], configuration['t_avg']
+            )
+        assert np.allclose(picts.to_numpy(), expected_picts.to_numpy(), equal_nan=True)
+        assert np.allclose(picts.columns.to_numpy(), expected_picts.columns.to_numpy())
+        assert np.array_equal(picts.index, expected_picts.index)
+        assert np.allclose(gates, expected_gates)
+
+    def test_gates_at_the_edges(self, dataset):
+        '''
+        GIVEN: a t_avg bigger than the index of t1, and a t2 after the end of the transient
+        WHEN: spectrum is called
+        THEN: the gate means follow the iloc slices of the dataframe
+        '''
+        transient_norm, configuration_path = dataset
+        explorer = PictsExplorer(transient_norm, configuration_path)
+        picts, gates = explorer.spectrum(1e-3, 1e-3, 20, 700, n_windows=3)
+        t1_index, t2_index = utilities.create_index_for_t1_and_t2(transient_norm, gates[:,0], gates[:,1])
+        expected = np.array([
+            (transient_norm.iloc[t1-700:t1+700].mean() - transient_norm.iloc[t2-700:t2+700].mean()).to_numpy()
+            for t1, t2 in zip(t1_index, t2_index)
+            ]).T
+        assert np.allclose(picts.to_numpy(), expected, equal_nan=True)
+
+    def test_emission_rates_as_calculate_en(self, dataset, monkeypatch):
+        '''
+        GIVEN: a set of t1 values and beta
+        WHEN: emission_rates is called
+        THEN: the values are the same of calculate_en, and the equation is solved once for each beta, in the cache of utilities.rate_window_constant
+        '''
+        explorer = PictsExplorer(*dataset)
+        t1 = np.array([1e-3, 2e-3, 5e-3])
+        assert np.allclose(explorer.emission_rates(t1, 4.), utilities.calculate_en(t1, 4. * t1))
+        assert 4. in utilities._rate_window_constants
+        monkeypatch.setattr(utilities, 'calculate_en', None)          #a new solve would fail
+        assert np.allclose(explorer.emission_rates(t1 * 2, 4.), utilities.rate_window_constant(4.) / (t1 * 2))
+
+    def test_update_is_fast_on_full_size_ramp(self, tmp_path):
+        '''
+        GIVEN: a full size ramp (217 temperatures, 7700 samples)
+        WHEN: the spectrum is recomputed for new parameters
+        THEN: it takes much less than 50 ms
+        '''
+        transients = synthetic.generate_transients()
+        configuration_path = tmp_path / 'synthetic.json'
+        with open(configuration_path, 'w') as pfile:
+            json.dump(synthetic.configuration(transients), pfile)
+        explorer = PictsExplorer(transients, configuration_path)
+        timings = []
+        for i in range(5):
+            explorer.spectrum_values(1e-3 + i * 1e-5, 3e-4, 5. + i * 0.1, 50 + i)
+            timings.append(explorer.last_update_s)
+        assert min(timings) < 0.02
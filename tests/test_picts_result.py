@@ -0,0 +1,110 @@
+import pytest
+from picts_gif.picts_result import PictsResult
+from picts_gif import input_handler
+from picts_gif import synthetic
+from picts_gif import utilities
+import numpy as np
+import pandas as pd
+
+
+##################################################
+##################################################
+
+@pytest.fixture
+def dataset(tmp_path):
+    tdms_path, json_path, _ = synthetic.generate_dataset(
+        tmp_path, n_temperatures=20, n_samples=800, time_step=1e-4, configuration_overrides={'set_zero' : 0, 't_avg' : 3}
+        )
+    return input_handler.read_transients_from_tdms(tdms_path, json_path), json_path
+
+##################################################
+##################################################
+
+class TestPictsResult:
+
+    def test_dataframes_are_views_of_the_arrays(self, dataset):
+        '''
+        GIVEN: a result computed by compute_result
+        WHEN: to_dataframe is called for the transients and for the spectrum
+        THEN: the dataframes share the memory of the arrays of the result
+        '''
+        result = input_handler.compute_result(*dataset)
+        assert np.shares_memory(result.to_dataframe('transient').to_numpy(), result.transient)
+        assert np.shares_memory(result.to_dataframe('spectrum').to_numpy(), result.spectrum)
+
+##################################################
+    def test_slots(self, dataset):
+        '''
+        GIVEN: a result
+        WHEN: an attribute that is not in the slots is set
+        THEN: AttributeError is raised, the result has no __dict__
+        '''
+        result = PictsResult.from_dataframe(dataset[0])
+        assert not hasattr(result, '__dict__')
+        with pytest.raises(AttributeError):
+            result.other = 1
+
+##################################################
+    def test_same_results_of_the_dataframe_functions(self, dataset):
+        '''
+        GIVEN: the raw transients, with some NaN
+        WHEN: compute_result is called
+        THEN: its dataframes are the ones of normalized_transient and from_transient_to_PICTS_spectrum
+        '''
+        data, json_path = dataset
+        data.iloc[100:200, 3] = np.nan
+        result = input_handler.compute_result(data, json_path)
+        transient_norm = input_handler.normalized_transient(data, json_path)
+        picts, gates = input_handler.from_transient_to_PICTS_spectrum(transient_norm, json_path)
+
+        pd.testing.assert_frame_equal(result.to_dataframe('transient'), transient_norm)
+        pd.testing.assert_frame_equal(result.to_dataframe('spectrum'), picts)
+        assert np.array_equal(result.gates, gates)
+
+##################################################
+##################################################
+
+class TestArrayHotPaths:
+
+    def test_gate_means_follow_iloc(self):
+        '''
+        GIVEN: a dataframe with NaN and positions at the borders of the time axis
+        WHEN: gate_means is called
+        THEN: the means are the ones of iloc[position - t_avg : position + t_avg].mean()
+        '''
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(rng.normal(size=(50, 4)))
+        df.iloc[5:9, 1] = np.nan
+        positions = np.array([0, 2, 7, 49, -1])
+        means = utilities.gate_means(df.to_numpy(), positions, 3)
+        expected = np.array([df.iloc[p - 3 : p + 3].mean().to_numpy() for p in positions])
+        assert np.allclose(means, expected, equal_nan=True)
+
+##################################################
+    def test_gate_bounds_follow_python_slices(self):
+        '''
+        GIVEN: positions inside, at the borders and after the end of the time axis, and gates longer than the whole axis
+        WHEN: gate_bounds and gate_means are called
+        THEN: the bounds are the ones of slice(position - t_avg, position + t_avg) (empty gates have stop = start), and the means follow iloc
+        '''
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(rng.normal(size=(12, 3)))
+        positions = np.array([-1, 0, 3, 6, 11, 20])
+        for t_avg in (2, 5, 8):
+            start, stop = utilities.gate_bounds(len(df), positions, t_avg)
+            expected = np.array([slice(p - t_avg, p + t_avg).indices(len(df))[:2] for p in positions])
+            assert np.array_equal(start, expected[:, 0]) and np.array_equal(stop, np.maximum(expected[:, 1], expected[:, 0]))
+            means = utilities.gate_means(df.to_numpy(), positions, t_avg)
+            assert np.allclose(means, [df.iloc[p - t_avg : p + t_avg].mean().to_numpy() for p in positions], equal_nan=True)
+
+##################################################
+    def test_backfill_positions_follow_get_indexer(self):
+        '''
+        GIVEN: an increasing time axis and times inside, on and after it
+        WHEN: backfill_positions is called
+        THEN: the positions are the ones of get_indexer with method='backfill'
+        '''
+        time = np.linspace(-0.01, 0.07, 801)
+        t = np.array([-0.02, 0.0, 0.00123, time[10], 0.07, 0.08])
+        expected = pd.Index(time).get_indexer(t, method='backfill')
+        assert np.array_equal(utilities.backfill_positions(time, t), expected)
@@ -125,4 +125,51 @@ class TestSpectrumPlot:
         
        
         
-       
\ No newline at end of file
+       ##################################################
+    def test_saved_frames_are_exactly_n_frames(self):
+        """ 
+        This test tests that the saved animation has one frame for each point of each curve, 
+        and it is not padded up to save_count
+    
+        GIVEN: 
+           a PICTS spectrum dataframe
+        WHEN: 
+            I initialize an object of the PictsSpectrumPlot class
+        THEN: 
+            n_frames is the number of rows times the number of columns, and it is the number of frames that are saved
+        """
+        fig, ax = plt.subplots()
+        test_file_path = join(dirname(__file__), 'test_data/test.pkl')
+        df = pd.read_pickle(test_file_path, 'bz2')
+        
+        pt = PictsSpectrumPlot(fig, ax, df)
+        
+        assert pt.n_frames == df.shape[0] * df.shape[1]
+        assert len(list(pt.func_anim.new_saved_frame_seq())) == pt.n_frames
+
+       ##################################################
+    def test_bands_are_shaded_with_their_curve(self):
+        """ 
+        This test tests that the uncertainty bands follow the points of their curve
+    
+        GIVEN: 
+           a PICTS spectrum dataframe and lower and upper bands around it
+        WHEN: 
+            I initialize an object of the PictsSpectrumPlot class with the bands, and I draw the first points
+        THEN: 
+            there is a band for each curve, returned with the lines, whose polygon has the drawn points on both sides
+        """
+        fig, ax = plt.subplots()
+        test_file_path = join(dirname(__file__), 'test_data/test.pkl')
+        df = pd.read_pickle(test_file_path, 'bz2')
+        
+        pt = PictsSpectrumPlot(fig, ax, df, animate=False, bands={'lower' : df - 0.1, 'upper' : df + 0.1}, selection={'stride' : 2})
+        pt.ani_init()
+        for frame in range(4):
+            artists = pt.ani_update(frame)
+        plt.close(fig)
+        
+        assert len(pt.shades) == df.shape[1] and artists[-len(pt.shades):] == pt.shades
+        polygon = pt.shades[0].get_paths()[0].vertices
+        assert np.allclose(polygon[:3, 1], pt.df.iloc[:3, 0] - 0.1)
+        assert np.allclose(polygon[3:6, 1], pt.df.iloc[:3, 0][::-1] + 0.1)
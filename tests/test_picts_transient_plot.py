@@ -113,4 +113,51 @@ class TestTransientPlot:
          
         assert isinstance(returned, list)
         
-       
\ No newline at end of file
+       
+##################################################    
+    def test_saved_frames_are_exactly_the_number_of_transients(self):
+        """ 
+        This test tests that the saved animation has one frame for each transient
+    
+        GIVEN: 
+           a transient dataframe with 7 temperatures
+        WHEN: 
+            I initialize an object of the PictsTransientPlot class
+        THEN: 
+            n_frames is 7, and it is the number of frames that are saved
+        """
+        fig, ax = plt.subplots()
+        dic_path = join(dirname(__file__), 'test_data/dictionary.json')
+        time = np.linspace(-0.01, 0.05, 100)
+        df = pd.DataFrame(np.exp(-np.outer(time, np.arange(1, 8))), index=time, columns=np.arange(100., 107.))
+        gate = np.array([[1e-3, 5e-3]])
+        
+        pt = PictsTransientPlot(fig, ax, dic_path, df, gate)
+        
+        assert pt.n_frames == 7
+        assert len(list(pt.func_anim.new_saved_frame_seq())) == pt.n_frames
+
+##################################################    
+    def test_all_the_log_spaced_gates_are_inside_the_axes(self):
+        """ 
+        This test tests that the time axis shows every gate, also when the rate windows are log spaced
+    
+        GIVEN: 
+           a transient dataframe and log spaced rate windows from 10 Hz to 1000 Hz
+        WHEN: 
+            I initialize an object of the PictsTransientPlot class and call ani_init
+        THEN: 
+            every t2 is inside the limits of the time axis
+        """
+        fig, ax = plt.subplots()
+        dic_path = join(dirname(__file__), 'test_data/dictionary.json')
+        time = np.round(np.linspace(-0.01, 0.6, 6101), 6)
+        df = pd.DataFrame(np.exp(-np.outer(time, np.arange(1, 8))), index=time, columns=np.arange(100., 107.))
+        gates = np.array(utilities.create_log_spaced_t1_and_t2_values(10., 1000., 6, 5., time)).T
+        
+        pt = PictsTransientPlot(fig, ax, dic_path, df, gates, animate=False)
+        pt.ani_init()
+        plt.close(fig)
+        
+        assert len(gates) == 6
+        assert ax.get_xlim()[1] >= gates[:, 1].max()
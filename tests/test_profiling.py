@@ -0,0 +1,133 @@
+import pytest
+import json
+from os.path import dirname, join
+from picts_gif import profiling
+from picts_gif import input_handler
+import numpy as np
+import pandas as pd
+
+
+##################################################
+##################################################
+
+#return a report registered as callback, and remove it at the end of the test
+@pytest.fixture
+def report():
+    report = profiling.ProfileReport()
+    profiling.add_callback(report)
+    yield report
+    profiling.remove_callback(report)
+
+#return a raw transient dataframe: light current before zero, exponential decay after zero
+@pytest.fixture
+def raw_transient():
+    time = np.linspace(-0.005, 0.05, 500)
+    decay = np.where(time[:, None] < 0, 1., np.exp(-np.outer(time, np.arange(100, 800, 100)).clip(0)))
+    return pd.DataFrame(decay, index=time, columns=np.arange(100., 107.))
+
+##################################################
+##################################################
+
+class TestProfiling:
+
+##################################################
+    def test_stage_without_callbacks_does_nothing(self):
+        """ 
+        This test tests that without callbacks a stage only runs its code
+    
+        GIVEN: 
+            no callbacks registered
+        WHEN: 
+            I run a stage
+        THEN: 
+            the code inside the stage is run and the info dictionary is yielded, and array_info does not look at the data
+        """
+        with profiling.stage('nothing', size=3) as info:
+            info['done'] = True
+        assert info == {'size' : 3, 'done' : True}
+        assert profiling.array_info(np.zeros((2, 3))) == {}
+
+##################################################
+    def test_callback_receives_time_and_memory(self, report):
+        """ 
+        This test tests that a registered callback receives the event of a stage
+    
+        GIVEN: 
+            a registered callback
+        WHEN: 
+            I run a stage
+        THEN: 
+            the callback receives stage name, wall time, cpu time, memory and the information added by the stage
+        """
+        with profiling.stage('test_stage') as info:
+            info['shape'] = [2, 3]
+        
+        event = report.events[-1]
+        assert event['stage'] == 'test_stage'
+        assert event['wall_s'] >= 0 and event['cpu_s'] >= 0
+        assert 'peak_rss_mb' in event
+        assert event['peak_rss_growth_mb'] is None or event['peak_rss_growth_mb'] >= 0
+        assert event['shape'] == [2, 3]
+
+##################################################
+    def test_pipeline_stages_are_recorded(self, report, raw_transient):
+        """ 
+        This test tests that the normalization is recorded as a stage, with the size of the dataframe
+    
+        GIVEN: 
+            a raw transient dataframe and a registered report
+        WHEN: 
+            I call normalized_transient
+        THEN: 
+            the report contains the normalization stage with the shape of the dataframe
+        """
+        dic_path = join(dirname(__file__), 'test_data/dictionary.json')
+        input_handler.normalized_transient(raw_transient, dic_path)
+        
+        events = [event for event in report.events if event['stage'] == 'normalization']
+        assert len(events) == 1
+        assert events[0]['shape'] == list(raw_transient.shape)
+
+##################################################
+    def test_report_is_saved_as_json(self, report, tmp_path):
+        """ 
+        This test tests that the report is written as a json file with events and summary
+    
+        GIVEN: 
+            a report that received three events of the same stage
+        WHEN: 
+            I save it
+        THEN: 
+            the json file contains the three events and a summary with three calls
+        """
+        for i in range(3):
+            with profiling.stage('repeated'):
+                pass
+        report.save(tmp_path / 'report.json')
+        
+        with open(tmp_path / 'report.json') as pfile:
+            saved = json.load(pfile)
+        assert len(saved['events']) == 3
+        assert saved['summary']['repeated']['calls'] == 3
+
+##################################################
+    def test_report_is_written_if_the_run_fails(self, tmp_path):
+        """ 
+        This test tests that profile_to cleans up and writes the report also when the run raises
+    
+        GIVEN: 
+            a run that raises inside profile_to
+        WHEN: 
+            the exception leaves the with block
+        THEN: 
+            the callback is removed and the report has the stages run before the error
+        """
+        with pytest.raises(RuntimeError):
+            with profiling.profile_to(tmp_path / 'report.json'):
+                with profiling.stage('before_error'):
+                    pass
+                raise RuntimeError('failed run')
+        
+        assert not profiling._callbacks
+        with open(tmp_path / 'report.json') as pfile:
+            assert json.load(pfile)['events'][0]['stage'] == 'before_error'
@@ -0,0 +1,117 @@
+import pytest
+import json
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from picts_gif import input_handler
+from picts_gif import quality_control
+from picts_gif import synthetic
+from picts_gif import utilities
+from picts_gif.picts_spectrum_plot import PictsSpectrumPlot
+from picts_gif.picts_transient_plot import PictsTransientPlot
+import numpy as np
+
+
+##################################################
+##################################################
+
+#return the raw transients of a synthetic ramp, with a different defect in the columns 11 to 15, and the configuration
+@pytest.fixture
+def defects():
+    transients = synthetic.generate_transients(n_temperatures=20, n_samples=3000)
+    configuration = synthetic.configuration(transients)
+    values = transients.to_numpy().copy()
+    time = transients.index.to_numpy()
+    n_rows = len(time)
+    light = utilities.range_mean(values, time, configuration['i_light_left'], configuration['i_light_right'])
+    dark = utilities.range_mean(values, time, configuration['i_dark_left'], configuration['i_dark_right'])
+    step = light - dark
+
+    values[:, 11] = np.minimum(values[:, 11], light[11] - 0.05 * step[11])                          #saturated
+    values[n_rows//2 : n_rows//2 + n_rows//10, 12] += 0.3 * step[12]                                  #a bump in the decay
+    values[:, 13] = light[13] + dark[13] - values[:, 13]                                              #light and dark swapped
+    values[:, 14] += 0.2 * step[14] * np.random.default_rng(0).standard_normal(n_rows)               #noisy
+    values[:, 15] = np.roll(values[:, 15], n_rows // 10)                                              #late trigger
+    transients.iloc[:, :] = values
+    return transients, configuration
+
+def currents(transients, configuration):
+    values, time = transients.to_numpy(), transients.index.to_numpy()
+    return (
+        utilities.range_mean(values, time, configuration['i_light_left'], configuration['i_light_right']),
+        utilities.range_mean(values, time, configuration['i_dark_left'], configuration['i_dark_right'])
+        )
+
+##################################################
+##################################################
+
+class TestQualityControl:
+
+    def test_clean_transients_have_no_flag(self):
+        '''
+        GIVEN: the transients of a synthetic ramp, without defects
+        WHEN: quality_flags is called
+        THEN: no column is flagged
+        '''
+        transients = synthetic.generate_transients(n_temperatures=20, n_samples=3000)
+        i_light, i_dark = currents(transients, synthetic.configuration(transients))
+        flags = quality_control.quality_flags(transients.to_numpy(), transients.index.to_numpy(), i_light, i_dark)
+        assert flags['good'].all()
+
+##################################################
+    def test_each_defect_is_flagged(self, defects):
+        '''
+        GIVEN: a ramp with a saturated, a non monotonic, an inverted, a noisy and a misaligned transient
+        WHEN: quality_flags is called
+        THEN: each of them has its own flag, and only them are rejected
+        '''
+        transients, configuration = defects
+        flags = quality_control.quality_flags(transients.to_numpy(), transients.index.to_numpy(), *currents(transients, configuration))
+        for column, name in zip(range(11, 16), quality_control.FLAGS):
+            assert flags[name][column]
+        assert list(np.flatnonzero(~flags['good'])) == [11, 12, 13, 14, 15]
+
+##################################################
+    def test_flagged_columns_are_masked_instead_of_raising(self, defects, tmp_path):
+        '''
+        GIVEN: the ramp with defects, and a configuration with fixed ranges and the quality control enabled
+        WHEN: compute_result is called
+        THEN: there is no ValueError, the rejected temperatures are NaN and masked, and the summary says why
+        '''
+        transients, configuration = defects
+        configuration_path = tmp_path / 'dict.json'
+        with open(configuration_path, 'w') as pfile:
+            json.dump(dict(configuration, quality_control=True), pfile)
+        with pytest.warns(UserWarning, match='can not be normalized'):
+            result = input_handler.compute_result(transients, configuration_path)
+
+        assert list(np.flatnonzero(~result.mask)) == [11, 12, 13, 14, 15]
+        assert np.isnan(result.transient[:, ~result.mask]).all() and np.isnan(result.spectrum[~result.mask]).all()
+        assert np.isfinite(result.spectrum[result.mask]).all()
+        summary = quality_control.summary(result.quality, result.temperature)
+        assert summary['n_rejected'] == 5
+        assert 'light_below_dark' in summary['rejected'][str(result.temperature[13])]
+        json.dumps(summary)
+
+##################################################
+    def test_plots_skip_the_masked_temperatures(self, defects, tmp_path):
+        '''
+        GIVEN: the result of a ramp with rejected temperatures
+        WHEN: the two plots are created with its mask
+        THEN: the masked temperatures are not animated
+        '''
+        transients, configuration = defects
+        configuration_path = tmp_path / 'dict.json'
+        with open(configuration_path, 'w') as pfile:
+            json.dump(dict(configuration, quality_control={'max_noise' : 0.1}), pfile)
+        with pytest.warns(UserWarning):
+            result = input_handler.compute_result(transients, configuration_path)
+
+        fig, ax = plt.subplots(1, 2)
+        spectrum_plot = PictsSpectrumPlot(fig, ax[0], result.to_dataframe('spectrum'), animate=False, mask=result.mask)
+        transient_plot = PictsTransientPlot(fig, ax[1], configuration_path, result.to_dataframe('transient'), result.gates, animate=False, mask=result.mask)
+        plt.close(fig)
+
+        assert transient_plot.n_frames == result.mask.sum() == 15
+        assert spectrum_plot.n_frames == 15 * len(result.en)
+        assert not spectrum_plot.df.isna().any().any()
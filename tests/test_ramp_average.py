@@ -0,0 +1,116 @@
+import pytest
+import json
+from picts_gif import ramp_average
+from picts_gif import synthetic
+from picts_gif.picts_result import PictsResult
+import numpy as np
+
+
+##################################################
+##################################################
+
+def ramp(temperatures, time=np.linspace(0., 1., 50), slope=1.):
+    #a result whose transients and spectrum are linear in the temperature, so the interpolation is exact
+    temperatures = np.asarray(temperatures, dtype=float)
+    transient = np.outer(time + 1., slope * temperatures)
+    spectrum = np.outer(slope * temperatures, [1., 2.])
+    return PictsResult(transient, time, temperatures, gates=np.array([[1e-3, 5e-3], [2e-3, 1e-2]]), en=np.array([100., 50.]), spectrum=spectrum)
+
+##################################################
+##################################################
+
+class TestRampAverage:
+
+    def test_resample_columns(self):
+        '''
+        GIVEN: columns linear in the temperature, with the temperatures in decreasing order
+        WHEN: resample_columns is called on a grid wider than the ramp
+        THEN: the values on the grid are exact, and NaN outside the ramp
+        '''
+        temperatures = np.array([140., 120.5, 101.])
+        values = np.array([[1., 2.], [3., 4.]]) @ np.vstack([temperatures, np.ones(3)])
+        grid = np.array([90., 101., 110., 130., 140., 150.])
+        resampled = ramp_average.resample_columns(values, temperatures, grid)
+        expected = np.array([[1., 2.], [3., 4.]]) @ np.vstack([grid, np.ones(len(grid))])
+        assert np.allclose(resampled[:, 1:5], expected[:, 1:5])
+        assert np.isnan(resampled[:, [0, 5]]).all()
+
+##################################################
+    def test_average_and_counts(self):
+        '''
+        GIVEN: two ramps on different temperatures, one of them with a row of NaN points
+        WHEN: they are added to a RampAccumulator
+        THEN: the average skips only the NaN points, and the counts say how many ramps cover each temperature
+        '''
+        accumulator = ramp_average.RampAccumulator(np.array([100., 110., 120., 130.]))
+        first = ramp([100., 112., 125.], slope=1.)
+        second = ramp([104., 116., 131.], slope=3.)
+        second.transient[5, :] = np.nan
+        accumulator.add(first)
+        accumulator.add(second)
+        result = accumulator.result()
+
+        assert list(accumulator.counts) == [1, 2, 2, 1]
+        assert list(result.mask) == [True, True, True, True]
+        rows = np.arange(len(result.time)) != 5
+        assert np.allclose(result.transient[rows, 1], (result.time[rows] + 1.) * 110. * 2.)
+        assert np.allclose(result.transient[5, 1:3], (result.time[5] + 1.) * np.array([110., 120.]))
+        assert np.allclose(result.spectrum[1], [220., 440.])
+
+##################################################
+    def test_raise_value_error_if_the_ramps_do_not_match(self):
+        '''
+        GIVEN: a RampAccumulator with a ramp
+        WHEN: a ramp with other rate windows, or an empty accumulator result, is asked
+        THEN: a ValueError is raised
+        '''
+        accumulator = ramp_average.RampAccumulator(np.array([100., 110.]))
+        with pytest.raises(ValueError):
+            accumulator.result()
+        accumulator.add(ramp([100., 110.]))
+        other = ramp([100., 110.])
+        other.gates = other.gates + 0.1
+        with pytest.raises(ValueError):
+            accumulator.add(other)
+
+##################################################
+    def test_time_axes_shifted_by_a_sample_are_resampled(self):
+        '''
+        GIVEN: two ramps whose time axes are shifted by one sample, as with a different trigger offset
+        WHEN: they are added to a RampAccumulator
+        THEN: the second is resampled on the time axis of the first, and its missing first row is skipped
+        '''
+        time = np.linspace(0., 1., 50)
+        accumulator = ramp_average.RampAccumulator(np.array([100., 110.]))
+        accumulator.add(ramp([100., 110.], time=time, slope=1.))
+        accumulator.add(ramp([100., 110.], time=time + time[1], slope=3.))
+        result = accumulator.result()
+
+        assert np.array_equal(result.time, time)
+        assert np.allclose(result.transient[0], (time[0] + 1.) * np.array([100., 110.]))
+        assert np.allclose(result.transient[1:], np.outer(time[1:] + 1., [200., 220.]))
+
+##################################################
+    def test_average_of_synthetic_ramps(self, tmp_path):
+        '''
+        GIVEN: three noisy synthetic ramps of the same sample, on shifted temperatures
+        WHEN: the average subcommand is called
+        THEN: the files are written, the counts are in the metadata and the average is less noisy than a single ramp
+        '''
+        paths = []
+        for k in range(3):
+            tdms_path, json_path, _ = synthetic.generate_dataset(
+                tmp_path, name=f'ramp{k}', n_temperatures=20, n_samples=2000, t_min=100. + k, t_max=300. - k, noise=0.02, seed=k,
+                configuration_overrides={'set_zero' : 0}
+                )
+            paths.append(str(tdms_path))
+        average, counts = ramp_average.average_ramps(paths, json_path)
+        single, _ = ramp_average.average_ramps(paths[:1], json_path, grid=average.temperature)
+        assert counts.max() == 3
+        assert np.nanstd(average.transient[-200:, 10:]) < 0.75 * np.nanstd(single.transient[-200:, 10:])
+
+        ramp_average.main(['--path', *paths, '--dict', str(json_path), '--output-dir', str(tmp_path / 'average')])
+        with open(tmp_path / 'average' / 'metadata.json') as pfile:
+            metadata = json.load(pfile)
+        assert list(metadata['counts'].values()) == list(counts)
+        assert (tmp_path / 'average' / 'spectrum.csv').exists()
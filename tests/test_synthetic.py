@@ -0,0 +1,86 @@
+import pytest
+import json
+from picts_gif import synthetic
+from picts_gif import input_handler
+from picts_gif import pipeline
+import numpy as np
+import pandas as pd
+
+
+##################################################
+##################################################
+
+@pytest.fixture
+def transients():
+    return synthetic.generate_transients(n_temperatures=20, n_samples=600, time_step=1e-4, light_time=0.005, noise=0., seed=1)
+
+##################################################
+##################################################
+
+class TestGenerateTransients:
+
+    def test_shape_and_names(self, transients):
+        '''
+        GIVEN: the generator options
+        WHEN: generate_transients is called
+        THEN: the dataframe has a row for each sample and a column for each temperature, with the names used by the reader
+        '''
+        assert transients.shape == (600, 20)
+        assert transients.index.name == 'Time (s)'
+        assert transients.columns.name == 'Temperature (K)'
+
+    def test_decay_follows_emission_rate(self, transients):
+        '''
+        GIVEN: a noiseless dataset with the default trap
+        WHEN: the current after the LED turns off is compared with the model
+        THEN: it decays with the known emission rate
+        '''
+        trap = synthetic.DEFAULT_TRAPS[0]
+        rates = synthetic.emission_rate(transients.columns.to_numpy(), trap['activation_energy'], trap['cross_section'])
+        time = transients.index[transients.index >= 0].to_numpy()
+        expected = 1e-11 + (1e-9 - 1e-11) * trap['amplitude'] * np.exp(-np.outer(time, rates))
+        assert np.allclose(transients.loc[time].to_numpy(), expected)
+
+    def test_too_big_amplitudes(self):
+        '''
+        GIVEN: traps whose amplitudes sum to more than 1
+        WHEN: generate_transients is called
+        THEN: ValueError is raised
+        '''
+        traps = [{'activation_energy' : 0.3, 'cross_section' : 1e-15, 'amplitude' : 0.7}] * 2
+        with pytest.raises(ValueError):
+            synthetic.generate_transients(traps=traps)
+
+##################################################
+##################################################
+
+class TestWriteTdms:
+
+    def test_read_back(self, transients, tmp_path):
+        '''
+        GIVEN: a synthetic dataset
+        WHEN: it is written as TDMS and read with read_transients_from_tdms
+        THEN: the dataframe read is the same that was written
+        '''
+        path = tmp_path / 'synthetic.tdms'
+        synthetic.write_tdms(transients, path, gain=1e8)
+        configuration_path = tmp_path / 'synthetic.json'
+        with open(configuration_path, 'w') as pfile:
+            json.dump(synthetic.configuration(transients, 1e8), pfile)
+        data = input_handler.read_transients_from_tdms(path, configuration_path)
+        assert np.allclose(data.index.to_numpy(), transients.index.to_numpy())
+        assert np.allclose(data.columns.to_numpy(dtype=float), transients.columns.to_numpy())
+        assert np.allclose(data.to_numpy(), transients.to_numpy())
+
+    def test_dataset_runs_through_the_spectrum(self, tmp_path):
+        '''
+        GIVEN: a dataset written by generate_dataset
+        WHEN: the TDMS and the json are given to pipeline.compute
+        THEN: a spectrum is calculated for each rate window
+        '''
+        tdms_path, json_path, rates = synthetic.generate_dataset(tmp_path, n_temperatures=30, n_samples=4000, seed=2)
+        with open(json_path) as pfile:
+            configuration = json.load(pfile)
+        normalized_transient, picts, gates = pipeline.compute(tdms_path, json_path)
+        assert picts.shape == (30, configuration['n_windows'])
+        assert list(rates.index) == list(picts.index)
@@ -3,6 +3,7 @@ from os.path import dirname, join
 from picts_gif import utilities
 import pandas as pd
 import json
+import numpy as np
 
 
 ##################################################
@@ -393,3 +394,234 @@ class TestUtilities:
         
         
         
+##################################################
+##################################################
+
+class TestSelectTemperatures:
+
+    def test_range_and_stride(self):
+        '''
+        GIVEN: a ramp of temperatures
+        WHEN: select_temperatures is called with a range and a stride
+        THEN: the positions are inside the range, one every stride
+        '''
+        temperatures = np.arange(100., 200., 1.)
+        positions = utilities.select_temperatures(temperatures, t_min=150., t_max=170., stride=5)
+        assert list(temperatures[positions]) == [150., 155., 160., 165., 170.]
+
+##################################################
+    def test_explicit_values_take_the_closest_temperature(self):
+        '''
+        GIVEN: a ramp of temperatures and a list of values that are not on the ramp
+        WHEN: select_temperatures is called with the values
+        THEN: for each value the closest temperature is selected, once
+        '''
+        temperatures = np.arange(100., 200., 2.)
+        positions = utilities.select_temperatures(temperatures, values=[150.9, 151.2, 120.1])
+        assert list(temperatures[positions]) == [120., 150., 152.]
+
+##################################################
+    def test_empty_selection_raises(self):
+        '''
+        GIVEN: a range outside the ramp, or a stride smaller than 1
+        WHEN: select_temperatures is called
+        THEN: ValueError is raised
+        '''
+        temperatures = np.arange(100., 200., 1.)
+        with pytest.raises(ValueError):
+            utilities.select_temperatures(temperatures, t_min=300.)
+        with pytest.raises(ValueError):
+            utilities.select_temperatures(temperatures, stride=0)
+
+##################################################
+##################################################
+
+class TestDetectNormalizationWindows:
+
+    def test_windows_of_a_step(self):
+        '''
+        GIVEN: noisy steps from a light plateau to a decay that ends in a dark plateau, switched off at different rows
+        WHEN: detect_normalization_windows is called
+        THEN: the light window ends before the switch off, and the dark window is in the final plateau
+        '''
+        rng = np.random.default_rng(0)
+        rows = np.arange(2000)[:, None]
+        drops = np.array([500, 700, 900])
+        values = np.where(rows < drops, 1., 0.5 * np.exp(-(rows - drops) / 50.)) + rng.normal(0., 0.002, (2000, 3))
+        windows = utilities.detect_normalization_windows(values)
+        assert windows['detected'].all()
+        assert (windows['light_stop'] <= drops).all() and (windows['light_stop'] > drops - 50).all()
+        assert (windows['light_start'] < drops / 2).all()
+        assert (windows['dark_start'] > drops + 150).all() and (windows['dark_stop'] == 2000).all()
+
+
+##################################################
+##################################################
+
+class TestFitBaseline:
+
+    def test_linear_drift_of_each_column(self):
+        '''
+        GIVEN: columns with different linear drifts, fitted on different rows, with some NaN in the fitted rows
+        WHEN: fit_baseline is called with a first order polynomial
+        THEN: the drift of each column is found on the whole time axis
+        '''
+        time = np.linspace(-0.005, 0.025, 3000)
+        drift = 1. + np.outer(time, [0., 10., -40.])
+        values = drift.copy()
+        values[:1500] += 5.                            #the signal, outside the fitted rows
+        values[2000, 1] = np.nan
+        baseline = utilities.fit_baseline(values, time, np.array([1500, 2000, 2500]), np.array([3000, 3000, 3000]))
+        assert np.allclose(baseline, drift)
+
+##################################################
+    def test_exponential_tail(self):
+        '''
+        GIVEN: columns with an exponential tail on a constant, and a column with too few rows to fit
+        WHEN: fit_baseline is called with the exponential model and the time constant of the tail
+        THEN: the tails are found, the short column has no baseline, and an unknown model raises a ValueError
+        '''
+        time = np.linspace(0., 0.03, 3000)
+        tail = np.column_stack([0.2 + 0.5 * np.exp(-time / 0.01), -0.1 + 0.3 * np.exp(-time / 0.01), np.ones_like(time)])
+        baseline = utilities.fit_baseline(tail, time, np.array([0, 1000, 2999]), np.full(3, 3000), 'exponential', time_constant=0.01)
+        assert np.allclose(baseline[:, :2], tail[:, :2])
+        assert (baseline[:, 2] == 0.).all()
+        with pytest.raises(ValueError):
+            utilities.baseline_design(time, 'spline')
+
+##################################################
+    def test_noise_is_not_extrapolated_and_the_correction_is_capped(self):
+        '''
+        GIVEN: columns of white noise, and a column with a strong drift
+        WHEN: fit_baseline is called on the last rows, with a cap on the correction
+        THEN: the noise gives a constant baseline (the mean of the rows), the drift is found where it is within the cap and clipped elsewhere
+        '''
+        rng = np.random.default_rng(0)
+        time = np.linspace(0., 1., 2000)
+        values = rng.normal(0., 0.01, (2000, 4))
+        values[:, 3] = 1. + 2. * time
+        start, stop = np.full(4, 1800), np.full(4, 2000)
+        baseline = utilities.fit_baseline(values, time, start, stop, order=2, max_correction=np.full(4, 0.5))
+        assert np.allclose(baseline[:, :3], values[1800:, :3].mean(axis=0))
+        level = values[1800:, 3].mean()
+        assert np.allclose(baseline[1900:, 3], values[1900:, 3])
+        assert np.isclose(baseline[:, 3].min(), level - 0.5) and np.isclose(baseline[0, 3], level - 0.5)
+
+
+##################################################
+##################################################
+
+class TestLogSpacedRateWindows:
+
+    def test_emission_rates_are_log_spaced(self):
+        '''
+        GIVEN: an emission rates range and a number of windows
+        WHEN: create_log_spaced_t1_and_t2_values is called without a time axis
+        THEN: the emission rates of the windows, from calculate_en, are log spaced from en_max to en_min, and t2 = beta t1
+        '''
+        t1, t2 = utilities.create_log_spaced_t1_and_t2_values(10., 5000., 8, 5.)
+        assert np.allclose(t2, 5. * t1)
+        assert np.allclose(utilities.calculate_en(t1, t2), np.geomspace(5000., 10., 8))
+        assert np.isclose(utilities.rate_window_constant(5.) / 1e-3, utilities.calculate_en(np.array([1e-3]), np.array([5e-3]))[0])
+
+##################################################
+    def test_windows_are_snapped_to_the_time_axis(self):
+        '''
+        GIVEN: a time axis, and a range of rates wider than the transient can measure
+        WHEN: create_log_spaced_t1_and_t2_values is called with the time axis
+        THEN: each t1 is a time of the axis, there are no duplicates, and every t2 is inside the transient
+        '''
+        time = np.round(np.arange(-0.005, 0.03, 1e-4), 6)
+        t1, t2 = utilities.create_log_spaced_t1_and_t2_values(1., 1e5, 40, 5., time)
+        assert np.isin(t1, time).all() and (t1 > 0).all()
+        assert (np.diff(t1) > 0).all()
+        assert (t2 <= time[-1]).all()
+        assert len(t1) < 40
+
+##################################################
+    def test_windows_moved_after_the_end_by_the_snap_are_dropped(self):
+        '''
+        GIVEN: the time axis of the synthetic transients, and a slowest window whose t2 is inside the transient only before t1 is snapped
+        WHEN: create_log_spaced_t1_and_t2_values is called with the time axis
+        THEN: the window is dropped, and every t2 has a row of the time axis
+        '''
+        time = np.round(-0.005 + 1e-5 * np.arange(7700), 8)
+        en_min = utilities.rate_window_constant(5.) / 0.014397            #t2 = 0.071985 before the snap, 0.072 after
+        t1, t2 = utilities.create_log_spaced_t1_and_t2_values(en_min, 10 * en_min, 2, 5., time)
+        assert len(t1) == 1 and (t2 <= time[-1]).all()
+        assert (utilities.backfill_positions(time, t2) >= 0).all()
+
+
+##################################################
+##################################################
+
+class TestGateStatistics:
+
+    def test_robust_statistics_ignore_a_spike(self):
+        '''
+        GIVEN: noisy transients with a spike inside a gate
+        WHEN: gate_statistics is called with each statistic
+        THEN: the mean is moved by the spike, median, trimmed mean and hampel are not
+        '''
+        rng = np.random.default_rng(0)
+        values = rng.normal(0., 0.01, (1000, 4))
+        values[205] = 100.
+        for statistic in utilities.GATE_STATISTICS:
+            gates = utilities.gate_statistics(values, np.array([200, 600]), 20, statistic)
+            assert np.abs(gates[1]).max() < 0.01
+            assert (np.abs(gates[0]).max() > 1.) == (statistic == 'mean')
+        with pytest.raises(ValueError):
+            utilities.gate_statistics(values, np.array([200]), 20, 'mode')
+
+##################################################
+    def test_gates_follow_the_rows_of_gate_means(self):
+        '''
+        GIVEN: transients with NaN, and gates at the borders of the time axis (also -1, the position of a time after the end)
+        WHEN: gate_statistics is called with the median
+        THEN: each gate is the median of the same rows that gate_means averages, skipping NaN
+        '''
+        rng = np.random.default_rng(1)
+        values = rng.normal(size=(300, 3))
+        values[140:150, 1] = np.nan
+        positions = np.array([-1, 0, 5, 150, 295, 299])
+        expected = np.array([[np.nanmedian(values[p - 10 : p + 10, c]) if np.isfinite(values[p - 10 : p + 10, c]).any() else np.nan for c in range(3)] for p in positions])
+        assert np.allclose(utilities.gate_statistics(values, positions, 10, 'median'), expected, equal_nan=True)
+        assert np.allclose(utilities.gate_statistics(values, positions, 10, 'mean'), utilities.gate_means(values, positions, 10), equal_nan=True)
+
+##################################################
+##################################################
+
+class TestSpectrumUncertainty:
+
+    def test_bands_of_white_noise(self):
+        '''
+        GIVEN: transients of white noise of known standard deviation
+        WHEN: spectrum_uncertainty is called
+        THEN: std is the one of the difference of two means of 2 t_avg samples, the band contains the spectrum and its half width is about 1.96 std
+        '''
+        rng = np.random.default_rng(0)
+        values = rng.normal(0., 0.1, (3000, 40))
+        t1, t2 = np.array([300, 500, 700]), np.array([1500, 2000, 2500])
+        bands = utilities.spectrum_uncertainty(values, t1, t2, 50, n_bootstrap=400, seed=1)
+        spectrum = (utilities.gate_means(values, t1, 50) - utilities.gate_means(values, t2, 50)).T
+
+        assert bands['std'].shape == bands['lower'].shape == bands['upper'].shape == (40, 3)
+        assert np.isclose(bands['std'].mean(), 0.1 * np.sqrt(2 / 100), rtol=0.05)
+        assert ((bands['lower'] < spectrum) & (spectrum < bands['upper'])).all()
+        assert np.isclose(((bands['upper'] - bands['lower']) / (2 * 1.96 * bands['std'])).mean(), 1., atol=0.1)
+
+##################################################
+    def test_border_gates_and_seed(self):
+        '''
+        GIVEN: noisy transients with gates cut by the end of the time axis, and a gate after the end (position -1)
+        WHEN: spectrum_uncertainty is called twice with the same seed, with and without chunks
+        THEN: the bands do not depend on the chunks, the cut gates have finite and larger bands and the gate after the end has NaN ones
+        '''
+        rng = np.random.default_rng(2)
+        values = rng.normal(size=(500, 5))
+        first = utilities.spectrum_uncertainty(values, np.array([100, 100, 100]), np.array([200, 495, -1]), 20, n_bootstrap=50, seed=3, chunk_size=2)
+        second = utilities.spectrum_uncertainty(values, np.array([100, 100, 100]), np.array([200, 495, -1]), 20, n_bootstrap=50, seed=3)
+        for name in ('std', 'lower', 'upper'):
+            assert np.allclose(first[name], second[name], equal_nan=True)
+            assert np.isfinite(first[name][:, :2]).all() and np.isnan(first[name][:, 2]).all()
+        assert (first['std'][:, 1] > first['std'][:, 0]).mean() > 0.5
@@ -0,0 +1,85 @@
+import pytest
+import json
+from picts_gif import batch
+from picts_gif import synthetic
+from picts_gif.watcher import FolderWatcher
+
+
+##################################################
+##################################################
+
+#return the input and output directories, with a sample in the input one
+@pytest.fixture
+def directories(tmp_path):
+    input_dir = tmp_path / 'campaign'
+    synthetic.generate_dataset(input_dir, name='sample_0', n_temperatures=4, n_samples=3000)
+    return input_dir, tmp_path / 'gifs'
+
+def read_status_log(output_dir):
+    with open(output_dir / 'picts_gif_status.jsonl') as pfile:
+        return [json.loads(line) for line in pfile]
+
+##################################################
+##################################################
+
+class TestFolderWatcher:
+
+    def test_file_queued_when_stable(self, directories):
+        '''
+        GIVEN: a directory with a TDMS file and its json
+        WHEN: the watcher polls twice
+        THEN: the file is queued only at the second poll, when it did not change since the first one
+        '''
+        watcher = FolderWatcher(*directories, plot='transient')
+        try:
+            assert watcher.poll() == []
+            assert [path.name for path in watcher.poll()] == ['sample_0.tdms']
+        finally:
+            watcher.close()
+
+    def test_job_writes_gif_manifest_and_log(self, directories):
+        '''
+        GIVEN: a directory with a TDMS file and its json
+        WHEN: the watcher processes it
+        THEN: the gif is written, the manifest records it and the status log has the queued and done events
+        '''
+        input_dir, output_dir = directories
+        watcher = FolderWatcher(input_dir, output_dir, plot='transient')
+        watcher.poll()
+        watcher.poll()
+        watcher.close()
+        assert (output_dir / 'sample_0.gif').exists()
+        assert 'sample_0.gif' in batch.load_manifest(output_dir)
+        events = [entry['event'] for entry in read_status_log(output_dir)]
+        assert events == ['queued', 'done', 'stopped']
+
+    def test_restart_skips_processed_files(self, directories):
+        '''
+        GIVEN: a file already processed by a previous watcher
+        WHEN: a new watcher polls the directory
+        THEN: the file is not queued again
+        '''
+        input_dir, output_dir = directories
+        batch.run_batch(input_dir, output_dir, plot='transient')
+        watcher = FolderWatcher(input_dir, output_dir, plot='transient')
+        try:
+            watcher.poll()
+            assert watcher.poll() == []
+        finally:
+            watcher.close()
+        assert 'up_to_date' in [entry['event'] for entry in read_status_log(output_dir)]
+
+    def test_tdms_without_json_waits(self, directories):
+        '''
+        GIVEN: a TDMS file without its json, and no default json
+        WHEN: the watcher polls the directory
+        THEN: the file is not queued
+        '''
+        input_dir, output_dir = directories
+        (input_dir / 'sample_0.json').unlink()
+        watcher = FolderWatcher(input_dir, output_dir, plot='transient')
+        try:
+            watcher.poll()
+            assert watcher.poll() == []
+        finally:
+            watcher.close()